@@ -2,59 +2,93 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import StateGraph, END
 # from src.agent.tools import RetrievalTools
 from .tools import RetrievalTools
-from typing import TypedDict
+from .rate_limit import MAX_RETRIES, TokenBucket, with_retries
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple, TypedDict
 from src.cache.cache import Cache
+from src.cache.semantic import SemanticCache
+from src.utils.utils import log
+from src.retrieval.filters import Filter
+from src.retrieval.formatter import DEFAULT_EST_TOKEN_BUDGET, PackedContext
+from src.retrieval.hybrid_search import HybridSearcher
+
+# LLM calls in flight at once in ask_many
+DEFAULT_CONCURRENCY = 8
+# questions retrieved together in ask_many
+RETRIEVAL_BATCH = 64
 
 class AgentState(TypedDict):
     question:str
+    filter:Optional[Filter]
     context:str
+    context_est_tokens:int
+    chunk_ids:List[str]
+    file_hashes:List[str]
     answer:str
 
+@dataclass
+class AnswerTiming:
+    """Seconds from the start of an ask_stream call"""
+    retrieval: Optional[float] = None
+    first_token: Optional[float] = None
+    total: Optional[float] = None
+    # answered from a cache, so nothing was streamed
+    cached: bool = False
+
+
+def _text(content) -> str:
+    """Text of a message chunk; Gemini may send a list of parts"""
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part if isinstance(part, str) else part.get("text", "")
+        for part in content or []
+    )
+
+
 class FileSearchAgent:
     """Langchain agnet that searches documents and answers questions"""
-    def __init__(self, chunks):
-        self.llm = ChatGoogleGenerativeAI(
+    def __init__(self, searcher: Optional[HybridSearcher] = None, est_token_budget: int = DEFAULT_EST_TOKEN_BUDGET, llm=None):
+        """
+        searcher: share an existing HybridSearcher (and its loaded model)
+        est_token_budget: most tokens of retrieved context sent per question,
+        estimated from its length
+        llm: a LangChain chat model to use instead of Gemini, e.g. StubLLM
+        """
+        self.llm = llm or ChatGoogleGenerativeAI(
             model='gemini-2.5-flash',
             temperature=0
         )
-        self.tools = RetrievalTools(chunks)
+        self.tools = RetrievalTools(searcher, est_token_budget)
+        # timings of the last ask_stream call
+        self.timing: Optional[AnswerTiming] = None
         self.graph = self._build()
         self.cache = Cache()
+        # rewordings of a cached question over the same chunks
+        self.semantic = SemanticCache(self.tools.searcher.vector.embedder.variant)
 
     def _build(self):
         graph = StateGraph(AgentState)
 
         def retrieve(state: AgentState):
-            context = self.tools.search_documents(state['question'])
-            return {'context':context}
+            packed = self.tools.build_context(state['question'], filter=state.get('filter'))
+            log(
+                f"Context: ~{packed.est_tokens} tokens from {packed.chunks} chunks"
+                + (f" ({packed.dropped} over budget)" if packed.dropped else "")
+            )
+            return {'context':packed.text, 'context_est_tokens':packed.est_tokens, 'chunk_ids':packed.ids, 'file_hashes':packed.hashes}
 
         def answer(state:AgentState):
-            context = state['context']
-            question = state['question']
-
-            cache_key = self.cache.make_key(question,context)
-            cached = self.cache.get(cache_key)
-            
+            cached, found = self._lookup(state['question'], state['context'], state['chunk_ids'], state['file_hashes'])
             if cached:
-                print('[system] Cache hit (No LLM Call)')
                 return {'answer':cached}
-            
-            prompt = f"""
-You are answering questions using retrieved document context.
-Context:
-{state['context']}
 
-Question:
-{state['question']}
-"""
-            
-            
-            response = self.llm.invoke(prompt)
-            self.cache.set(
-                key=cache_key,
-                answer=response.content,
-                model=self.llm.model,
-            )
+            # under ask_stream, tokens are streamed out of this call as
+            # they arrive; the full answer is cached once it completes
+            response = self.llm.invoke(self._prompt(state['question'], state['context']))
+            self._remember(found, state['question'], response.content, state['file_hashes'])
             return {'answer': response.content}
         
         graph.add_node('retrieve', retrieve)
@@ -67,9 +101,162 @@ Question:
         return graph.compile()
 
 
-    def ask(self, question: str) -> str:
-        result = self.graph.invoke({'question':question})
+    @staticmethod
+    def _prompt(question: str, context: str) -> str:
+        return f"""
+You are answering questions using retrieved document context.
+Context:
+{context}
+
+Question:
+{question}
+"""
+
+    def _lookup(self, question: str, context: str, chunk_ids: List[str], hashes: List[str], quiet: bool = False) -> Tuple[Optional[str], Tuple]:
+        """
+        A cached answer, exact or semantic, or None; plus the keys to
+        store a fresh answer under with _remember.
+        """
+        cache_key = self.cache.make_key(question,context)
+        cached = self.cache.get(cache_key)
+
+        if cached:
+            if not quiet:
+                log('Cache hit (No LLM Call)')
+            return cached, ()
+
+        # embedded during retrieval, so usually a query cache read
+        question_vector = self.tools.embed_query(question)
+        chunks = SemanticCache.signature(chunk_ids)
+        similar = self.semantic.get(question_vector, chunks)
+
+        if similar:
+            if not quiet:
+                log('Semantic cache hit (No LLM Call)')
+            self.cache.set(key=cache_key, answer=similar, model=self.llm.model, hashes=hashes)
+            return similar, ()
+
+        return None, (cache_key, question_vector, chunks)
+
+    def _remember(self, found: Tuple, question: str, answer: str, hashes: List[str]):
+        cache_key, question_vector, chunks = found
+        self.cache.set(
+            key=cache_key,
+            answer=answer,
+            model=self.llm.model,
+            hashes=hashes,
+        )
+        self.semantic.set(question_vector, chunks, question, answer, self.llm.model)
+
+    def ask(self, question: str, filter: Optional[Filter] = None) -> str:
+        """filter: answer from the chunks matching it only"""
+        result = self.graph.invoke({'question':question, 'filter':filter})
         # print(result)
         return result['answer']
 
+    def ask_stream(self, question: str, filter: Optional[Filter] = None) -> Iterator[str]:
+        """
+        ask() that yields the answer in pieces as the LLM generates it.
+        A cached answer is yielded whole. Timings are kept in self.timing.
+        """
+        start = time.perf_counter()
+        timing = self.timing = AnswerTiming()
+        streamed = False
+
+        for mode, payload in self.graph.stream(
+            {'question':question, 'filter':filter},
+            stream_mode=['messages', 'updates'],
+        ):
+            now = time.perf_counter() - start
+
+            if mode == 'messages':
+                chunk, meta = payload
+                text = _text(chunk.content)
+                if meta.get('langgraph_node') != 'answer' or not text:
+                    continue
+                if timing.first_token is None:
+                    timing.first_token = now
+                streamed = True
+                yield text
+
+            elif 'retrieve' in payload:
+                timing.retrieval = now
+
+            elif 'answer' in payload and not streamed:
+                timing.first_token = now
+                timing.cached = True
+                yield payload['answer']['answer']
+
+        timing.total = time.perf_counter() - start
+
+    async def ask_many(
+        self,
+        questions: Sequence[str],
+        filter: Optional[Filter] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        rate: Optional[float] = None,
+        retries: int = MAX_RETRIES,
+        return_exceptions: bool = False,
+    ) -> List:
+        """
+        Answers many questions concurrently; answers are in input order.
+
+        Questions are retrieved RETRIEVAL_BATCH at a time with one batched
+        search each, and their LLM calls start while the next batch is
+        retrieved. At most `concurrency` calls are in flight, at most
+        `rate` start per second (if given), and failed calls are retried
+        with exponential backoff when the error is transient (rate limit,
+        5xx, timeout). Cached answers skip the LLM entirely. If an error is
+        raised, the calls still outstanding are cancelled.
+
+        return_exceptions: put a call's final error in its answer slot
+        instead of raising it, as asyncio.gather does
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        bucket = TokenBucket(rate) if rate else None
+
+        async def call_llm(prompt: str):
+            async with semaphore:
+                if bucket is not None:
+                    await bucket.acquire()
+                return await self.llm.ainvoke(prompt)
+
+        def retrieve(batch: List[str]) -> List[Tuple[PackedContext, Optional[str], Tuple]]:
+            contexts = self.tools.build_contexts(batch, 5, filter)
+            return [
+                (p, *self._lookup(q, p.text, p.ids, p.hashes, quiet=True))
+                for q, p in zip(batch, contexts)
+            ]
+
+        async def answer(question: str, packed: PackedContext, found: Tuple) -> str:
+            prompt = self._prompt(question, packed.text)
+            response = await with_retries(lambda: call_llm(prompt), retries=retries)
+            await asyncio.to_thread(self._remember, found, question, response.content, packed.hashes)
+            return response.content
+
+        loop = asyncio.get_running_loop()
+        tasks: List[asyncio.Future] = []
+        try:
+            for start in range(0, len(questions), RETRIEVAL_BATCH):
+                batch = list(questions[start : start + RETRIEVAL_BATCH])
+                # search and cache lookups block (SQLite, the embedding
+                # model); the event loop keeps earlier calls going meanwhile
+                for q, (packed, cached, found) in zip(batch, await asyncio.to_thread(retrieve, batch)):
+                    if cached:
+                        done = loop.create_future()
+                        done.set_result(cached)
+                        tasks.append(done)
+                    else:
+                        tasks.append(asyncio.create_task(answer(q, packed, found)))
+
+            return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+        finally:
+            # on a raised error, stop the other calls before they spend
+            # quota or write caches for a result nobody will read
+            pending = [t for t in tasks if not t.done()]
+            for t in pending:
+                t.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
         
\ No newline at end of file
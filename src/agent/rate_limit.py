@@ -0,0 +1,97 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from src.utils.utils import log_warn
+
+T = TypeVar("T")
+
+# attempts after the first failure of one LLM call
+MAX_RETRIES = 4
+# backoff before retry n is about BASE_DELAY * 2**n seconds, capped
+BASE_DELAY = 1.0
+MAX_DELAY = 30.0
+# HTTP statuses worth retrying: timeout, rate limit, server errors
+TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+# provider errors without a usable status, matched by class name so no
+# client library has to be imported (google.api_core, openai, httpx)
+TRANSIENT_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "InternalServerError", "DeadlineExceeded", "GatewayTimeout",
+    "RateLimitError", "APITimeoutError", "APIConnectionError",
+    "ConnectError", "ReadTimeout", "RemoteProtocolError",
+}
+
+
+class TokenBucket:
+    """
+    Async rate limiter: `rate` acquisitions per second on average, with
+    bursts of up to `capacity`. Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _status(e: BaseException) -> Optional[int]:
+    for source in (e, getattr(e, "response", None)):
+        for attr in ("status_code", "code", "status"):
+            value = getattr(source, attr, None)
+            if isinstance(value, int):
+                return int(value)
+    return None
+
+
+def is_transient(e: BaseException) -> bool:
+    """
+    Whether an LLM call error may succeed on retry: timeouts, dropped
+    connections, rate limits and server errors. Bad requests, auth errors
+    and bugs fail at once.
+    """
+    if isinstance(e, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = _status(e)
+    if status is not None:
+        return status in TRANSIENT_STATUSES
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(e).__mro__)
+
+
+async def with_retries(
+    call: Callable[[], Awaitable[T]],
+    retries: int = MAX_RETRIES,
+    base_delay: float = BASE_DELAY,
+    max_delay: float = MAX_DELAY,
+    retry_on: Callable[[BaseException], bool] = is_transient,
+) -> T:
+    """
+    Awaits call(), retrying failures that retry_on accepts with
+    exponential backoff and full jitter, so many clients failing together
+    do not retry together.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == retries or not retry_on(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            log_warn(f"LLM call failed ({e}); retry {attempt + 1}/{retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
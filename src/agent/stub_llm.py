@@ -0,0 +1,75 @@
+import asyncio
+import random
+import time
+from typing import Any, AsyncIterator, Iterator, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class StubLLMError(RuntimeError):
+    """Injected failure, standing in for a provider's rate-limit or 5xx error"""
+
+    status_code = 503
+
+
+class StubLLM(BaseChatModel):
+    """
+    Local stand-in for the Gemini chat model, for offline throughput tests:
+    FileSearchAgent(llm=StubLLM(latency=0.8)).
+
+    Each call waits `latency` seconds, then answers with a fixed sentence,
+    streamed at `tokens_per_second` words per second. A share `error_rate`
+    of calls raise StubLLMError instead.
+    """
+
+    model: str = "stub"
+    latency: float = 0.5
+    tokens_per_second: float = 50.0
+    error_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "soko-stub"
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        prompt = str(messages[-1].content) if messages else ""
+        return f"Stub answer from {len(prompt)} characters of prompt."
+
+    def _fail(self) -> bool:
+        return random.random() < self.error_rate
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        if self._fail():
+            raise StubLLMError("stub failure")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        if self._fail():
+            raise StubLLMError("stub failure")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        if self._fail():
+            raise StubLLMError("stub failure")
+        for word in self._reply(messages).split(" "):
+            time.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        if self._fail():
+            raise StubLLMError("stub failure")
+        for word in self._reply(messages).split(" "):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -1,15 +1,30 @@
-from typing import List, Dict
 from src.retrieval.hybrid_search import HybridSearcher
-from src.retrieval.formatter import to_llm_context
+from src.retrieval.formatter import DEFAULT_EST_TOKEN_BUDGET, PackedContext, build_context
+from src.retrieval.filters import Filter
+from typing import List, Optional
+import numpy as np
 
 class RetrievalTools:
     """Tools exposed to the LLM."""
-    def __init__(self, chunks:List[Dict]):
-        self.searcher = HybridSearcher(chunks)
+    def __init__(self, searcher: Optional[HybridSearcher] = None, est_token_budget: int = DEFAULT_EST_TOKEN_BUDGET):
+        self.searcher = searcher or HybridSearcher()
+        self.est_token_budget = est_token_budget
 
+    def build_context(self, query: str, top_k: int = 5, filter: Optional[Filter] = None) -> PackedContext:
+        """Run hybrid search (scoped by filter, if given) and pack the hits into the token budget"""
+        results = self.searcher.search(query=query,top_k=top_k,filter=filter)
+        return build_context(results, self.est_token_budget)
     
-    def search_documents(self, query:str, top_k: int = 5) -> str:
-        """Run hybrid search and return LLM-ready context"""
-        results = self.searcher.search(query=query,top_k=top_k)
-        return to_llm_context(results)
+    def build_contexts(self, queries: List[str], top_k: int = 5, filter: Optional[Filter] = None) -> List[PackedContext]:
+        """build_context() for several queries with one batched search"""
+        results = self.searcher.search_many(queries, top_k=top_k, filter=filter)
+        return [build_context(r, self.est_token_budget) for r in results]
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Query vector, reused from the searcher's cache after a search"""
+        return self.searcher.vector.embed_queries([query])[0]
+
+    def search_documents(self, query:str, top_k: int = 5, filter: Optional[Filter] = None) -> str:
+        """Run hybrid search (scoped by filter, if given) and return LLM-ready context"""
+        return self.build_context(query, top_k, filter).text
     
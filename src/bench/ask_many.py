@@ -0,0 +1,92 @@
+"""
+ask_many throughput with a stub LLM (ingest first).
+
+    python -m src.bench.ask_many --questions 500 --concurrency 1 8 32
+    python -m src.bench.ask_many --file questions.txt --latency 1.5 --rate 10 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from rich.table import Table
+
+from src.agent.chain import FileSearchAgent
+from src.agent.stub_llm import StubLLM
+from src.cache.cache import Cache
+from src.cache.semantic import SemanticCache
+from src.retrieval.chunk_store import ChunkStore
+from src.utils.utils import console, log, log_error
+
+
+def sample_questions(n: int) -> List[str]:
+    """Questions from the opening words of indexed chunks"""
+    store = ChunkStore()
+    questions: List[str] = []
+    try:
+        for _, texts, _ in store.iter_pages():
+            for text in texts:
+                words = text.split()[:12]
+                if words:
+                    questions.append("What does this say: " + " ".join(words) + "?")
+                if len(questions) >= n:
+                    return questions
+    finally:
+        store.close()
+    return questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=200, help="sampled from the chunk store")
+    parser.add_argument("--file", help="one question per line, instead of sampling")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--rate", type=float, help="LLM calls started per second")
+    parser.add_argument("--latency", type=float, default=0.8, help="stub LLM seconds per call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub calls that fail")
+    args = parser.parse_args()
+
+    if args.file:
+        questions = [q.strip() for q in Path(args.file).read_text().splitlines() if q.strip()]
+    else:
+        questions = sample_questions(args.questions)
+    if not questions:
+        log_error("No questions: ingest documents first or pass --file.")
+        return
+
+    agent = FileSearchAgent(llm=StubLLM(latency=args.latency, error_rate=args.error_rate))
+    log(f"Benchmarking {len(questions)} questions, {args.latency}s per LLM call")
+
+    table = Table(title="ask_many (stub LLM)")
+    table.add_column("concurrency", justify="right")
+    table.add_column("seconds", justify="right")
+    table.add_column("questions/s", justify="right")
+    table.add_column("failed", justify="right")
+
+    root = Path(tempfile.mkdtemp(prefix="soko-bench-"))
+    try:
+        for concurrency in args.concurrency:
+            # fresh caches, so every question reaches the LLM
+            agent.cache = Cache(root / f"cache-{concurrency}.db")
+            agent.semantic = SemanticCache("bench", db_path=root / f"semantic-{concurrency}.db")
+
+            start = time.perf_counter()
+            answers = asyncio.run(agent.ask_many(
+                questions, concurrency=concurrency, rate=args.rate, return_exceptions=True,
+            ))
+            elapsed = time.perf_counter() - start
+
+            failed = sum(isinstance(a, BaseException) for a in answers)
+            table.add_row(str(concurrency), f"{elapsed:.1f}", f"{len(questions) / elapsed:.1f}", str(failed))
+            agent.cache.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
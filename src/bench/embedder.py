@@ -0,0 +1,121 @@
+"""
+Embedding throughput benchmark (chunks per second per backend).
+
+    python -m src.bench.embedder --path ./documents
+    python -m src.bench.embedder --synthetic 2000 --backends torch onnx-int8
+"""
+import argparse
+import random
+import time
+from typing import List
+
+from rich.table import Table
+
+from src.ingest.chunker import Chunker
+from src.ingest.embedder import DEFAULT_BATCH_SIZE, DEFAULT_MODEL, Embedder
+from src.ingest.loader import DirectoryLoader
+from src.utils.utils import console, log, log_warn
+
+CONFIGS = {
+    "torch": {"backend": "torch"},
+    "onnx": {"backend": "onnx"},
+    "onnx-int8": {"backend": "onnx", "quantized": True},
+    "openvino": {"backend": "openvino"},
+    "openvino-int8": {"backend": "openvino", "quantized": True},
+}
+
+
+def load_chunks(path: str, limit: int) -> List[str]:
+    """
+    Chunk texts from real files, ignoring the ingestion registry.
+    """
+    loader = DirectoryLoader(path, skip_known=False)
+    chunker = Chunker()
+    texts: List[str] = []
+
+    for chunk in chunker.iter_chunks(loader.iter_load()):
+        texts.append(chunk.text)
+        if len(texts) >= limit:
+            break
+
+    return texts
+
+
+def synthetic_chunks(n: int, seed: int = 0) -> List[str]:
+    """
+    Chunks of mixed length, so length-sorted batching has something to do.
+    """
+    rng = random.Random(seed)
+    words = [
+        "index", "query", "vector", "document", "embedding", "retrieval",
+        "cache", "registry", "chunk", "model", "search", "answer",
+    ]
+    return [
+        " ".join(rng.choice(words) for _ in range(rng.randint(10, 200)))
+        for _ in range(n)
+    ]
+
+
+def run(name: str, texts: List[str], batch_size: int, processes: int = 0) -> float:
+    embedder = Embedder(
+        DEFAULT_MODEL,
+        batch_size=batch_size,
+        processes=processes,
+        **CONFIGS[name],
+    )
+
+    try:
+        # warm-up: model load, pool start and first-call graph setup
+        # are not throughput
+        embedder.embed(texts[:batch_size])
+
+        start = time.perf_counter()
+        embedder.embed(texts)
+        elapsed = time.perf_counter() - start
+    finally:
+        embedder.close()
+
+    return len(texts) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--path", help="directory to take chunks from")
+    parser.add_argument("--synthetic", type=int, default=1000,
+                        help="number of synthetic chunks when --path is not given")
+    parser.add_argument("--limit", type=int, default=2000,
+                        help="max chunks taken from --path")
+    parser.add_argument("--backends", nargs="+", default=list(CONFIGS),
+                        choices=list(CONFIGS))
+    parser.add_argument("--batch-size", type=int, nargs="+",
+                        default=[DEFAULT_BATCH_SIZE])
+    parser.add_argument("--processes", type=int, default=0,
+                        help="embedding worker processes (0 = in-process)")
+    args = parser.parse_args()
+
+    texts = load_chunks(args.path, args.limit) if args.path else synthetic_chunks(args.synthetic)
+    if not texts:
+        log_warn("No chunks to embed.")
+        return
+
+    log(f"Benchmarking {len(texts)} chunks")
+
+    table = Table(title="Embedding throughput")
+    table.add_column("backend")
+    table.add_column("batch size", justify="right")
+    table.add_column("chunks/s", justify="right")
+
+    for name in args.backends:
+        for batch_size in args.batch_size:
+            try:
+                rate = run(name, texts, batch_size, args.processes)
+            except Exception as e:
+                log_warn(f"{name} unavailable: {e}")
+                break
+            table.add_row(name, str(batch_size), f"{rate:.1f}")
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Semantic answer cache benchmark (load time and lookup latency by cache size).
+
+    python -m src.bench.semantic_cache --entries 300000
+    python -m src.bench.semantic_cache --entries 100000 300000 --per-set 1 50
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from rich.table import Table
+
+from src.bench.vector_store import synthetic_vectors
+from src.cache.semantic import SemanticCache
+from src.utils.utils import console, log
+
+INSERT_BATCH = 10_000
+
+
+def fill(cache: SemanticCache, vectors: np.ndarray, per_set: int):
+    """
+    Writes entries in bulk, per_set questions per chunk set.
+    """
+    now = time.time()
+    for i in range(0, len(vectors), INSERT_BATCH):
+        part = vectors[i : i + INSERT_BATCH]
+        cache.conn.executemany(
+            """
+            INSERT INTO answers (model, chunks, question, vector, answer, created_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (cache.model, f"set-{(i + j) // per_set}", f"q{i + j}", v.tobytes(), f"a{i + j}", now, now)
+                for j, v in enumerate(part)
+            ],
+        )
+    cache.conn.commit()
+
+
+def measure(cache: SemanticCache, vectors: np.ndarray, per_set: int, lookups: int):
+    """
+    Returns (median ms per hit, median ms per miss, hit rate of near-duplicates).
+    """
+    rng = np.random.default_rng(1)
+    picks = rng.integers(len(vectors), size=lookups)
+
+    hits, misses, found = [], [], 0
+    for i in picks:
+        # a slightly reworded question: same direction plus small noise
+        q = vectors[i] + 0.01 * rng.standard_normal(vectors.shape[1]).astype(np.float32)
+
+        start = time.perf_counter()
+        answer = cache.get(q, f"set-{i // per_set}")
+        hits.append(time.perf_counter() - start)
+        found += answer is not None
+
+        start = time.perf_counter()
+        cache.get(q, "unknown-set")
+        misses.append(time.perf_counter() - start)
+
+    return 1000 * float(np.median(hits)), 1000 * float(np.median(misses)), found / lookups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[10_000, 100_000, 300_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--per-set", type=int, nargs="+", default=[1, 50],
+                        help="cached questions sharing one chunk set")
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    table = Table(title="Semantic cache")
+    table.add_column("entries", justify="right")
+    table.add_column("per chunk set", justify="right")
+    table.add_column("load s", justify="right")
+    table.add_column("ms/hit", justify="right")
+    table.add_column("ms/miss", justify="right")
+    table.add_column("near-duplicate hit rate", justify="right")
+
+    root = Path(tempfile.mkdtemp(prefix="soko-bench-"))
+    try:
+        for entries in args.entries:
+            vectors, _ = synthetic_vectors(entries, args.dim, 0)
+            for per_set in args.per_set:
+                log(f"{entries} entries, {per_set} per chunk set")
+                db_path = root / f"semantic-{entries}-{per_set}.db"
+                fill(SemanticCache("bench", db_path=db_path), vectors, per_set)
+
+                cache = SemanticCache("bench", db_path=db_path, max_entries=entries)
+                start = time.perf_counter()
+                cache.get(vectors[0], "set-0")  # first lookup loads the matrix
+                load = time.perf_counter() - start
+
+                hit_ms, miss_ms, rate = measure(cache, vectors, per_set, args.lookups)
+                table.add_row(str(entries), str(per_set), f"{load:.2f}",
+                              f"{hit_ms:.3f}", f"{miss_ms:.3f}", f"{rate:.1%}")
+                cache.conn.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Vector store benchmark (query latency, first-pass memory and recall@k per backend).
+
+    python -m src.bench.vector_store --rows 100000
+    python -m src.bench.vector_store --rows 200000 --dim 384 --nprobe 4 8 16
+    python -m src.bench.vector_store --quantization int8 binary --rescore 64 256 1024
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+from rich.table import Table
+
+from src.retrieval.flat_store import QUANTIZATIONS, RESCORE, FlatVectorStore
+from src.retrieval.vector_store import ChromaVectorStore, VectorStore
+from src.utils.utils import console, log, log_warn
+
+INSERT_BATCH = 5000
+
+
+def synthetic_vectors(rows: int, dim: int, queries: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Unit vectors around random topic centers, like sentence embeddings;
+    queries are drawn the same way.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, rows // 500), dim)).astype(np.float32)
+
+    def draw(n: int) -> np.ndarray:
+        x = centers[rng.integers(len(centers), size=n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+        return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+    return draw(rows), draw(queries)
+
+
+def exact_neighbours(data: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    """
+    Ground truth from a float32 brute-force scan.
+    """
+    truth = []
+    norms = np.einsum("ij,ij->i", data, data)
+    for q in queries:
+        dists = norms - 2 * data @ q
+        truth.append(set(np.argpartition(dists, k - 1)[:k].tolist()))
+    return truth
+
+
+def fill(store: VectorStore, data: np.ndarray) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(data), INSERT_BATCH):
+        part = data[i : i + INSERT_BATCH]
+        ids = [str(j) for j in range(i, i + len(part))]
+        store.upsert(ids, part, [""] * len(part), [{"doc_id": "bench"}] * len(part))
+    return time.perf_counter() - start
+
+
+def measure(store: VectorStore, queries: np.ndarray, truth: List[set], k: int) -> Tuple[float, float, float]:
+    """
+    Returns (median ms per single query, queries/s batched, recall@k).
+    """
+    store.query(queries[:1], k)  # warm-up: maps, caches, lazy init
+
+    latencies = []
+    found = []
+    for q in queries:
+        start = time.perf_counter()
+        ids, _ = store.query(q[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        found.append({int(i) for i in ids[0]})
+
+    start = time.perf_counter()
+    store.query(queries, k)
+    rate = len(queries) / (time.perf_counter() - start)
+
+    recall = float(np.mean([len(f & t) / k for f, t in zip(found, truth)]))
+    return 1000 * float(np.median(latencies)), rate, recall
+
+
+def first_pass_bytes(quantization: str, rows: int, dim: int) -> int:
+    """
+    Bytes scanned per query by the first pass: what must stay in memory
+    for searches to avoid disk reads.
+    """
+    norms = 4 * rows
+    if quantization == "int8":
+        return rows * (dim + 4) + norms
+    if quantization == "binary":
+        return rows * ((dim + 7) // 8)
+    return rows * dim * 2 + norms
+
+
+def disk_size(path: Path) -> str:
+    size = sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+    return f"{size / 2**20:.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16],
+                        help="IVF lists probed per query")
+    parser.add_argument("--quantization", nargs="+", default=list(QUANTIZATIONS),
+                        choices=list(QUANTIZATIONS))
+    parser.add_argument("--rescore", type=int, nargs="+", default=[RESCORE],
+                        help="quantized candidates rescored at float16")
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args()
+
+    log(f"Benchmarking {args.rows} x {args.dim} vectors, {args.queries} queries, k={args.k}")
+    data, queries = synthetic_vectors(args.rows, args.dim, args.queries)
+    truth = exact_neighbours(data, queries, args.k)
+
+    table = Table(title="Vector store")
+    table.add_column("backend")
+    table.add_column("build s", justify="right")
+    table.add_column("disk", justify="right")
+    table.add_column("first pass", justify="right")
+    table.add_column("ms/query", justify="right")
+    table.add_column("queries/s (batch)", justify="right")
+    table.add_column(f"recall@{args.k}", justify="right")
+
+    float32 = args.rows * args.dim * 4
+
+    def memory(quantization: str) -> str:
+        size = first_pass_bytes(quantization, args.rows, args.dim)
+        return f"{size / 2**20:.1f} MB (-{1 - size / float32:.0%})"
+
+    root = Path(tempfile.mkdtemp(prefix="soko-bench-"))
+    try:
+        if not args.skip_chroma:
+            try:
+                chroma = ChromaVectorStore(str(root / "chroma"), "bench")
+                build = fill(chroma, data)
+                table.add_row("chroma (hnsw)", f"{build:.1f}", disk_size(root / "chroma"), "-",
+                              *_cells(measure(chroma, queries, truth, args.k)))
+                chroma.close()
+            except Exception as e:
+                log_warn(f"chroma unavailable: {e}")
+
+        for quantization in args.quantization:
+            path = root / f"flat-{quantization}"
+            flat = FlatVectorStore(path, mode="exact", quantization=quantization)
+            build = fill(flat, data)
+
+            if quantization == "float16":
+                table.add_row("flat exact (f16)", f"{build:.1f}", disk_size(path), memory(quantization),
+                              *_cells(measure(flat, queries, truth, args.k)))
+            for rescore in ([] if quantization == "float16" else args.rescore):
+                flat.rescore = rescore
+                table.add_row(f"flat {quantization} rescore={rescore}", f"{build:.1f}", disk_size(path),
+                              memory(quantization), *_cells(measure(flat, queries, truth, args.k)))
+
+            if quantization == args.quantization[0] and args.nprobe:
+                # trained automatically only past IVF_MIN_ROWS; forced here
+                start = time.perf_counter()
+                with flat._lock:
+                    flat._train_ivf()
+                train = time.perf_counter() - start
+
+                flat.mode = "ivf"
+                for nprobe in args.nprobe:
+                    flat.nprobe = nprobe
+                    table.add_row(f"flat {quantization} ivf nprobe={nprobe}", f"+{train:.1f}", disk_size(path),
+                                  memory(quantization), *_cells(measure(flat, queries, truth, args.k)))
+            flat.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    console.print(table)
+
+
+def _cells(result: Tuple[float, float, float]) -> List[str]:
+    ms, rate, recall = result
+    return [f"{ms:.2f}", f"{rate:.0f}", f"{recall:.3f}"]
+
+
+if __name__ == "__main__":
+    main()
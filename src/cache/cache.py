@@ -1,19 +1,70 @@
+import atexit
 import sqlite3
 import hashlib
+import threading
 import time
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.cache.lru import LRUCache
+from src.utils.registry import get_generation
 
 DB_PATH = Path("data/cache-db/cache.db")
 
+# entries kept on disk; least recently used ones go first
+MAX_ENTRIES = 50_000
+# entries older than this are never served
+TTL_SECONDS = 30 * 24 * 3600
+# answers kept in process in front of SQLite
+MEMORY_ENTRIES = 512
+# writes are buffered and committed in groups: every COMMIT_EVERY writes
+# or COMMIT_INTERVAL seconds, whichever comes first
+COMMIT_EVERY = 32
+COMMIT_INTERVAL = 2.0
+# how long invalidations are remembered for answers still buffered elsewhere
+INVALIDATION_TTL = 24 * 3600
+
 
 class Cache:
-    def __init__(self):
-        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(DB_PATH)
+    """
+    Answer cache keyed by question and context.
+
+    Each answer is tagged with the hashes of the files its context came
+    from, so re-ingesting or deleting a file drops only the answers that
+    depended on it. Entries expire after ttl seconds, and the least recently
+    used ones are evicted beyond max_entries.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        max_entries: int = MAX_ENTRIES,
+        ttl: float = TTL_SECONDS,
+        memory_entries: int = MEMORY_ENTRIES,
+    ):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # the indexer writes invalidations from its own connection
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
         self._init_db()
 
+        # key -> answer; dropped whenever the index generation moves, since
+        # another process may have invalidated entries on disk
+        self.memory = LRUCache(memory_entries)
+        self._generation = get_generation()
+
+        # key -> (answer, model, created_at, file hashes)
+        self._pending: Dict[str, Tuple[str, str, float, List[str]]] = {}
+        self._last_commit = time.monotonic()
+        # keys served since the last commit, for LRU order on disk
+        self._touched = set()
+        atexit.register(self.flush)
+
     def _init_db(self):
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
         self.conn.execute(
             """
             CREATE TABLE IF NOT EXISTS cache (
@@ -24,6 +75,31 @@ class Cache:
             )
             """
         )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(cache)")}
+        if "accessed_at" not in columns:
+            self.conn.execute("ALTER TABLE cache ADD COLUMN accessed_at REAL")
+            self.conn.execute("UPDATE cache SET accessed_at = created_at")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed_at)")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_files (
+                key TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (key, hash)
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cache_files_hash ON cache_files(hash)")
+        # recent invalidations, so answers still buffered in any process
+        # when their files changed are never written
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS invalidated (
+                hash TEXT PRIMARY KEY,
+                at REAL NOT NULL
+            )
+            """
+        )
         self.conn.commit()
 
     @staticmethod
@@ -31,28 +107,197 @@ class Cache:
         payload = f"{question.strip()}||{context.strip()}"
         return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-    def get(self, key: str) -> Optional[str]:
-        cur = self.conn.execute(
-            "SELECT answer FROM cache WHERE key = ?",
-            (key,)
-        )
-        row = cur.fetchone()
-        return row[0] if row else None
+    def _check_generation(self):
+        generation = get_generation()
+        if generation != self._generation:
+            self.memory.clear()
+            with self._lock:
+                self._drop_invalidated()
+            self._generation = generation
 
-    def set(self, key: str, answer: str, model: str):
-        self.conn.execute(
-            """
-            INSERT OR REPLACE INTO cache (key, answer, model, created_at)
-            VALUES (?, ?, ?, ?)
-            """,
-            (key, answer, model, time.time())
+    def _drop_invalidated(self):
+        """
+        Removes buffered answers whose files were invalidated after they
+        were created; caller holds the lock.
+        """
+        hashes = {h for entry in self._pending.values() for h in entry[3]}
+        if not hashes:
+            return
+
+        invalidated: Dict[str, float] = {}
+        hashes = list(hashes)
+        for i in range(0, len(hashes), 500):
+            part = hashes[i : i + 500]
+            marks = ",".join("?" * len(part))
+            invalidated.update(self.conn.execute(
+                f"SELECT hash, at FROM invalidated WHERE hash IN ({marks})", part
+            ).fetchall())
+
+        for key in [
+            key for key, (_, _, created, entry_hashes) in self._pending.items()
+            if any(invalidated.get(h, -1.0) >= created for h in entry_hashes)
+        ]:
+            del self._pending[key]
+
+    def _due(self) -> bool:
+        return bool(self._pending) and (
+            len(self._pending) >= COMMIT_EVERY
+            or time.monotonic() - self._last_commit >= COMMIT_INTERVAL
         )
+
+    def get(self, key: str) -> Optional[str]:
+        self._check_generation()
+        if self._due():
+            self.flush()
+
+        answer = self.memory.get(key)
+        if answer is None:
+            # read once: another thread may commit the buffer meanwhile
+            pending = self._pending.get(key)
+            answer = pending[0] if pending else None
+        if answer is not None:
+            with self._lock:
+                self._touched.add(key)
+            return answer
+
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT answer FROM cache WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            self._touched.add(key)
+
+        self.memory.set(key, row[0])
+        return row[0]
+
+    def set(self, key: str, answer: str, model: str, hashes: Iterable[str] = ()):
+        """
+        hashes: file hashes of the documents the context was built from
+        """
+        with self._lock:
+            self._pending[key] = (answer, model, time.time(), sorted(set(hashes)))
+        self.memory.set(key, answer)
+
+        if self._due():
+            self.flush()
+
+    def _commit(self):
+        """
+        Writes buffered answers and access times, evicts and commits in one
+        transaction; caller holds the lock.
+
+        Buffered answers whose files were invalidated in the meantime are
+        dropped instead.
+        """
+        self._drop_invalidated()
+        fresh = self._pending
+        self._pending = {}
+
+        if fresh:
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO cache (key, answer, model, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [(key, a, m, t, t) for key, (a, m, t, _) in fresh.items()],
+            )
+            self.conn.executemany(
+                "DELETE FROM cache_files WHERE key = ?",
+                [(key,) for key in fresh],
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO cache_files (key, hash) VALUES (?, ?)",
+                [(key, h) for key, entry in fresh.items() for h in entry[3]],
+            )
+
+        if self._touched:
+            self.conn.executemany(
+                "UPDATE cache SET accessed_at = ? WHERE key = ?",
+                [(time.time(), key) for key in self._touched],
+            )
+            self._touched.clear()
+        self._evict()
         self.conn.commit()
+        self._last_commit = time.monotonic()
+
+    def _evict(self):
+        removed = self.conn.execute(
+            "DELETE FROM cache WHERE created_at < ?", (time.time() - self.ttl,)
+        ).rowcount
+
+        excess = self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            removed += self.conn.execute(
+                """
+                DELETE FROM cache WHERE key IN (
+                    SELECT key FROM cache ORDER BY accessed_at LIMIT ?
+                )
+                """,
+                (excess,),
+            ).rowcount
+
+        if removed:
+            self.conn.execute("DELETE FROM cache_files WHERE key NOT IN (SELECT key FROM cache)")
+        self.conn.execute("DELETE FROM invalidated WHERE at < ?", (time.time() - INVALIDATION_TTL,))
+
+    def flush(self):
+        """
+        Commits pending writes. Also runs at interpreter exit.
+        """
+        with self._lock:
+            if self._pending or self._touched:
+                self._commit()
+
+    def invalidate_files(self, hashes: Iterable[str]) -> int:
+        """
+        Drops every answer built on a file with one of these hashes.
+        Returns how many were dropped.
+        """
+        hashes: List[str] = list(set(hashes))
+        if not hashes:
+            return 0
+
+        removed = 0
+        now = time.time()
+        with self._lock:
+            # stay under SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                part = hashes[i : i + 500]
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO invalidated (hash, at) VALUES (?, ?)",
+                    [(h, now) for h in part],
+                )
+                marks = ",".join("?" * len(part))
+                keys = [
+                    (key,) for (key,) in self.conn.execute(
+                        f"SELECT DISTINCT key FROM cache_files WHERE hash IN ({marks})",
+                        part,
+                    )
+                ]
+                removed += self.conn.executemany("DELETE FROM cache WHERE key = ?", keys).rowcount
+                self.conn.executemany("DELETE FROM cache_files WHERE key = ?", keys)
+            self._commit()
+
+        self.memory.clear()
+        return removed
 
     def clear(self):
-        self.conn.execute("DELETE FROM cache")
-        self.conn.commit()
-    
+        with self._lock:
+            self.conn.execute("DELETE FROM cache")
+            self.conn.execute("DELETE FROM cache_files")
+            self._pending.clear()
+            self._touched.clear()
+            self._commit()
+        self.memory.clear()
+
     def size(self) -> int:
-        cur = self.conn.execute("SELECT COUNT(*) FROM cache")
-        return cur.fetchone()[0]
+        with self._lock:
+            cur = self.conn.execute("SELECT COUNT(*) FROM cache")
+            return cur.fetchone()[0]
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+        self.conn.close()
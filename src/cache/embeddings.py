@@ -0,0 +1,130 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+DB_PATH = Path("data/cache-db/embeddings.db")
+
+# vectors kept on disk (about 1.5 KB each at 384 dimensions); least
+# recently used ones go first
+MAX_ENTRIES = 500_000
+# eviction trims to this share of max_entries, so it does not run on every write
+EVICT_TO = 0.9
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding store keyed by (model name, chunk text hash).
+    Identical text is only ever sent to a given model once, as long as
+    its vector is among the max_entries most recently used.
+    """
+
+    def __init__(self, db_path: Path = DB_PATH, max_entries: int = MAX_ENTRIES):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        # written from the ingest embedding thread
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._init_db()
+        # upper bound on the row count, so set_many rarely has to count
+        self._count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _init_db(self):
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                key TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, key)
+            )
+            """
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(embeddings)")}
+        if "accessed_at" not in columns:
+            self.conn.execute("ALTER TABLE embeddings ADD COLUMN accessed_at REAL")
+            self.conn.execute("UPDATE embeddings SET accessed_at = ?", (time.time(),))
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings(accessed_at)")
+        self.conn.commit()
+
+    def get_many(self, model: str, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(keys))
+
+        # stay under SQLite's bound-parameter limit
+        for i in range(0, len(unique), 500):
+            part = unique[i : i + 500]
+            marks = ",".join("?" * len(part))
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings "
+                    f"WHERE model = ? AND key IN ({marks})",
+                    (model, *part),
+                ).fetchall()
+
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+
+        if found:
+            now = time.time()
+            with self._lock:
+                self.conn.executemany(
+                    "UPDATE embeddings SET accessed_at = ? WHERE model = ? AND key = ?",
+                    [(now, model, key) for key in found],
+                )
+                self.conn.commit()
+
+        return found
+
+    def set_many(self, model: str, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, vector, accessed_at) VALUES (?, ?, ?, ?)",
+                [
+                    (model, key, np.asarray(vec, dtype=np.float32).tobytes(), now)
+                    for key, vec in items.items()
+                ],
+            )
+            self._count += len(items)
+            if self._count > self.max_entries:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """
+        Deletes the least recently used vectors beyond max_entries, down
+        to EVICT_TO of it; caller holds the lock.
+        """
+        self._count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if self._count <= self.max_entries:
+            return
+
+        excess = self._count - int(self.max_entries * EVICT_TO)
+
+        self._count -= self.conn.execute(
+            """
+            DELETE FROM embeddings WHERE rowid IN (
+                SELECT rowid FROM embeddings ORDER BY accessed_at LIMIT ?
+            )
+            """,
+            (excess,),
+        ).rowcount
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM embeddings")
+            self.conn.commit()
+            self._count = 0
+
+    def size(self) -> int:
+        with self._lock:
+            cur = self.conn.execute("SELECT COUNT(*) FROM embeddings")
+            return cur.fetchone()[0]
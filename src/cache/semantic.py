@@ -0,0 +1,271 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from src.cache.cache import MAX_ENTRIES, TTL_SECONDS
+
+DB_PATH = Path("data/cache-db/semantic.db")
+
+# cosine similarity above which two questions count as the same question
+SIMILARITY_THRESHOLD = 0.92
+# eviction trims to this share of max_entries, so it does not run on every write
+EVICT_TO = 0.9
+
+
+class SemanticCache:
+    """
+    Answers keyed by question embedding and by the set of chunks they were
+    answered from. A reworded question gets a stored answer when it is close
+    enough to a cached one and retrieval picked the same chunks.
+
+    Entries of one embedding model are held in memory as a unit-vector
+    matrix; a lookup compares the question against every entry with the
+    same chunk set in one matrix product. Like the exact cache, entries
+    expire after ttl seconds and the least recently used ones are evicted
+    beyond max_entries.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        threshold: float = SIMILARITY_THRESHOLD,
+        db_path: Path = DB_PATH,
+        max_entries: int = MAX_ENTRIES,
+        ttl: float = TTL_SECONDS,
+    ):
+        """
+        model: embedding model variant the question vectors come from;
+        vectors from other models are never compared
+        """
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.model = model
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._init_db()
+
+        self._vectors: Optional[np.ndarray] = None
+        self._rows: List[int] = []
+        # chunk set signature -> positions in _vectors / _rows
+        self._by_chunks: Dict[str, List[int]] = {}
+        # changes when another connection commits to the database
+        self._data_version: Optional[int] = None
+
+    def _init_db(self):
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # AUTOINCREMENT: ids are never reused after a clear, so a process
+        # holding old row ids cannot pick up someone else's new rows
+        table = self.conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'answers'"
+        ).fetchone()
+        if table and "AUTOINCREMENT" not in table[0].upper():
+            self.conn.execute("ALTER TABLE answers RENAME TO answers_old")
+            self.conn.execute("DROP INDEX IF EXISTS answers_model")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                model TEXT NOT NULL,
+                chunks TEXT NOT NULL,
+                question TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                llm TEXT,
+                created_at REAL,
+                accessed_at REAL
+            )
+            """
+        )
+        if table and "AUTOINCREMENT" not in table[0].upper():
+            self.conn.execute(
+                """
+                INSERT INTO answers (id, model, chunks, question, vector, answer, llm, created_at, accessed_at)
+                SELECT id, model, chunks, question, vector, answer, llm, created_at, created_at
+                FROM answers_old
+                """
+            )
+            self.conn.execute("DROP TABLE answers_old")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS answers_model ON answers(model)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS answers_accessed ON answers(model, accessed_at)")
+        self.conn.commit()
+
+    @staticmethod
+    def signature(chunk_ids: Iterable[str]) -> str:
+        """
+        Order-free key for the set of chunks an answer was based on.
+        Chunk ids are content-addressed, so equal sets mean equal context.
+        """
+        payload = "\0".join(sorted(set(chunk_ids)))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _forget(self):
+        self._vectors = None
+        self._rows = []
+        self._by_chunks = {}
+
+    def _load(self, after: int = 0):
+        """
+        Reads rows with id > after into memory; caller holds the lock.
+        """
+        rows = self.conn.execute(
+            "SELECT id, chunks, vector FROM answers WHERE model = ? AND id > ? ORDER BY id",
+            (self.model, after),
+        ).fetchall()
+
+        if self._vectors is None:
+            self._vectors = np.empty((0, 0), dtype=np.float32)
+        if not rows:
+            return
+
+        dim = len(rows[0][2]) // 4
+        block = np.frombuffer(b"".join(blob for _, _, blob in rows), dtype=np.float32).reshape(len(rows), dim)
+        n = len(self._rows)
+        if n == 0:
+            self._vectors = block.copy()
+        else:
+            self._vectors = np.concatenate([self._vectors[:n], block])
+
+        for pos, (row_id, chunks, _) in enumerate(rows, start=n):
+            self._rows.append(row_id)
+            self._by_chunks.setdefault(chunks, []).append(pos)
+
+    def _sync(self):
+        """
+        Brings the in-memory matrix in line with the database; caller holds
+        the lock. Rows added by other connections are appended. If any
+        loaded row was removed (reset, eviction elsewhere), the matrix is
+        rebuilt.
+        """
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._vectors is not None and version == self._data_version:
+            return
+        self._data_version = version
+
+        if self._vectors is None:
+            self._evict()
+            self._load()
+            return
+
+        last = self._rows[-1] if self._rows else 0
+        kept = self.conn.execute(
+            "SELECT COUNT(*) FROM answers WHERE model = ? AND id <= ?", (self.model, last)
+        ).fetchone()[0]
+        if kept < len(self._rows):
+            self._forget()
+            self._load()
+        else:
+            self._load(after=last)
+
+    def _append(self, row_id: int, chunks: str, vector: np.ndarray):
+        n = len(self._rows)
+        if n == 0 and self._vectors.shape[1] != len(vector):
+            self._vectors = np.empty((64, len(vector)), dtype=np.float32)
+        elif n == len(self._vectors):
+            # grow by doubling so appends stay amortized O(1)
+            grown = np.empty((2 * n, self._vectors.shape[1]), dtype=np.float32)
+            grown[:n] = self._vectors[:n]
+            self._vectors = grown
+
+        self._vectors[n] = vector
+        self._rows.append(row_id)
+        self._by_chunks.setdefault(chunks, []).append(n)
+
+    def _evict(self) -> int:
+        """
+        Deletes expired rows, and the least recently used ones beyond
+        max_entries; caller holds the lock. Returns how many went.
+        """
+        removed = self.conn.execute(
+            "DELETE FROM answers WHERE model = ? AND created_at < ?",
+            (self.model, time.time() - self.ttl),
+        ).rowcount
+
+        excess = self.conn.execute(
+            "SELECT COUNT(*) FROM answers WHERE model = ?", (self.model,)
+        ).fetchone()[0] - self.max_entries
+        if excess > 0:
+            excess += int(self.max_entries * (1 - EVICT_TO))
+            removed += self.conn.execute(
+                """
+                DELETE FROM answers WHERE id IN (
+                    SELECT id FROM answers WHERE model = ?
+                    ORDER BY accessed_at LIMIT ?
+                )
+                """,
+                (self.model, excess),
+            ).rowcount
+
+        self.conn.commit()
+        return removed
+
+    def get(self, vector, chunks: str) -> Optional[str]:
+        """
+        The answer to the most similar cached question with the same chunk
+        signature, if it clears the threshold.
+        """
+        with self._lock:
+            self._sync()
+            positions = self._by_chunks.get(chunks)
+            if not positions:
+                return None
+
+            scores = self._vectors[positions] @ self._unit(vector)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+
+            # chunks is checked again in case the row was replaced
+            row_id = self._rows[positions[best]]
+            row = self.conn.execute(
+                "SELECT answer FROM answers WHERE id = ? AND chunks = ? AND created_at >= ?",
+                (row_id, chunks, time.time() - self.ttl),
+            ).fetchone()
+            if row is None:
+                return None
+
+            self.conn.execute("UPDATE answers SET accessed_at = ? WHERE id = ?", (time.time(), row_id))
+            self.conn.commit()
+            return row[0]
+
+    def set(self, vector, chunks: str, question: str, answer: str, llm: Optional[str] = None):
+        unit = self._unit(vector)
+        now = time.time()
+        with self._lock:
+            self._sync()
+            cur = self.conn.execute(
+                """
+                INSERT INTO answers (model, chunks, question, vector, answer, llm, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (self.model, chunks, question.strip(), unit.tobytes(), answer, llm, now, now),
+            )
+            self.conn.commit()
+            self._append(cur.lastrowid, chunks, unit)
+
+            if len(self._rows) > self.max_entries and self._evict():
+                self._forget()
+                self._load()
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM answers")
+            self.conn.commit()
+            self._forget()
+
+    def size(self) -> int:
+        with self._lock:
+            cur = self.conn.execute("SELECT COUNT(*) FROM answers WHERE model = ?", (self.model,))
+            return cur.fetchone()[0]
@@ -0,0 +1,97 @@
+import os
+import sqlite3
+from pathlib import Path
+from typing import List, Optional
+
+DB_PATH = Path("data/cache-db/text.db")
+
+
+class ExtractedTextCache:
+    """
+    Per-page extracted text keyed by (file hash, extraction engine).
+    Lets re-chunking and re-indexing skip PDF parsing entirely.
+
+    Safe to pickle into loader pool workers: each process opens its own
+    connection on first use.
+    """
+
+    def __init__(self, db_path: Path = DB_PATH):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+
+    def __getstate__(self):
+        return {"db_path": self.db_path, "_conn": None, "_conn_pid": None}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # several loader processes may write at once
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                hash TEXT NOT NULL,
+                engine TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (hash, engine, page)
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                hash TEXT NOT NULL,
+                engine TEXT NOT NULL,
+                page_count INTEGER NOT NULL,
+                PRIMARY KEY (hash, engine)
+            )
+            """
+        )
+        conn.commit()
+
+        self._conn, self._conn_pid = conn, os.getpid()
+        return conn
+
+    def get(self, file_hash: str, engine: str) -> Optional[List[str]]:
+        """
+        Page texts in order, or None unless every page was stored.
+        """
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT page_count FROM documents WHERE hash = ? AND engine = ?",
+            (file_hash, engine),
+        ).fetchone()
+        if row is None:
+            return None
+
+        pages = conn.execute(
+            "SELECT text FROM pages WHERE hash = ? AND engine = ? ORDER BY page",
+            (file_hash, engine),
+        ).fetchall()
+        if len(pages) != row[0]:
+            return None
+
+        return [p[0] for p in pages]
+
+    def set(self, file_hash: str, engine: str, pages: List[str]):
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO pages (hash, engine, page, text) VALUES (?, ?, ?, ?)",
+                [(file_hash, engine, i, text) for i, text in enumerate(pages)],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (hash, engine, page_count) VALUES (?, ?, ?)",
+                (file_hash, engine, len(pages)),
+            )
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM pages")
+            conn.execute("DELETE FROM documents")
@@ -2,15 +2,21 @@ import sys
 
 from src.ingest.indexer import Indexer
 from src.agent.chain import FileSearchAgent
-from src.utils.utils import load_chunks_from_chroma
 
 from rich.console import Console
+from rich.live import Live
 from rich.panel import Panel
 from rich.text import Text
 from InquirerPy import inquirer
 
 console = Console()
 
+# kept for the whole session so the embedding model loads once
+indexer = Indexer(
+    persist_path="data/chroma",
+    collection_name="soko_docs"
+)
+
 # ---------- UI helpers ----------
 def info(msg: str):
     console.print(f"[cyan]{msg}[/cyan]")
@@ -21,13 +27,23 @@ def success(msg: str):
 def error(msg: str):
     console.print(f"[red]{msg}[/red]")
 
-def show_answer(answer: str):
-    panel = Panel(
+def answer_panel(answer: str) -> Panel:
+    return Panel(
         Text(answer.strip(), style="white"),
         title="Answer",
         border_style="bright_blue",
     )
-    console.print(panel)
+
+def show_answer(answer: str):
+    console.print(answer_panel(answer))
+
+def stream_answer(pieces) -> str:
+    answer = ""
+    with Live(answer_panel(answer), console=console, refresh_per_second=15) as live:
+        for piece in pieces:
+            answer += piece
+            live.update(answer_panel(answer))
+    return answer
 
 
 # ---------- actions ----------
@@ -40,25 +56,18 @@ def ingest_documents():
         error("Invalid path.")
         return
 
-    indexer = Indexer(
-        persistent_path="data/chroma",
-        collection_name="soko_docs"
-    )
-
     info("Ingesting documents...")
     indexer.ingest(path)
     success("Ingestion complete.")
 
 
 def ask_questions():
-    info("Loading indexed chunks...")
-    chunks = load_chunks_from_chroma()
-
-    if not chunks:
+    indexer.ensure_indexes()
+    if not indexer.count():
         error("No documents indexed. Please ingest first.")
         return
 
-    agent = FileSearchAgent(chunks)
+    agent = FileSearchAgent()
 
     while True:
         question = inquirer.text(
@@ -70,12 +79,15 @@ def ask_questions():
         if not question.strip():
             continue
 
-        answer = agent.ask(question)
-        show_answer(answer)
+        stream_answer(agent.ask_stream(question))
+        timing = agent.timing
+        if timing and timing.first_token is not None:
+            info(f"First token after {timing.first_token:.2f}s, done after {timing.total:.2f}s")
 
 
 def exit_program():
     info("Exiting Soko.")
+    indexer.shutdown()
     sys.exit(0)
 
 
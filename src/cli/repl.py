@@ -1,11 +1,14 @@
 import shlex
 from rich.console import Console
+from rich.live import Live
 from rich.panel import Panel
+from rich.table import Table
 from rich.text import Text
 
 from src.ingest.indexer import Indexer
 from src.agent.chain import FileSearchAgent
-from src.utils.utils import load_chunks_from_chroma
+from src.retrieval.filters import Filter
+from src.retrieval.hybrid_search import HybridSearcher
 from src.utils.utils import log_error,log
 from src.utils.status import status
 
@@ -20,19 +23,107 @@ def print_error(msg: str):
     console.print(msg, style="red")
 
 
-def print_answer(answer: str):
-    panel = Panel(
+def answer_panel(answer: str) -> Panel:
+    return Panel(
         Text(answer.strip(), style="white"),
         title="Answer",
         border_style="#4A6D7C",
     )
-    console.print(panel)
+
+
+def print_answer(answer: str):
+    console.print(answer_panel(answer))
+
+
+def stream_answer(pieces) -> str:
+    """
+    Renders the answer panel while pieces arrive; returns the full text.
+    """
+    answer = ""
+    with Live(answer_panel(answer), console=console, refresh_per_second=15) as live:
+        for piece in pieces:
+            answer += piece
+            live.update(answer_panel(answer))
+    return answer
+
+
+def print_timing(timing):
+    if timing is None or timing.total is None:
+        return
+    source = "cache" if timing.cached else "first token"
+    print_dim(
+        f"\[system] retrieval {timing.retrieval or 0:.2f}s · "
+        f"{source} {timing.first_token or 0:.2f}s · total {timing.total:.2f}s"
+    )
+
+
+def pop_option(args: list, name: str, default=None):
+    """
+    Removes `--name value` from args and returns value (or default).
+    """
+    if name not in args:
+        return default
+
+    i = args.index(name)
+    if i + 1 >= len(args):
+        raise ValueError(f"Missing value for {name}")
+
+    value = args[i + 1]
+    del args[i : i + 2]
+    return value
+
+
+def pop_filter(args: list):
+    """
+    Removes filter options from args and returns a Filter, or None:
+    --dir PATH (repeatable), --ext py,md, --after DATE, --before DATE.
+    """
+    directories = []
+    while "--dir" in args:
+        directories.append(pop_option(args, "--dir"))
+
+    return Filter.parse(
+        directories=directories,
+        extensions=pop_option(args, "--ext"),
+        after=pop_option(args, "--after"),
+        before=pop_option(args, "--before"),
+    )
+
+
+def print_results(results: list):
+    table = Table(border_style="#4A6D7C")
+    table.add_column("#", justify="right", style="#9C9C93")
+    table.add_column("score", justify="right")
+    table.add_column("file")
+    table.add_column("text", overflow="ellipsis", no_wrap=True, max_width=80)
+
+    for rank, r in enumerate(results, start=1):
+        meta = r["meta"] or {}
+        table.add_row(
+            str(rank),
+            f"{r['score']:.4f}",
+            f"{meta.get('filename', '?')} #{meta.get('chunk_index', '?')}",
+            " ".join(r["text"].split()),
+        )
+    console.print(table)
+
+
+def pop_flag(args: list, name: str) -> bool:
+    """
+    Removes a bare `--name` flag from args and reports whether it was present.
+    """
+    if name not in args:
+        return False
+    args.remove(name)
+    return True
 
 
 def show_help():
     print_dim("Available commands:")
-    print_dim("  ingest <path>")
-    print_dim("  ask <question>")
+    print_dim("  ingest <path> [--workers N] [--sync] [--embed-procs N] [--pdf-engine fast|pdfplumber]")
+    print_dim("  ask <question> [filters]")
+    print_dim("  search <query> [--top-k N] [filters]")
+    print_dim("    filters: --dir PATH (repeatable) --ext py,md --after YYYY-MM-DD --before YYYY-MM-DD")
     print_dim("  reset")
     print_dim("  status")
     print_dim("  exit")
@@ -55,6 +146,10 @@ def run_repl():
     print_dim("Type 'help' to see available commands.\n")
 
     agent = None
+    searcher = None
+    # one indexer per session, so the embedding model (and worker pool)
+    # is loaded once rather than on every ingest
+    indexer = Indexer()
 
     while True:
         try:
@@ -72,50 +167,83 @@ def run_repl():
 
             if command == "exit":
                 print_dim("Exiting Soko.")
+                indexer.shutdown()
                 break
 
             elif command == "help":
                 show_help()
 
             elif command == "ingest":
+                workers = int(pop_option(args, "--workers", 1))
+                sync = pop_flag(args, "--sync")
+                embed_procs = pop_option(args, "--embed-procs")
+                pdf_engine = pop_option(args, "--pdf-engine")
+
                 if not args:
-                    print_error("Usage: ingest <directory_path>")
+                    print_error(
+                        "Usage: ingest <directory_path> "
+                        "[--workers N] [--sync] [--embed-procs N] "
+                        "[--pdf-engine fast|pdfplumber]"
+                    )
                     continue
 
+                if embed_procs is not None:
+                    indexer.embed_processes = int(embed_procs)
+                if pdf_engine is not None:
+                    indexer.pdf_engine = pdf_engine
+
                 path = args[0]
-                indexer = Indexer()
                 print_dim(f"\[system] Ingesting documents from {path}")
-                success = indexer.ingest(path)
+                success = indexer.ingest(path, sync=sync, workers=workers)
                 if not success:
                     print_error('\[system] Ingestion failed.')
 
-                agent = None  # reset agent after ingestion
-
-            elif command == "ask":
+            elif command in ("ask", "search"):
+                scope = pop_filter(args)
+                top_k = int(pop_option(args, "--top-k", 5)) if command == "search" else 5
                 if not args:
-                    print_error("Usage: ask <your question>")
+                    print_error(f"Usage: {command} <text> [filters]")
                     continue
 
-                if agent is None:
-                    print_dim("\[system] Loading indexed documents...")
-                    chunks = load_chunks_from_chroma()
-                    if not chunks:
+                if searcher is None:
+                    indexer.ensure_indexes()
+                    if not indexer.count():
                         print_error("\[system-error] No documents indexed. Run 'ingest' first.")
                         continue
-                    agent = FileSearchAgent(chunks)
+                    # stays valid across ingests: the keyword index picks
+                    # up new commits and chunk texts are read per query
+                    searcher = HybridSearcher()
+
+                if scope is not None:
+                    print_dim(f"\[system] Searching {scope.describe()}")
+
+                text = " ".join(args)
+                if command == "search":
+                    results = searcher.search(text, top_k=top_k, filter=scope)
+                    if results:
+                        print_results(results)
+                    else:
+                        print_dim("\[system] No matches.")
+                    continue
 
-                question = " ".join(args)
-                answer = agent.ask(question)
-                print_answer(answer)
+                if agent is None:
+                    agent = FileSearchAgent(searcher)
+                stream_answer(agent.ask_stream(text, filter=scope))
+                print_timing(agent.timing)
             elif command.startswith("reset"):
                 from src.utils.reset import reset_cache, reset_index, reset_all
 
                 if len(parts) == 1:
                     print_error("Usage: reset \[cache|index|all]")
-                    
+                    continue
 
                 target = parts[1]
 
+                # the collection handle goes stale once it is recreated
+                indexer.close()
+                agent = None
+                searcher = None
+
                 if target == "cache":
                     reset_cache()
                 elif target == "index":
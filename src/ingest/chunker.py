@@ -1,51 +1,236 @@
+import re
+from collections import deque
 from dataclasses import dataclass
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, Optional, Protocol, Tuple
+
+import numpy as np
+
 from .loader import Document
+from .records import RecordStream
+from src.utils.hash import text_hash
+
+# split points, coarsest first; each keeps its separator on the left piece
+_BOUNDARIES = [
+    re.compile(r"\n\s*\n"),        # paragraphs
+    re.compile(r"(?<=[.!?])\s+"),  # sentences
+    re.compile(r"\n"),             # lines (code, tables)
+    re.compile(r"\s+"),            # words
+]
+
+# no tokenizer produces fewer than one token per this many characters,
+# so longer pieces are split further without being measured
+_MAX_CHARS_PER_UNIT = 8
+
+
+class Tokenizer(Protocol):
+    max_tokens: int
+
+    def count_tokens(self, text: str) -> int: ...
+
 
 @dataclass
 class Chunk:
     text: str
     source: str
     meta: Dict
+    id: Optional[str] = None
+    embedding: Optional[np.ndarray] = None
 
 class Chunker:
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
+    """
+    Packs whole paragraphs, sentences, lines or words into chunks of at most
+    chunk_size units, falling back to a finer boundary only for pieces that
+    do not fit. Neighbouring chunks share up to chunk_overlap units of
+    whole pieces.
+
+    Record streams (CSV / JSON) are packed whole records at a time with no
+    overlap, and their header line is repeated at the top of every chunk.
+
+    Without a tokenizer, units are characters (default 1000 / 200).
+    With one (e.g. Embedder), units are the embedding model's tokens,
+    chunk_size defaults to the model's input limit and chunk_overlap to
+    an eighth of it, so no chunk is truncated at encode time. Limits are
+    resolved on first use, which is when the model is loaded.
+    """
+
+    def __init__(
+        self,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+        tokenizer: Optional[Tokenizer] = None,
+    ):
+        self.tokenizer = tokenizer
+        self._chunk_size = chunk_size
+        self._chunk_overlap = chunk_overlap
+        self._resolved = False
+
+        if tokenizer is None:
+            self._resolve()
+
+    def _resolve(self):
+        if self._resolved:
+            return
+
+        if self.tokenizer is None:
+            size = self._chunk_size or 1000
+            overlap = 200 if self._chunk_overlap is None else self._chunk_overlap
+        else:
+            size = self._chunk_size or self.tokenizer.max_tokens
+            overlap = size // 8 if self._chunk_overlap is None else self._chunk_overlap
+
+        if size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if not 0 <= overlap < size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+        self.chunk_size = size
+        self.chunk_overlap = overlap
+        self._resolved = True
+
+    def _length(self, text: str) -> int:
+        if self.tokenizer is None:
+            return len(text)
+        return self.tokenizer.count_tokens(text)
 
     def chunk(self, documents: List[Document]) -> List[Chunk]:
-        all_chunks = []
+        return list(self.iter_chunks(documents))
 
+    def iter_chunks(self, documents: Iterable[Document]) -> Iterator[Chunk]:
         for doc in documents:
-            text = doc.text
-            if not text:
+            if doc.records is not None:
+                splits = self._pack_records(doc.records)
+            elif doc.text:
+                splits = ((t, None) for t in self._split_text(doc.text))
+            else:
                 continue
 
-            splits = self._split_text(text)
+            doc_id = str(doc.path.resolve())
 
-            for i, chunk_text in enumerate(splits):
+            for i, (chunk_text, extra) in enumerate(splits):
                 meta = dict(doc.meta or {})
+                meta.update(extra or {})
                 meta["chunk_index"] = i
-                meta["doc_id"] = str(doc.path)
-
-                all_chunks.append(
-                    Chunk(
-                        text=chunk_text,
-                        source=str(doc.path),
-                        meta=meta
-                    )
+                meta["doc_id"] = doc_id
+                meta["chunk_hash"] = text_hash(chunk_text)
+
+                yield Chunk(
+                    text=chunk_text,
+                    source=doc_id,
+                    meta=meta
                 )
 
-        return all_chunks
+    def _pack_records(self, stream: RecordStream) -> Iterator[Tuple[str, Dict]]:
+        """
+        Yields (chunk text, label metadata) for consecutive whole records
+        under the header line. A record too big for one chunk is split on
+        its own, each part still under the header.
+        """
+        self._resolve()
+
+        header, records = stream.open()
+        first_key, last_key = stream.label_keys
+
+        prefix = header + "\n" if header else ""
+        limit = self.chunk_size - (self._length(prefix) if prefix else 0)
+        if limit < self.chunk_size // 2:
+            # a header that eats most of the budget is not worth repeating
+            prefix, limit = "", self.chunk_size
+
+        batch: List[str] = []
+        labels: List = []
+        total = 0
+
+        def flush():
+            text = prefix + "\n".join(batch)
+            return text, {first_key: labels[0], last_key: labels[-1]}
+
+        for label, text in records:
+            n = self._length(text + "\n")
+
+            if batch and total + n > limit:
+                yield flush()
+                batch, labels, total = [], [], 0
+
+            if n > limit:
+                for part in self._split_text(text, limit):
+                    yield prefix + part, {first_key: label, last_key: label}
+                continue
+
+            batch.append(text)
+            labels.append(label)
+            total += n
+
+        if batch:
+            yield flush()
+
+    def _split_text(self, text: str, limit: Optional[int] = None) -> Iterator[str]:
+        """
+        Greedy packing of pieces into a sliding window. When the next piece
+        does not fit, the window is emitted and trimmed from the left down
+        to at most chunk_overlap units, which always leaves room for it.
+        """
+        self._resolve()
+
+        limit = limit or self.chunk_size
+        overlap = min(self.chunk_overlap, limit - 1)
+
+        window: deque = deque()
+        total = 0
+
+        for piece, n in self._pieces(text, 0, limit):
+            if window and total + n > limit:
+                chunk = "".join(p for p, _ in window).strip()
+                if chunk:
+                    yield chunk
+
+                while window and (total > overlap or total + n > limit):
+                    total -= window.popleft()[1]
+
+            window.append((piece, n))
+            total += n
+
+        chunk = "".join(p for p, _ in window).strip()
+        if chunk:
+            yield chunk
+
+    def _pieces(self, text: str, level: int, limit: int) -> Iterator[Tuple[str, int]]:
+        """
+        Yields (piece, length) pairs covering text, each fitting limit.
+        """
+        if level == len(_BOUNDARIES):
+            yield from self._hard_split(text, limit)
+            return
 
-    def _split_text(self, text: str) -> List[str]:
-        chunks = []
         start = 0
+        for m in _BOUNDARIES[level].finditer(text):
+            if m.end() > start:
+                yield from self._fit(text[start : m.end()], level, limit)
+                start = m.end()
+
+        if start < len(text):
+            yield from self._fit(text[start:], level, limit)
+
+    def _fit(self, piece: str, level: int, limit: int) -> Iterator[Tuple[str, int]]:
+        if len(piece) <= limit * _MAX_CHARS_PER_UNIT:
+            n = self._length(piece)
+            if n <= limit:
+                yield piece, n
+                return
+
+        yield from self._pieces(piece, level + 1, limit)
+
+    def _hard_split(self, text: str, limit: int) -> Iterator[Tuple[str, int]]:
+        """
+        Last resort for a single overlong word: cut by characters, shrinking
+        each cut until it measures within limit.
+        """
+        while text:
+            end = min(len(text), limit)
+            n = self._length(text[:end])
 
-        while start < len(text):
-            end = start + self.chunk_size
-            chunk = text[start:end]
-            chunks.append(chunk)
-            start = end - self.chunk_overlap
+            while n > limit and end > 1:
+                end = max(1, end * limit // n)
+                n = self._length(text[:end])
 
-        return chunks
+            yield text[:end], n
+            text = text[end:]
@@ -1,40 +1,212 @@
-from typing import List
+import atexit
+import copy
+import platform
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
 try:
     from sentence_transformers import SentenceTransformer
 except ImportError:
     SentenceTransformer = None
 
+from src.cache.embeddings import EmbeddingCache
+from src.utils.hash import text_hash
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_BATCH_SIZE = 64
+
+BACKENDS = ("torch", "onnx", "openvino")
+
+# int8 exports shipped in the sentence-transformers model repos
+QUANTIZED_FILES = {
+    "onnx": (
+        "onnx/model_qint8_arm64.onnx"
+        if platform.machine().lower() in ("arm64", "aarch64")
+        else "onnx/model_quint8_avx2.onnx"
+    ),
+    "openvino": "openvino/openvino_model_qint8_quantized.xml",
+}
+
 
 class Embedder:
     """
     Lazily loads the embedding model only when first used.
+    With a cache, texts embedded before by the same model skip the model.
+
+    backend: "torch" (default), or "onnx" / "openvino" CPU runtimes.
+    quantized: load the int8 export of the model (onnx / openvino only).
+    processes: if > 0, encode on a pool of worker processes, each holding
+    its own copy of the model. The pool starts on first use and lives until
+    close(), so repeated ingests pay the model load once.
+    Embeddings are returned as float32 numpy arrays, never Python lists.
     """
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        cache: Optional[EmbeddingCache] = None,
+        backend: str = "torch",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        quantized: bool = False,
+        processes: int = 0,
+    ):
         if SentenceTransformer is None:
             raise ImportError(
                 "sentence-transformers is not installed. "
                 "Run `pip install sentence-transformers`."
             )
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend}")
+        if quantized and backend == "torch":
+            raise ValueError("Quantized models need the onnx or openvino backend.")
 
         self.model_name = model_name
+        self.cache = cache
+        self.backend = backend
+        self.batch_size = batch_size
+        self.quantized = quantized
+        self.processes = processes
         self._model = None
+        # token counting (chunker thread) uses its own copy of the
+        # tokenizer: encode() reconfigures the model's fast tokenizer,
+        # which fails with "Already borrowed" if used concurrently
+        self._counter = None
+        self._count_lock = threading.Lock()
+        self._pool = None
+        # the model may be first needed by the chunking or the embedding thread
+        self._load_lock = threading.Lock()
         self.dimension = None
+        # number of texts actually sent to the model
+        self.encoded = 0
+
+    @property
+    def variant(self) -> str:
+        """
+        Cache namespace: runtimes and int8 weights give slightly different
+        vectors, so they must not share cache entries.
+        """
+        if self.backend == "torch":
+            return self.model_name
+        suffix = ":int8" if self.quantized else ""
+        return f"{self.model_name}:{self.backend}{suffix}"
+
+    def config(self) -> Dict:
+        """
+        The settings that determine the vectors, to rebuild an equivalent
+        Embedder for queries: Embedder(**config).
+        """
+        return {"model_name": self.model_name, "backend": self.backend, "quantized": self.quantized}
 
     def _load_model(self):
         if self._model is not None:
             return
 
-        self._model = SentenceTransformer(self.model_name)
-        self.dimension = self._model.get_sentence_embedding_dimension()
+        with self._load_lock:
+            if self._model is not None:
+                return
 
-    def embed(self, texts: List[str]) -> List[List[float]]:
-        if not texts:
-            return []
+            kwargs = {}
+            if self.backend != "torch":
+                kwargs["backend"] = self.backend
+                if self.quantized:
+                    kwargs["model_kwargs"] = {"file_name": QUANTIZED_FILES[self.backend]}
+
+            model = SentenceTransformer(self.model_name, **kwargs)
+            self.dimension = model.get_sentence_embedding_dimension()
+            self._counter = copy.deepcopy(model.tokenizer)
+            self._model = model
+
+    @property
+    def max_tokens(self) -> int:
+        """
+        Longest input the model encodes without truncation, excluding the
+        special tokens added around every sequence.
+        """
+        self._load_model()
+        with self._count_lock:
+            special = self._counter.num_special_tokens_to_add(pair=False)
+        return self._model.max_seq_length - special
 
+    def count_tokens(self, text: str) -> int:
         self._load_model()
-        embeddings = self._model.encode(texts, convert_to_numpy=True)
-        return embeddings.tolist()
+        with self._count_lock:
+            return len(
+                self._counter(
+                    text, add_special_tokens=False, verbose=False
+                )["input_ids"]
+            )
+
+    def _start_pool(self):
+        if self._pool is not None or self.processes <= 0:
+            return
+
+        self._pool = self._model.start_multi_process_pool(
+            target_devices=["cpu"] * self.processes
+        )
+        atexit.register(self.close)
+
+    def set_processes(self, processes: int):
+        """
+        Resizes the worker pool; the new pool starts on the next encode.
+        """
+        if processes == self.processes:
+            return
+        self.close()
+        self.processes = processes
+
+    def close(self):
+        """
+        Stops the worker pool, if any. The in-process model stays loaded.
+        """
+        if self._pool is None:
+            return
+        SentenceTransformer.stop_multi_process_pool(self._pool)
+        self._pool = None
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encodes in one call; SentenceTransformer.encode already batches
+        texts by length, so each batch pads to similar lengths, and
+        returns rows in input order (each pool worker does the same for
+        its slice).
+        """
+        self._load_model()
+        self._start_pool()
+        self.encoded += len(texts)
+
+        kwargs = {"pool": self._pool} if self._pool is not None else {}
+        return np.asarray(
+            self._model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+                **kwargs,
+            ),
+            dtype=np.float32,
+        )
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Returns a (len(texts), dimension) float32 array.
+        """
+        if not texts:
+            return np.empty((0, self.dimension or 0), dtype=np.float32)
+
+        if self.cache is None:
+            return self._encode(texts)
+
+        keys = [text_hash(t) for t in texts]
+        vectors = self.cache.get_many(self.variant, keys)
+
+        missing = {k: t for k, t in zip(keys, texts) if k not in vectors}
+        if missing:
+            fresh = dict(zip(missing, self._encode(list(missing.values()))))
+            self.cache.set_many(self.variant, fresh)
+            vectors.update(fresh)
+
+        return np.stack([vectors[k] for k in keys])
 
-    def embed_query(self, query: str) -> List[float]:
+    def embed_query(self, query: str) -> np.ndarray:
         return self.embed([query])[0]
@@ -1,123 +1,530 @@
-import uuid
+import os
+import queue
+import threading
+from collections import defaultdict
 from pathlib import Path
-from typing import Dict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
-import chromadb
+import numpy as np
 
 from src.ingest.loader import DirectoryLoader, Document
-from src.ingest.chunker import Chunker
-from src.ingest.embedder import Embedder
-from src.utils.registry import register_files
+from src.ingest.chunker import Chunk, Chunker
+from src.ingest.embedder import DEFAULT_MODEL, Embedder
+from src.cache.cache import Cache
+from src.cache.embeddings import EmbeddingCache
+from src.retrieval.chunk_store import DB_PATH as STORE_PATH, ChunkStore
+from src.retrieval.analyzer import Analyzer
+from src.retrieval.keyword_index import INDEX_PATH, KeywordIndex
+from src.retrieval.vector_store import ChromaVectorStore, open_vector_store
+from src.utils.hash import text_hash
+from src.utils.registry import (
+    FileRecord, bump_generation, get_directory_files, register_files, remove_files,
+    set_embedder_config,
+)
 from src.utils.utils import log, log_warn, log_error
 
 BATCH_SIZE = 500
+QUEUE_DEPTH = 2
+# page size when backfilling the keyword index, chunk store or vector store
+BACKFILL_PAGE = 500
+
+_DONE = object()
+
+
+@dataclass
+class _Batch:
+    chunks: List[Chunk] = field(default_factory=list)
+    # ids of chunks from previous versions of modified files
+    stale_ids: List[str] = field(default_factory=list)
+    # their previous file hashes, for answer cache invalidation
+    stale_hashes: List[str] = field(default_factory=list)
+    embedded: int = 0
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """
+    Blocking put that gives up once the pipeline is stopped.
+    """
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    """
+    Blocking get that returns _DONE once the pipeline is stopped.
+    """
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _start_stage(
+    fn: Callable[[], None],
+    stop: threading.Event,
+    errors: List[Exception],
+) -> threading.Thread:
+    def run():
+        try:
+            fn()
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    return t
 
 
 class Indexer:
     """
     Coordinates ingestion:
-    Loader -> Chunker -> Embedder -> ChromaDB -> Registry
+    Loader -> Chunker -> Embedder -> ChromaDB + keyword index + chunk store -> Registry
     """
 
     def __init__(
         self,
         persist_path: str = "data/chroma",
         collection_name: str = "soko_docs",
+        workers: int = 1,
+        model_name: str = DEFAULT_MODEL,
+        embedder: Optional[Embedder] = None,
+        embed_processes: int = 0,
+        pdf_engine: str = "fast",
+        keyword_path: Path = INDEX_PATH,
+        store_path: Path = STORE_PATH,
+        analyzer: Optional[Analyzer] = None,
+        vector_backend: Optional[str] = None,
+        quantization: Optional[str] = None,
     ):
+        """
+        embedder: a preconfigured Embedder (backend, batch size, quantization).
+        By default one is created lazily for model_name with the disk cache.
+        embed_processes: size of the embedding worker pool (0 = in-process).
+        pdf_engine: see DirectoryLoader.
+        keyword_path: where the persistent BM25 index is kept.
+        store_path: where chunk texts and metadata are kept for searchers.
+        analyzer: keyword analyzer settings (e.g. Analyzer(stem=True)); a
+        change rebuilds the keyword index on the next ingest.
+        vector_backend: "chroma" or "flat" (see open_vector_store); searchers
+        must use the same one.
+        quantization: "int8" or "binary" writes compact first-pass codes
+        with each row (flat backend only); searches rescore their best
+        candidates against the float16 rows on disk.
+        Keep one Indexer alive across ingests to reuse the loaded pool.
+        """
         self.persist_path = persist_path
         self.collection_name = collection_name
+        self.workers = workers
+        self.embed_processes = embed_processes
+        self.pdf_engine = pdf_engine
+        self.model_name = embedder.model_name if embedder else model_name
 
-        self.client = None
-        self.collection = None
+        self.vectors = open_vector_store(vector_backend, persist_path, collection_name, quantization)
+        self.keyword = KeywordIndex(keyword_path, analyzer)
+        self.store_path = store_path
+        self.store = None
+        # vectors are read from the chunking thread and written from the caller
+        self._db_lock = threading.Lock()
 
-        self.chunker = Chunker()
-        self.embedder = None  # lazy init
+        self.embedder = embedder  # lazy init unless provided
+        self.chunker = Chunker(tokenizer=embedder) if embedder else None
 
     # ---------- internal ----------
 
     def _init_db(self):
-        if self.client:
+        if self.store:
             return
 
-        Path(self.persist_path).parent.mkdir(parents=True, exist_ok=True)
-        log(f"[system] Initializing vector database at {self.persist_path}")
-
-        self.client = chromadb.PersistentClient(path=self.persist_path)
-        self.collection = self.client.get_or_create_collection(self.collection_name)
+        log(f"[system] Initializing {self.vectors.name} vector store")
+        self.vectors.apply_settings()
+        self.store = ChunkStore(self.store_path)
 
     def _init_embedder(self):
+        """
+        Creates the embedder and its token-aware chunker. Cheap: the model
+        itself loads on first use, so runs with nothing new never load it.
+        """
         if self.embedder:
+            self.embedder.set_processes(self.embed_processes)
+        else:
+            log(f"[system] Initializing embedder ({self.model_name})")
+            self.embedder = Embedder(
+                self.model_name,
+                cache=EmbeddingCache(),
+                processes=self.embed_processes,
+            )
+
+        if self.chunker is None:
+            self.chunker = Chunker(tokenizer=self.embedder)
+
+    def ensure_indexes(self):
+        """
+        Fills the indexes that are missing or outdated once, for data
+        ingested before they existed: the flat vector store from the chroma
+        collection, the chunk store from chroma documents, and the keyword
+        index from the chunk store.
+        """
+        with self._db_lock:
+            self._init_db()
+            if not self.vectors.stores_documents and not self.vectors.count():
+                self._migrate_vectors()
+
+            total = self.vectors.count()
+            if total and self.vectors.stores_documents and not self.store.size():
+                log(f"[system] Storing {total} existing chunks for search")
+                for page in self.vectors.iter_pages(BACKFILL_PAGE):
+                    self.store.set_many(page["ids"], page["documents"], page["metadatas"])
+
+            if total and (not self.keyword.count() or self.keyword.needs_rebuild()):
+                # also covers changed analyzer settings and indexes without
+                # filter facets: everything must be re-derived
+                log(f"[system] Indexing {total} existing chunks for keyword search")
+                self.keyword.clear()
+                for ids, texts, metas in self.store.iter_pages(BACKFILL_PAGE):
+                    self.keyword.add(ids, texts, metas)
+                self.keyword.commit()
+
+    def _migrate_vectors(self):
+        """
+        Copies embeddings from an existing chroma collection into an empty
+        backend that does not keep documents, so switching needs no re-embed.
+        """
+        if not Path(self.persist_path).exists():
             return
 
-        log("[system] Loading embedding model")
-        self.embedder = Embedder()
+        chroma = ChromaVectorStore(self.persist_path, self.collection_name)
+        total = chroma.count()
+        if total:
+            log(f"[system] Copying {total} embeddings into the {self.vectors.name} vector store")
+            for page in chroma.iter_pages(BACKFILL_PAGE, embeddings=True):
+                self.vectors.upsert(
+                    page["ids"], page["embeddings"], page["documents"], page["metadatas"]
+                )
+                self.store.set_many(page["ids"], page["documents"], page["metadatas"])
+        chroma.close()
 
-    # ---------- public ----------
+    def count(self) -> int:
+        """
+        Number of chunks in the index.
+        """
+        with self._db_lock:
+            self._init_db()
+            return self.vectors.count()
 
-    def ingest(self, path: str) -> bool:
+    @staticmethod
+    def _doc_id_forms(path: Path) -> List[str]:
         """
-        Ingest a directory or a single file.
-        Returns True if anything was ingested.
+        doc_ids a file's chunks may be stored under: the resolved path, or
+        the path as given at ingest time (relative to the working
+        directory, as data/ is), for chunks from before doc_ids were resolved.
         """
-        loader = DirectoryLoader(path)
-        documents = loader.load()
+        resolved = path.resolve()
+        forms = [str(resolved), str(path)]
+        try:
+            forms.append(os.path.relpath(resolved))
+        except ValueError:
+            # another drive on Windows
+            pass
+        return list(dict.fromkeys(forms))
 
-        if not documents:
-            log_warn("[system-warning] Nothing new to ingest.")
-            return False
+    def _stale_chunk_ids(self, path: Path) -> List[str]:
+        with self._db_lock:
+            self._init_db()
+            ids: List[str] = []
+            for doc_id in self._doc_id_forms(path):
+                ids += self.vectors.ids_for_doc(doc_id)
+            return list(dict.fromkeys(ids))
 
-        # Chunk
-        chunks = self.chunker.chunk(documents)
-        if not chunks:
-            log_warn("[system-warning] No chunks created.")
-            return False
+    def _chunk_id(self, chunk: Chunk, occurrence: int) -> str:
+        """
+        Content-addressed id: the same text from the same file under the
+        same model always maps to the same row. The doc_id is part of the
+        key so deleting one file's chunks never touches another file's rows;
+        `occurrence` keeps repeated text within one file distinct.
+        """
+        return text_hash(
+            f"{self.model_name}\0{chunk.meta['chunk_hash']}"
+            f"\0{chunk.meta['doc_id']}\0{occurrence}"
+        )
+
+    # ---------- pipeline stages ----------
+
+    def _produce_batches(self, documents: Iterator[Document], out_q, stop):
+        """
+        Stage 1: load -> chunk, grouped into batches of BATCH_SIZE chunks.
+        For modified files, the old chunk ids ride along for deletion.
+        """
+        batch = _Batch()
+        occurrences: Dict[str, int] = defaultdict(int)
+
+        def track(docs: Iterator[Document]) -> Iterator[Document]:
+            # the chunker finishes one document before pulling the next
+            for doc in docs:
+                occurrences.clear()
+                if doc.previous_hash is not None:
+                    batch.stale_ids.extend(
+                        self._stale_chunk_ids(doc.path)
+                    )
+                    batch.stale_hashes.append(doc.previous_hash)
+                yield doc
+
+        for chunk in self.chunker.iter_chunks(track(documents)):
+            n = occurrences[chunk.meta["chunk_hash"]]
+            occurrences[chunk.meta["chunk_hash"]] += 1
+            chunk.id = self._chunk_id(chunk, n)
+            batch.chunks.append(chunk)
 
-        # Init heavy resources only now
-        self._init_db()
+            if len(batch.chunks) >= BATCH_SIZE:
+                if not _put(out_q, batch, stop):
+                    return
+                batch = _Batch()
+
+        if (batch.chunks or batch.stale_ids or batch.stale_hashes) and not _put(out_q, batch, stop):
+            return
+
+        _put(out_q, _DONE, stop)
+
+    def _embed_batches(self, in_q, out_q, stop):
+        """
+        Stage 2: embed each chunk batch while the previous one is being written.
+        Texts already in the embedding cache never reach the model.
+        """
+        while True:
+            batch = _get(in_q, stop)
+            if batch is _DONE:
+                break
+
+            if batch.chunks:
+                before = self.embedder.encoded
+                embeddings = self.embedder.embed([c.text for c in batch.chunks])
+                for c, emb in zip(batch.chunks, embeddings):
+                    c.embedding = emb
+                batch.embedded = self.embedder.encoded - before
+
+            if not _put(out_q, batch, stop):
+                return
+
+        _put(out_q, _DONE, stop)
+
+    def _remove_deleted(self, loader: DirectoryLoader) -> List[str]:
+        """
+        Sync mode: drop chunks and registry rows of files gone from disk.
+        Returns the hashes the removed files were registered with.
+        """
+        return self._remove_files(loader.find_deleted(), "deleted")
+
+    def _remove_files(self, files: List[Tuple[Path, str]], reason: str) -> List[str]:
+        """
+        Drops chunks and registry rows of registered files, given as
+        (directory, file name). Returns the hashes they were registered with.
+        """
+        if not files:
+            return []
+
+        hashes = []
+        by_dir: Dict[Path, List[str]] = defaultdict(list)
+        for directory, name in files:
+            ids = self._stale_chunk_ids(directory / name)
+            if ids:
+                with self._db_lock:
+                    self.vectors.delete(ids)
+                    self.store.delete(ids)
+                self.keyword.delete(ids)
+            by_dir[directory].append(name)
+            log(f"[system] Removed {reason} file: {directory / name}")
+
+        for directory, names in by_dir.items():
+            known = get_directory_files(directory)
+            hashes.extend(known[name].hash for name in names if name in known)
+            remove_files(directory, names)
+
+        return hashes
+
+    # ---------- public ----------
+
+    def ingest(
+        self,
+        path: str,
+        sync: bool = False,
+        workers: Optional[int] = None,
+    ) -> bool:
+        """
+        Ingest a directory or a single file.
+        Returns True if the index changed.
+
+        Runs as a streaming pipeline:
+        load -> chunk (thread) -> embed (thread) -> write (caller)
+        Stages are joined by bounded queues, so at most QUEUE_DEPTH batches
+        wait between any two stages and memory does not grow with corpus size.
+
+        Modified files always replace their previous chunks. With sync=True,
+        files that were deleted from disk are also removed from the index.
+        workers overrides the loader pool size for this call only.
+        """
+        loader = DirectoryLoader(
+            path,
+            workers=workers or self.workers,
+            pdf_engine=self.pdf_engine,
+        )
         self._init_embedder()
+        self.ensure_indexes()
 
-        texts = [c.text for c in chunks]
-        metadatas = [c.meta for c in chunks]
-        ids = [str(uuid.uuid4()) for _ in chunks]
+        chunk_q: queue.Queue = queue.Queue(maxsize=QUEUE_DEPTH)
+        embed_q: queue.Queue = queue.Queue(maxsize=QUEUE_DEPTH)
+        stop = threading.Event()
+        errors: List[Exception] = []
 
-        log(f"[system] Embedding {len(chunks)} chunks")
-        embeddings = self.embedder.embed(texts)
+        stages = [
+            _start_stage(
+                lambda: self._produce_batches(loader.iter_load(), chunk_q, stop),
+                stop, errors,
+            ),
+            _start_stage(
+                lambda: self._embed_batches(chunk_q, embed_q, stop),
+                stop, errors,
+            ),
+        ]
+
+        # parent dir -> {file name: registry record}
+        file_maps: Dict[str, Dict[str, FileRecord]] = defaultdict(dict)
+        written = 0
+        embedded = 0
+        stale_hashes: List[str] = []
+        committed = False
 
-        log("[system] Writing embeddings to ChromaDB")
         try:
-            for i in range(0, len(ids), BATCH_SIZE):
-                self.collection.add(
-                    ids=ids[i : i + BATCH_SIZE],
-                    embeddings=embeddings[i : i + BATCH_SIZE],
-                    documents=texts[i : i + BATCH_SIZE],
-                    metadatas=metadatas[i : i + BATCH_SIZE],
+            while True:
+                batch = _get(embed_q, stop)
+                if batch is _DONE:
+                    break
+
+                try:
+                    with self._db_lock:
+                        self._init_db()
+                        if batch.stale_ids:
+                            self.vectors.delete(batch.stale_ids)
+                        if batch.chunks:
+                            # upsert: re-ingesting identical content is a no-op
+                            self.vectors.upsert(
+                                [c.id for c in batch.chunks],
+                                np.stack([c.embedding for c in batch.chunks]),
+                                [c.text for c in batch.chunks],
+                                [c.meta for c in batch.chunks],
+                            )
+                        self.store.delete(batch.stale_ids)
+                        self.store.set_many(
+                            [c.id for c in batch.chunks],
+                            [c.text for c in batch.chunks],
+                            [c.meta for c in batch.chunks],
+                        )
+                except Exception as e:
+                    log_error(f"[system-error] Failed to write to the vector store: {e}")
+                    return False
+
+                self.keyword.delete(batch.stale_ids)
+                self.keyword.add(
+                    [c.id for c in batch.chunks],
+                    [c.text for c in batch.chunks],
+                    [c.meta for c in batch.chunks],
                 )
-        except Exception as e:
-            log_error(f"[system-error] Failed to write to ChromaDB: {e}")
+
+                for c in batch.chunks:
+                    files = file_maps[c.meta["parent"]]
+                    record = files.get(c.meta["filename"])
+                    if record is None:
+                        record = files[c.meta["filename"]] = FileRecord(
+                            hash=c.meta["hash"],
+                            size=c.meta["size"],
+                            mtime_ns=c.meta["mtime_ns"],
+                            inode=c.meta["inode"],
+                        )
+                    record.chunk_count += 1
+
+                written += len(batch.chunks)
+                embedded += batch.embedded
+                stale_hashes += batch.stale_hashes
+                log(f"[system] Stored {written} chunks")
+
+            if errors:
+                log_error(f"[system-error] Ingestion failed: {errors[0]}")
+                return False
+
+            # modified files that no longer load lose their old chunks too
+            removed_hashes = self._remove_files(loader.unreadable, "unreadable")
+            removed_hashes += self._remove_deleted(loader) if sync else []
+            removed = len(removed_hashes)
+            stale_hashes += removed_hashes
+
+            # new postings are published only once every vector write succeeded
+            self.keyword.commit()
+            committed = True
+        finally:
+            stop.set()
+            for t in stages:
+                t.join()
+            if not committed:
+                self.keyword.rollback()
+
+        if not written and not removed:
+            log_warn("[system-warning] Nothing new to ingest.")
             return False
 
         # ---- registry update (commit point) ----
-        file_map: Dict[str, str] = {}
-        for doc in documents:
-            file_map[doc.path.name] = doc.meta["hash"]
-
-        parent_dir = documents[0].path.parent
-        register_files(
-            directory=parent_dir,
-            file_map=file_map,
-            chunk_count=len(chunks),
-        )
+        for parent, files in file_maps.items():
+            register_files(directory=Path(parent), files=files)
+        # searchers embed queries with the same model
+        set_embedder_config(self.embedder.config())
+        self._invalidate_answers(stale_hashes)
+        # invalidates cached search results everywhere
+        bump_generation()
 
+        file_total = sum(len(m) for m in file_maps.values())
         log(
             f"[system] Ingestion complete. "
-            f"Stored {len(chunks)} chunks from {len(file_map)} files."
+            f"Stored {written} chunks from {file_total} files "
+            f"({embedded} newly embedded, {removed} files removed)."
         )
         return True
 
+    def _invalidate_answers(self, hashes: List[str]):
+        """
+        Drops cached answers built on previous versions of changed or
+        deleted files. Answers from other files stay cached.
+        """
+        if not hashes:
+            return
+        cache = Cache()
+        try:
+            dropped = cache.invalidate_files(hashes)
+        finally:
+            cache.close()
+        if dropped:
+            log(f"[system] Dropped {dropped} cached answers based on changed files")
+
     def close(self):
         """
         Explicitly release DB resources.
         Required for reset on Windows.
         """
-        self.client = None
-        self.collection = None
+        self.vectors.close()
+        self.keyword.close()
+        if self.store:
+            self.store.close()
+            self.store = None
+
+    def shutdown(self):
+        """
+        close() plus stopping the embedding worker pool, if one is running.
+        """
+        self.close()
+        if self.embedder:
+            self.embedder.close()
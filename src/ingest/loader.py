@@ -1,23 +1,47 @@
+import os
 import time
-import csv
-import json
 import pdfplumber
+try:
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_c
+except ImportError:
+    pdfium = None
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import logging
-from typing import List, Union
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 logging.getLogger("pdfminer").setLevel(logging.ERROR)
 
+from src.cache.text import ExtractedTextCache
+from src.ingest.records import RecordStream
 from src.utils.utils import log, log_warn
 from src.utils.hash import file_hash
-from src.utils.registry import is_file_ingested
+from src.utils.registry import (
+    FileRecord,
+    get_directory_files,
+    list_files_under,
+    refresh_file_stats,
+)
 
 
 class Document:
-    def __init__(self, path: Path, text: str, meta: dict):
+    def __init__(
+        self,
+        path: Path,
+        text: str,
+        meta: dict,
+        previous_hash: Optional[str] = None,
+        records: Optional[RecordStream] = None,
+    ):
         self.path = path
         self.text = text
         self.meta = meta
+        # hash this file was last ingested with, if it was modified since
+        self.previous_hash = previous_hash
+        # record-oriented files (CSV / JSON) are streamed, not held as text
+        self.records = records
 
     def __repr__(self):
         return f"{self.path.name} ({self.meta.get('extension')})"
@@ -27,8 +51,28 @@ class DirectoryLoader:
     """
     Discovers and loads supported files from a directory OR a single file.
     Enforces deduplication using content hashes.
+
+    With workers > 1, hashing and parsing run in a process pool. Results
+    are still returned in file order, and at most `workers * IN_FLIGHT_PER_WORKER`
+    files are queued in the pool at any time.
+
+    pdf_engine:
+      "fast"       pdfium text extraction, pdfplumber only for pages that
+                   look like tables or yield no text (default)
+      "pdfplumber" full pdfplumber layout analysis on every page
+    Extracted PDF pages are cached by file hash, so a PDF is parsed once.
+
+    skip_known: skip files already in the ingestion registry; False loads
+    every file (benchmarks) and leaves the registry untouched.
     """
 
+    IN_FLIGHT_PER_WORKER = 4
+    PDF_ENGINES = ("fast", "pdfplumber")
+
+    # drawn paths (ruling lines, cell borders) above which a page is
+    # treated as a table and handed to pdfplumber
+    LAYOUT_PATH_THRESHOLD = 20
+
     SUPPORTED = {
         ".txt": "text",
         ".md":  "text",
@@ -36,67 +80,205 @@ class DirectoryLoader:
         ".py":  "code",
         ".csv": "csv",
         ".json": "json",
+        ".jsonl": "jsonl",
     }
 
-    def __init__(self, path: Union[str, Path]):
+    def __init__(
+        self,
+        path: Union[str, Path],
+        workers: int = 1,
+        pdf_engine: str = "fast",
+        skip_known: bool = True,
+    ):
+        if pdf_engine not in self.PDF_ENGINES:
+            raise ValueError(f"Unknown PDF engine: {pdf_engine}")
+        if pdf_engine == "fast" and pdfium is None:
+            log_warn("pypdfium2 is not installed; using pdfplumber for PDFs.")
+            pdf_engine = "pdfplumber"
+
         self.path = Path(path)
+        self.workers = max(1, workers)
+        self.pdf_engine = pdf_engine
+        self.skip_known = skip_known
+        self.text_cache = ExtractedTextCache()
+        # (directory, file name) of registered files that were modified and
+        # now load as empty or fail to parse; filled in by iter_load
+        self.unreadable: List[Tuple[Path, str]] = []
 
     def load(self) -> List[Document]:
+        return list(self.iter_load())
+
+    def iter_load(self) -> Iterator[Document]:
+        """
+        Yields new documents one at a time, in file order.
+        Nothing is accumulated, so callers can stream arbitrarily large trees.
+        """
         start_time = time.time()
+        self.unreadable = []
 
         files = self._collect_files()
         total = len(files)
 
         if total == 0:
             log_warn("No supported files found.")
-            return []
+            return
 
-        log(f"Found {total} supported files. Starting ingestion...")
+        log(
+            f"Found {total} supported files. Starting ingestion "
+            f"with {self.workers} worker(s)..."
+        )
 
-        docs: List[Document] = []
-        processed = 0
+        loaded = 0
         skipped = 0
 
-        for idx, file_path in enumerate(files, start=1):
-            processed += 1
+        # progress is reported as results come back, so the ETA reflects
+        # wall-clock throughput of the whole pool, not a single file
+        for idx, (file_path, doc, already) in enumerate(
+            self._iter_results(files), start=1
+        ):
             elapsed = time.time() - start_time
-            avg_time = elapsed / processed
-            remaining = avg_time * (total - processed)
+            avg_time = elapsed / idx
+            remaining = avg_time * (total - idx)
 
             log(
-                f"[system] ({idx}/{total}) Processing: {file_path.name} "
+                f"[system] ({idx}/{total}) Processed: {file_path.name} "
                 f"| elapsed: {elapsed:.1f}s | ETA: {remaining:.1f}s"
             )
 
-            file_hash_value = file_hash(file_path)
-            parent = file_path.parent.resolve()
-
-            if is_file_ingested(parent, file_path.name, file_hash_value):
+            if already:
                 skipped += 1
                 log(f"Skipping already ingested file: {file_path.name}")
                 continue
 
-            loader_type = self.SUPPORTED[file_path.suffix.lower()]
-            text = self._dispatch(file_path, loader_type)
-
-            if not text or not text.strip():
+            if doc is None:
                 log_warn(f"Failed to load file: {file_path.name}")
                 continue
 
-            meta = self._build_metadata(file_path, file_hash_value)
-            docs.append(Document(file_path, text, meta))
+            loaded += 1
+            yield doc
 
         total_time = time.time() - start_time
         log(
             f"[system] Ingestion complete. "
-            f"Loaded {len(docs)} new documents "
+            f"Loaded {loaded} new documents "
             f"(skipped {skipped}) in {total_time:.1f}s."
         )
 
-        return docs
+    def find_deleted(self) -> List[Tuple[Path, str]]:
+        """
+        Registered files under this path that no longer exist on disk,
+        as (directory, file name) pairs.
+        """
+        if self.path.suffix.lower() in self.SUPPORTED and not self.path.is_dir():
+            parent = self.path.parent.resolve()
+            known = get_directory_files(parent)
+            if self.path.name in known and not self.path.exists():
+                return [(parent, self.path.name)]
+            return []
+
+        return [
+            (directory, name)
+            for directory, name in list_files_under(self.path)
+            if not (directory / name).exists()
+        ]
 
     # ---------- helpers ----------
 
+    def _iter_results(
+        self, files: List[Path]
+    ) -> Iterator[Tuple[Path, Optional[Document], bool]]:
+        """
+        Yields `_load_file` results in the same order as `files`.
+        Files whose size, mtime and inode match the registry are skipped
+        here, before any hashing is scheduled.
+        """
+        known_dirs: Dict[Path, Dict[str, FileRecord]] = {}
+        touched: List[Tuple[Path, str, os.stat_result]] = []
+
+        def schedule(file_path: Path, submit):
+            parent = file_path.parent.resolve()
+            if parent not in known_dirs:
+                known_dirs[parent] = get_directory_files(parent) if self.skip_known else {}
+
+            known = known_dirs[parent].get(file_path.name)
+            stat = file_path.stat()
+
+            if known is not None and known.matches_stat(stat):
+                return None, (file_path, None, True)
+
+            known_hash = known.hash if known is not None else None
+            return (parent, stat, known_hash), submit(self._load_file, file_path, stat, known_hash)
+
+        def resolve(job, result):
+            if job is None:
+                return result
+            parent, stat, known_hash = job
+            # content unchanged but stat moved on: refresh it for next time
+            if result[2]:
+                touched.append((parent, result[0].name, stat))
+            # its previous version must not keep being served
+            elif result[1] is None and known_hash is not None:
+                self.unreadable.append((parent, result[0].name))
+            return result
+
+        if self.workers == 1:
+            for file_path in files:
+                job, result = schedule(file_path, lambda fn, *a: fn(*a))
+                yield resolve(job, result)
+        else:
+            max_in_flight = self.workers * self.IN_FLIGHT_PER_WORKER
+
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                pending = deque()
+
+                for file_path in files:
+                    pending.append(schedule(file_path, pool.submit))
+
+                    if len(pending) >= max_in_flight:
+                        job, fut = pending.popleft()
+                        yield resolve(job, fut if job is None else fut.result())
+
+                while pending:
+                    job, fut = pending.popleft()
+                    yield resolve(job, fut if job is None else fut.result())
+
+        refresh_file_stats(touched)
+
+    def _load_file(
+        self,
+        file_path: Path,
+        stat: os.stat_result,
+        known_hash: Optional[str],
+    ) -> Tuple[Path, Optional[Document], bool]:
+        """
+        Hash, dedupe-check and parse one file.
+        Returns (path, document or None, already_ingested).
+        Runs inside pool workers, so it must stay picklable and must not
+        touch the registry; the caller passes in the known hash instead.
+        """
+        file_hash_value = file_hash(file_path)
+
+        if file_hash_value == known_hash:
+            return file_path, None, True
+
+        loader_type = self.SUPPORTED[file_path.suffix.lower()]
+        content = self._dispatch(file_path, loader_type, file_hash_value)
+
+        if isinstance(content, RecordStream):
+            text, records = "", content
+        else:
+            text, records = content, None
+            if not text or not text.strip():
+                return file_path, None, False
+
+        meta = self._build_metadata(file_path, file_hash_value, stat)
+        doc = Document(
+            file_path, text, meta,
+            previous_hash=known_hash,
+            records=records,
+        )
+        return file_path, doc, False
+
     def _collect_files(self) -> List[Path]:
         if self.path.is_file():
             return (
@@ -110,47 +292,86 @@ class DirectoryLoader:
             if p.is_file() and p.suffix.lower() in self.SUPPORTED
         )
 
-    def _dispatch(self, path: Path, kind: str) -> str | None:
+    def _dispatch(
+        self, path: Path, kind: str, hash_value: Optional[str] = None
+    ) -> str | RecordStream | None:
         try:
             if kind == "text" or kind == "code":
                 return path.read_text(encoding="utf-8", errors="ignore")
 
             if kind == "pdf":
-                return self._load_pdf(path)
-
-            if kind == "csv":
-                return self._load_csv(path)
+                return self._load_pdf(path, hash_value)
 
-            if kind == "json":
-                return json.dumps(json.loads(path.read_text()), indent=2)
+            if kind in ("csv", "json", "jsonl"):
+                records = RecordStream(path, kind)
+                return None if records.is_empty() else records
 
         except Exception:
             return None
 
         return None
 
-    def _load_pdf(self, path: Path) -> str:
-        pages = []
-        with pdfplumber.open(path) as pdf:
-            for p in pdf.pages:
-                pages.append(p.extract_text() or "")
+    def _load_pdf(self, path: Path, hash_value: Optional[str] = None) -> str:
+        if hash_value is None:
+            return "\n".join(self._extract_pdf_pages(path))
+
+        pages = self.text_cache.get(hash_value, self.pdf_engine)
+        if pages is None:
+            pages = self._extract_pdf_pages(path)
+            self.text_cache.set(hash_value, self.pdf_engine, pages)
+
         return "\n".join(pages)
 
-    def _load_csv(self, path: Path) -> str:
-        rows = []
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            reader = csv.reader(f)
-            for row in reader:
-                rows.append(" ".join(row))
-        return "\n".join(rows)
+    def _extract_pdf_pages(self, path: Path) -> List[str]:
+        if self.pdf_engine == "pdfplumber":
+            with pdfplumber.open(path) as pdf:
+                return [p.extract_text() or "" for p in pdf.pages]
+
+        pages: List[str] = []
+        plumber = None
+        pdf = pdfium.PdfDocument(path)
 
-    def _build_metadata(self, path: Path, hash_value: str) -> dict:
-        stat = path.stat()
+        try:
+            for i in range(len(pdf)):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                text = textpage.get_text_bounded()
+                needs_layout = not text.strip() or self._looks_tabular(page)
+                textpage.close()
+                page.close()
+
+                if needs_layout:
+                    if plumber is None:
+                        plumber = pdfplumber.open(path)
+                    text = plumber.pages[i].extract_text() or ""
+
+                pages.append(text)
+        finally:
+            pdf.close()
+            if plumber is not None:
+                plumber.close()
+
+        return pages
+
+    def _looks_tabular(self, page) -> bool:
+        paths = page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_PATH], max_depth=2)
+        for n, _ in enumerate(paths, start=1):
+            if n >= self.LAYOUT_PATH_THRESHOLD:
+                return True
+        return False
+
+    def _build_metadata(
+        self, path: Path, hash_value: str, stat: os.stat_result
+    ) -> dict:
+        # stat is taken before hashing, so a write that races the hash
+        # leaves a mismatch and the file is re-checked on the next walk
         return {
             "filename": path.name,
             "extension": path.suffix.lower(),
             "size": stat.st_size,
             "modified": stat.st_mtime,
+            "mtime_ns": stat.st_mtime_ns,
+            "inode": stat.st_ino,
             "parent": str(path.parent.resolve()),
             "hash": hash_value,
         }
@@ -0,0 +1,270 @@
+import csv
+import json
+import re
+from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
+
+from src.utils.utils import log_warn
+
+READ_SIZE = 1 << 16
+
+# keys that need no quoting in a JSON path label
+_PLAIN_KEY = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+Label = Union[int, str]
+
+
+class RecordStream:
+    """
+    Lazily reads a CSV, JSON or JSON Lines file one record at a time.
+
+    Holds only the path, so it can be returned from loader pool workers;
+    the file is opened when the chunker iterates it. Every record comes
+    with a label: the 1-based data row for CSV, the JSON path otherwise.
+    """
+
+    # metadata keys for the first / last record label of a chunk
+    LABEL_KEYS = {
+        "csv": ("row_start", "row_end"),
+        "json": ("json_path", "json_path_end"),
+        "jsonl": ("json_path", "json_path_end"),
+    }
+
+    def __init__(self, path: Path, kind: str):
+        self.path = path
+        self.kind = kind
+
+    def __repr__(self):
+        return f"RecordStream({self.path.name}, {self.kind})"
+
+    @property
+    def label_keys(self) -> Tuple[str, str]:
+        return self.LABEL_KEYS[self.kind]
+
+    def open(self) -> Tuple[str, Iterator[Tuple[Label, str]]]:
+        """
+        Returns (header, records). The header is repeated at the top of
+        every chunk; it is the column row for CSV and empty for JSON.
+        """
+        if self.kind == "csv":
+            f = open(self.path, "r", encoding="utf-8", errors="ignore", newline="")
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                f.close()
+                return "", self._no_records()
+            return ", ".join(header), self._guard(self._iter_csv(f, reader))
+
+        if self.kind == "jsonl":
+            return "", self._guard(self._iter_jsonl())
+
+        return "", self._guard(self._iter_json())
+
+    def is_empty(self) -> bool:
+        _, records = self.open()
+        try:
+            return next(records, None) is None
+        finally:
+            records.close()
+
+    # ---------- readers ----------
+
+    @staticmethod
+    def _no_records() -> Iterator[Tuple[Label, str]]:
+        # a generator, so callers can close() it like any other stream
+        yield from ()
+
+    def _guard(self, records: Iterator[Tuple[Label, str]]) -> Iterator[Tuple[Label, str]]:
+        """
+        A malformed tail ends the stream with a warning instead of
+        failing the whole ingest; records read so far are kept.
+        """
+        try:
+            yield from records
+        except (ValueError, csv.Error) as e:
+            log_warn(f"Stopped reading {self.path.name}: {e}")
+        finally:
+            records.close()
+
+    @staticmethod
+    def _iter_csv(f, reader) -> Iterator[Tuple[Label, str]]:
+        with f:
+            for i, row in enumerate(reader, start=1):
+                if any(cell.strip() for cell in row):
+                    yield i, ", ".join(row)
+
+    def _iter_jsonl(self) -> Iterator[Tuple[Label, str]]:
+        with open(self.path, "r", encoding="utf-8", errors="ignore") as f:
+            for i, line in enumerate(f):
+                if line.strip():
+                    yield f"$[{i}]", _compact(json.loads(line))
+
+    def _iter_json(self) -> Iterator[Tuple[Label, str]]:
+        """
+        Streams the top-level array elements (`$[i]`) or object members
+        (`$.key`) of a JSON document. Elements that do not fit in one
+        READ_SIZE window, like the rows in {"data": [...]}, are streamed
+        element by element in turn, so only one small value is held at a time.
+        """
+        with open(self.path, "r", encoding="utf-8", errors="ignore") as f:
+            reader = _JsonReader(f)
+            if reader.peek() in ("[", "{"):
+                yield from self._iter_elements(reader, "$")
+            elif reader.peek():
+                yield "$", _compact(reader.value())
+
+    def _iter_elements(self, reader: "_JsonReader", path: str) -> Iterator[Tuple[Label, str]]:
+        if reader.peek() == "[":
+            reader.advance()
+            for i in reader.items("]"):
+                yield from self._iter_value(reader, f"{path}[{i}]")
+        else:
+            reader.advance()
+            for key in reader.members():
+                yield from self._iter_value(reader, path + _key_label(key), key)
+
+    def _iter_value(self, reader: "_JsonReader", path: str, key=None) -> Iterator[Tuple[Label, str]]:
+        if reader.peek() in ("[", "{") and not reader.fits():
+            yield from self._iter_elements(reader, path)
+            return
+
+        text = _compact(reader.value())
+        yield path, text if key is None else f"{key}: {text}"
+
+
+def _key_label(key: str) -> str:
+    return f".{key}" if _PLAIN_KEY.fullmatch(key) else f"[{json.dumps(key, ensure_ascii=False)}]"
+
+
+def _compact(value) -> str:
+    # no indent padding: it only inflates chunks and token counts
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, separators=(", ", ": "))
+
+
+class _JsonReader:
+    """
+    Minimal incremental reader over a text file, decoding one JSON value
+    at a time with JSONDecoder.raw_decode on a sliding buffer.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        # (position, value, end) decoded ahead by fits()
+        self._ahead = None
+
+    def _fill(self, size: Optional[int] = None) -> bool:
+        data = self.f.read(size or READ_SIZE)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Next non-whitespace character, or "" at end of file.
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def advance(self):
+        self.pos += 1
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' in JSON at offset {self.pos}")
+        self.advance()
+
+    def fits(self) -> bool:
+        """
+        Whether the next array or object is complete in the buffer, which
+        holds at least READ_SIZE / 2 characters ahead; decoded once if so.
+        """
+        self.peek()
+        # refilling at half a window keeps buffer copies rare
+        while len(self.buf) - self.pos < READ_SIZE // 2 and self._fill():
+            pass
+        try:
+            value, end = self.decoder.raw_decode(self.buf, self.pos)
+        except json.JSONDecodeError:
+            return False
+        self._ahead = (self.pos, value, end)
+        return True
+
+    def value(self):
+        self.peek()
+        if self._ahead is not None and self._ahead[0] == self.pos:
+            _, value, self.pos = self._ahead
+            self._ahead = None
+            return value
+
+        size = READ_SIZE
+
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number or literal touching the buffer end may be cut off
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+
+            # grow the read size so a large value is not re-parsed
+            # once per small read
+            self._fill(size)
+            size *= 2
+
+    def items(self, closer: str):
+        """
+        Yields the index of each element while positioned at it; the
+        caller reads the element before resuming.
+        """
+        if self.peek() == closer:
+            self.advance()
+            return
+
+        i = 0
+        while True:
+            yield i
+            i += 1
+
+            nxt = self.peek()
+            self.advance()
+            if nxt == closer:
+                return
+            if nxt != ",":
+                raise ValueError(f"Expected ',' or '{closer}' in JSON at offset {self.pos}")
+
+    def members(self):
+        """
+        Yields each key while positioned at its value, like items().
+        """
+        if self.peek() == "}":
+            self.advance()
+            return
+
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+
+            nxt = self.peek()
+            self.advance()
+            if nxt == "}":
+                return
+            if nxt != ",":
+                raise ValueError(f"Expected ',' or '}}' in JSON at offset {self.pos}")
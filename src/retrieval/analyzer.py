@@ -0,0 +1,89 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List
+
+try:
+    from nltk.stem.snowball import SnowballStemmer
+except ImportError:
+    SnowballStemmer = None
+
+# runs of letters, digits and underscores; punctuation separates them
+_TOKEN = re.compile(r"\w+")
+
+# camelCase / PascalCase / acronym / digit runs within an ASCII word
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+# longer tokens are hashes, base64 or minified code, never search terms
+MAX_TOKEN_LEN = 40
+
+# Lucene's English stop set
+STOPWORDS = frozenset(
+    """
+    a an and are as at be but by for if in into is it no not of on or
+    such that the their then there these they this to was will with
+    """.split()
+)
+
+
+def _split_case(word: str) -> List[str]:
+    if word.isascii() and not (word.islower() or word.isupper() or word.isdigit()):
+        return _CAMEL.findall(word) or [word]
+    return [word]
+
+
+class Analyzer:
+    """
+    Turns text into index terms; the keyword index uses the same one for
+    chunks and queries.
+
+    - Unicode NFKC normalization and case folding
+    - punctuation dropped, snake_case and camelCase identifiers split
+      into their parts (the whole identifier is kept as a term too)
+    - English stopwords removed (stopwords=False keeps them)
+    - optional Snowball stemming (stem=True, needs nltk)
+    """
+
+    def __init__(self, stopwords: bool = True, stem: bool = False):
+        if stem and SnowballStemmer is None:
+            raise ImportError(
+                "nltk is not installed. "
+                "Run `pip install nltk` to enable stemming."
+            )
+
+        self.stopwords = stopwords
+        self.stem = stem
+        self._stem = (
+            lru_cache(maxsize=100_000)(SnowballStemmer("english").stem) if stem else None
+        )
+
+    def config(self) -> Dict:
+        """
+        Settings stored with an index, so queries are analyzed the same way.
+        """
+        return {"stopwords": self.stopwords, "stem": self.stem}
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "Analyzer":
+        return cls(**config)
+
+    def __call__(self, text: str) -> List[str]:
+        text = unicodedata.normalize("NFKC", text)
+        terms: List[str] = []
+
+        for token in _TOKEN.findall(text):
+            token = token.strip("_")
+            if not token or len(token) > MAX_TOKEN_LEN:
+                continue
+
+            parts = [p for word in token.split("_") if word for p in _split_case(word)]
+            if len(parts) > 1:
+                terms.append(token.casefold())
+            terms.extend(p.casefold() for p in parts)
+
+        if self.stopwords:
+            terms = [t for t in terms if t not in STOPWORDS]
+        if self._stem:
+            terms = [self._stem(t) for t in terms]
+
+        return terms
@@ -0,0 +1,116 @@
+from typing import List, Tuple
+
+import numpy as np
+
+# same parameters as rank_bm25.BM25Okapi
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+
+def build_postings(docs: List[np.ndarray]) -> Tuple[np.ndarray, ...]:
+    """
+    Inverts term-id arrays into (terms, offsets, docs, tfs); the postings
+    of terms[i] are docs/tfs[offsets[i]:offsets[i + 1]].
+    """
+    n = len(docs)
+    lengths = np.fromiter((len(d) for d in docs), dtype=np.int64, count=n)
+    if not lengths.sum():
+        return (
+            np.empty(0, dtype=np.int32),
+            np.zeros(1, dtype=np.int64),
+            np.empty(0, dtype=np.int32),
+            np.empty(0, dtype=np.float32),
+        )
+
+    tids = np.concatenate(docs).astype(np.int64)  # room for tid * n
+    doc_idx = np.repeat(np.arange(n, dtype=np.int64), lengths)
+
+    # one key per (term, doc) pair, sorted by term then doc
+    keys, tfs = np.unique(tids * n + doc_idx, return_counts=True)
+    terms, starts = np.unique(keys // n, return_index=True)
+
+    return (
+        terms.astype(np.int32),
+        np.append(starts, len(keys)).astype(np.int64),
+        (keys % n).astype(np.int32),
+        tfs.astype(np.float32),
+    )
+
+
+def idf(df: np.ndarray, n: int) -> np.ndarray:
+    """
+    Raw Okapi idf; may be negative for terms in over half the corpus.
+    """
+    df = np.asarray(df, dtype=np.float64)
+    return np.log(n - df + 0.5) - np.log(df + 0.5)
+
+
+def mean_idf(df: np.ndarray, n: int) -> float:
+    """
+    Mean idf over the vocabulary (terms with df > 0), used as the floor.
+    """
+    df = np.asarray(df)
+    df = df[df > 0]
+    return float(idf(df, n).mean()) if len(df) else 0.0
+
+
+def floored_idf(df: np.ndarray, n: int, avg_idf: float, epsilon: float = EPSILON) -> np.ndarray:
+    values = idf(df, n)
+    return np.where(values < 0, epsilon * avg_idf, values)
+
+
+def term_scores(
+    term_idf: float,
+    tfs: np.ndarray,
+    doc_len: np.ndarray,
+    avgdl: float,
+    k1: float = K1,
+    b: float = B,
+) -> np.ndarray:
+    """
+    Contribution of one query term to each chunk in its posting list.
+    """
+    norm = k1 * (1 - b + b * doc_len / avgdl)
+    # float64 like rank_bm25, so near-ties rank the same way
+    return term_idf * tfs * (k1 + 1) / (tfs + norm)
+
+
+def accumulate(
+    parts_ids: List[np.ndarray],
+    parts_scores: List[np.ndarray],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sums per-term contributions into (chunk ids, scores).
+    """
+    if not parts_ids:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    ids = np.concatenate(parts_ids)
+    contrib = np.concatenate(parts_scores)
+
+    if len(parts_ids) == 1:
+        return ids, contrib
+
+    uniq, inverse = np.unique(ids, return_inverse=True)
+    return uniq, np.bincount(inverse, weights=contrib)
+
+
+def select_top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """
+    Best k (chunk id, score) pairs with a positive score, highest first;
+    ties go to the lower chunk id.
+    """
+    keep = scores > 0
+    ids, scores = ids[keep], scores[keep]
+    if k <= 0 or not len(ids):
+        return []
+
+    if len(ids) > k:
+        # partial selection, then sort only the survivors
+        kth = scores[np.argpartition(-scores, k - 1)[:k]].min()
+        sel = np.flatnonzero(scores >= kth)
+        ids, scores = ids[sel], scores[sel]
+
+    order = np.lexsort((ids, -scores))[:k]
+    return [(int(ids[i]), float(scores[i])) for i in order]
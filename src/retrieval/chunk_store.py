@@ -0,0 +1,114 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+DB_PATH = Path("data/chunks/chunks.db")
+
+
+class ChunkStore:
+    """
+    On-disk chunk texts and metadata keyed by chunk id.
+    Searchers rank on ids alone and read rows here for the final hits,
+    so no corpus-sized lists are ever held in memory.
+    """
+
+    def __init__(self, db_path: Path = DB_PATH):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        # read from search threads, written from the ingest writer
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _init_db(self):
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                meta TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get_many(self, ids: List[str]) -> Dict[str, Tuple[str, Dict]]:
+        """
+        id -> (text, meta) for the ids that exist.
+        """
+        found: Dict[str, Tuple[str, Dict]] = {}
+        unique = list(dict.fromkeys(ids))
+
+        # stay under SQLite's bound-parameter limit
+        for i in range(0, len(unique), 500):
+            part = unique[i : i + 500]
+            marks = ",".join("?" * len(part))
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT id, text, meta FROM chunks WHERE id IN ({marks})",
+                    part,
+                ).fetchall()
+
+            for chunk_id, text, meta in rows:
+                found[chunk_id] = (text, json.loads(meta))
+
+        return found
+
+    def set_many(self, ids: List[str], texts: List[str], metas: List[Dict]):
+        if not ids:
+            return
+
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, text, meta) VALUES (?, ?, ?)",
+                [
+                    (chunk_id, text, json.dumps(meta, ensure_ascii=False))
+                    for chunk_id, text, meta in zip(ids, texts, metas)
+                ],
+            )
+            self.conn.commit()
+
+    def iter_pages(self, page_size: int = 500) -> Iterator[Tuple[List[str], List[str], List[Dict]]]:
+        """
+        (ids, texts, metas) for every chunk, page by page in id order.
+        """
+        last = ""
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT id, text, meta FROM chunks WHERE id > ? ORDER BY id LIMIT ?",
+                    (last, page_size),
+                ).fetchall()
+            if not rows:
+                return
+
+            last = rows[-1][0]
+            yield (
+                [r[0] for r in rows],
+                [r[1] for r in rows],
+                [json.loads(r[2]) for r in rows],
+            )
+
+    def delete(self, ids: List[str]):
+        if not ids:
+            return
+
+        with self._lock:
+            self.conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in ids])
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM chunks")
+            self.conn.commit()
+
+    def size(self) -> int:
+        with self._lock:
+            cur = self.conn.execute("SELECT COUNT(*) FROM chunks")
+            return cur.fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
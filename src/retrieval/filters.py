@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.utils.registry import list_directories_under
+
+
+@dataclass(frozen=True)
+class Filter:
+    """
+    Metadata filter for scoped searches; hashable, so usable in cache keys.
+
+    parents / extensions: allowed values (None = any)
+    after / before: modification time bounds (after inclusive)
+    """
+
+    parents: Optional[Tuple[str, ...]] = None
+    extensions: Optional[Tuple[str, ...]] = None
+    after: Optional[float] = None
+    before: Optional[float] = None
+
+    @classmethod
+    def parse(
+        cls,
+        directories: Optional[Sequence[str]] = None,
+        extensions: Optional[str] = None,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+    ) -> Optional["Filter"]:
+        """
+        Filter from CLI values, or None if none are given. Directories
+        include the ingested ones below them.
+        """
+        parents = None
+        if directories:
+            found = set()
+            for d in directories:
+                found.update(list_directories_under(Path(d)))
+            parents = tuple(sorted(found))
+
+        exts = None
+        if extensions:
+            exts = tuple(sorted({
+                "." + e.strip().lower().lstrip(".")
+                for e in extensions.split(",") if e.strip()
+            }))
+
+        f = cls(parents, exts, _timestamp(after), _timestamp(before))
+        return f if f.active else None
+
+    @property
+    def active(self) -> bool:
+        return any(v is not None for v in (self.parents, self.extensions, self.after, self.before))
+
+    @property
+    def empty(self) -> bool:
+        """True if nothing can match"""
+        return (
+            self.parents == ()
+            or self.extensions == ()
+            or (self.after is not None and self.before is not None and self.after >= self.before)
+        )
+
+    def matches(self, meta: Dict) -> bool:
+        if self.parents is not None and meta.get("parent") not in self.parents:
+            return False
+        if self.extensions is not None and meta.get("extension") not in self.extensions:
+            return False
+        modified = meta.get("modified")
+        if self.after is not None and (modified is None or modified < self.after):
+            return False
+        if self.before is not None and (modified is None or modified >= self.before):
+            return False
+        return True
+
+    def where(self) -> Optional[Dict]:
+        """
+        The filter as a Chroma `where` clause.
+        """
+        clauses: List[Dict] = []
+        if self.parents is not None:
+            clauses.append({"parent": {"$in": list(self.parents)}})
+        if self.extensions is not None:
+            clauses.append({"extension": {"$in": list(self.extensions)}})
+        if self.after is not None:
+            clauses.append({"modified": {"$gte": self.after}})
+        if self.before is not None:
+            clauses.append({"modified": {"$lt": self.before}})
+
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def describe(self) -> str:
+        parts = []
+        if self.parents is not None:
+            parts.append(f"{len(self.parents)} director{'y' if len(self.parents) == 1 else 'ies'}")
+        if self.extensions is not None:
+            parts.append(",".join(self.extensions))
+        if self.after is not None:
+            parts.append(f"after {datetime.fromtimestamp(self.after):%Y-%m-%d %H:%M}")
+        if self.before is not None:
+            parts.append(f"before {datetime.fromtimestamp(self.before):%Y-%m-%d %H:%M}")
+        return ", ".join(parts)
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid date: {value} (expected YYYY-MM-DD)")
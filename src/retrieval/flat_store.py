@@ -0,0 +1,703 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .filters import Filter
+from .vector_store import QueryResult, VectorStore
+
+FLAT_PATH = Path("data/vectors")
+
+# rows per matrix product in an exact scan; small enough that an upcast
+# block stays in cache
+BLOCK_ROWS = 8192
+# stores whose float32 matrix fits in this are upcast into memory once per
+# commit instead of block by block on every query
+UPCAST_BYTES = 256 * 2**20
+# IVF lists are trained once the store holds this many rows, and
+# retrained whenever it has doubled since
+IVF_MIN_ROWS = 100_000
+# lists scanned per query in IVF mode
+NPROBE = 8
+KMEANS_SAMPLE = 50_000
+KMEANS_ITERS = 10
+# the matrix is rewritten once this share of its rows is deleted
+COMPACT_RATIO = 0.25
+# first-pass candidates per query rescored at float16 when quantized
+RESCORE = 256
+# row masks kept per filter until the next commit
+MASK_CACHE_SIZE = 32
+
+FLAT_MODES = ("auto", "exact", "ivf")
+# first-pass precision: the float16 matrix itself, int8 codes with a
+# per-row scale (1/4 of float32), or sign bits (1/32 of float32)
+QUANTIZATIONS = ("float16", "int8", "binary")
+
+# files holding the first-pass codes of each quantization
+_CODE_FILES = {"float16": (), "int8": ("codes", "scales"), "binary": ("bits",)}
+_EXTENSIONS = {
+    "vectors": "f16", "norms": "f32", "lists": "i32", "centroids": "npy",
+    "codes": "i8", "scales": "f32", "bits": "u8",
+}
+_DTYPES = {
+    "vectors": np.float16, "norms": np.float32, "lists": np.int32,
+    "codes": np.int8, "scales": np.float32, "bits": np.uint8,
+}
+
+# set bits per byte value, for Hamming distances on numpy < 2.0
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_bitwise_count = getattr(np, "bitwise_count", None)
+
+# stays under SQLite's bound-parameter limit on old builds
+_SQL_BATCH = 900
+
+
+def _write_at(path: Path, data: np.ndarray, offset: int):
+    """
+    Writes data at a byte offset, dropping anything after it (rows of an
+    append that was never committed).
+    """
+    with open(path, "r+b" if path.exists() else "wb") as f:
+        f.seek(offset)
+        f.write(data.tobytes())
+        f.truncate()
+
+
+def _quantize(x: np.ndarray, quantization: str) -> Dict[str, np.ndarray]:
+    """
+    First-pass codes for float32 rows, by file kind.
+    """
+    if quantization == "int8":
+        scales = np.abs(x).max(axis=1) / 127
+        scales[scales == 0] = 1
+        codes = np.rint(x / scales[:, None]).astype(np.int8)
+        return {"codes": codes, "scales": scales.astype(np.float32)}
+    if quantization == "binary":
+        return {"bits": np.packbits(x > 0, axis=1)}
+    return {}
+
+
+def _hamming(bits: np.ndarray, q_bits: np.ndarray) -> np.ndarray:
+    """
+    Differing bits between each row of packed bits and the query's.
+    """
+    x = bits ^ q_bits
+    if _bitwise_count is None:
+        return _POPCOUNT[x].sum(axis=1, dtype=np.float32)
+    if x.shape[1] % 8 == 0:
+        x = x.view(np.uint64)
+    return _bitwise_count(x).sum(axis=1, dtype=np.float32)
+
+
+def _nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Index of the nearest centroid for each row of x, in blocks.
+    """
+    c_norms = np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), BLOCK_ROWS):
+        block = np.asarray(x[start : start + BLOCK_ROWS], dtype=np.float32)
+        out[start : start + len(block)] = np.argmin(c_norms - 2 * block @ centroids.T, axis=1)
+    return out
+
+
+def _kmeans(x: np.ndarray, k: int, iters: int = KMEANS_ITERS, seed: int = 0) -> np.ndarray:
+    """
+    Plain Lloyd's k-means; empty clusters keep their previous centroid.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = _nearest(x, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=k)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        sums = np.add.reduceat(x[order], starts, axis=0)
+        centroids[filled] = sums / counts[filled, None]
+
+    return centroids
+
+
+class FlatVectorStore(VectorStore):
+    """
+    Native in-process vector index over a memory-mapped float16 matrix.
+
+    Rows are appended to `vectors-<epoch>.f16` (half the size of float32)
+    with their squared norms alongside; ids, doc ids and tombstones live
+    in SQLite. Small stores are held upcast in memory, large ones are
+    read through the map. Queries scan the matrix in blocks with one matrix product
+    per block and a partial top-k selection: exact search, with no
+    server, client or HNSW graph in between.
+
+    For large stores, an IVF index (k-means lists over the rows) is
+    trained automatically; mode "auto" then probes the NPROBE nearest
+    lists instead of scanning everything. "exact" always scans.
+
+    With quantization="int8" or "binary", the first pass scans compact
+    codes written next to the matrix at ingest, and only the best RESCORE
+    candidates per query are rescored against the float16 rows, which
+    then stay on disk. The setting is stored with the index: searchers
+    use whatever is on disk, and the writer's apply_settings() re-derives
+    the codes from the matrix without re-embedding.
+
+    Deleted rows are masked until a quarter of the matrix is dead, then
+    the matrix is rewritten under a new epoch. Readers reopen their maps
+    when the committed version changes.
+    """
+
+    name = "flat"
+
+    def __init__(
+        self,
+        path: Path = FLAT_PATH,
+        mode: str = "auto",
+        nprobe: int = NPROBE,
+        quantization: Optional[str] = None,
+        rescore: int = RESCORE,
+    ):
+        """
+        quantization: one of QUANTIZATIONS, applied to the stored index
+        by apply_settings() (None keeps whatever the index was written with).
+        rescore: quantized candidates per query checked at full precision.
+        """
+        if mode not in FLAT_MODES:
+            raise ValueError(f"Unknown flat index mode: {mode}")
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+
+        self.path = Path(path)
+        self.mode = mode
+        self.nprobe = nprobe
+        self.quantization = quantization
+        self.rescore = rescore
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+        # reader state, reloaded whenever the committed version changes
+        self._version: Optional[int] = None
+        self._rows = 0
+        self._matrix = np.empty((0, 0), dtype=np.float16)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._quant = "float16"
+        self._codes: Dict[str, np.ndarray] = {}
+        self._live: Optional[np.ndarray] = None
+        self._masks: Dict[Filter, np.ndarray] = {}
+        self._centroids: Optional[np.ndarray] = None
+        self._list_order = np.empty(0, dtype=np.int64)
+        self._list_offsets = np.zeros(1, dtype=np.int64)
+
+    # ---------- storage ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is not None:
+            return self._conn
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path / "index.db", timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value
+            );
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                doc_id TEXT,
+                parent TEXT,
+                extension TEXT,
+                modified REAL
+            );
+            CREATE INDEX IF NOT EXISTS rows_doc_id ON rows (doc_id);
+            CREATE TABLE IF NOT EXISTS deleted (
+                row INTEGER PRIMARY KEY
+            );
+            """
+        )
+        conn.commit()
+
+        self._conn = conn
+        return conn
+
+    def _meta(self, key: str, default=0):
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def _set_meta(self, **values):
+        self._connect().executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            values.items(),
+        )
+
+    def _bump(self, **values):
+        self._set_meta(version=self._meta("version") + 1, **values)
+
+    def _select_in(self, sql: str, values: List) -> List[tuple]:
+        rows = []
+        for i in range(0, len(values), _SQL_BATCH):
+            part = values[i : i + _SQL_BATCH]
+            rows += self._connect().execute(
+                sql.format(",".join("?" * len(part))), part
+            ).fetchall()
+        return rows
+
+    def _file(self, kind: str, epoch: int) -> Path:
+        return self.path / f"{kind}-{epoch}.{_EXTENSIONS[kind]}"
+
+    def _open(self, kind: str, epoch: int, rows: int, dim: int = 0) -> np.ndarray:
+        shape = {
+            "vectors": (rows, dim),
+            "codes": (rows, dim),
+            "bits": (rows, (dim + 7) // 8),
+        }.get(kind, (rows,))
+        if not rows:
+            return np.empty(shape, dtype=_DTYPES[kind])
+        return np.memmap(self._file(kind, epoch), dtype=_DTYPES[kind], mode="r", shape=shape)
+
+    def _ivf_trained(self) -> bool:
+        return self._meta("ivf_epoch", None) == self._meta("epoch")
+
+    def _remove_epoch(self, epoch: int):
+        for kind in _EXTENSIONS:
+            try:
+                self._file(kind, epoch).unlink()
+            except OSError:
+                # missing, or still mapped by a reader on Windows
+                pass
+
+    # ---------- reading ----------
+
+    def _refresh(self):
+        version = self._meta("version")
+        if version == self._version:
+            return
+
+        conn = self._connect()
+        snapshot = not conn.in_transaction
+        if snapshot:
+            conn.execute("BEGIN")
+
+        try:
+            rows, dim, epoch = self._meta("rows"), self._meta("dim"), self._meta("epoch")
+            self._quant = self._meta("quantization", "float16")
+            self._codes = {
+                kind: self._open(kind, epoch, rows, dim) for kind in _CODE_FILES[self._quant]
+            }
+            self._matrix = self._open("vectors", epoch, rows, dim)
+            if self._quant == "float16" and rows * dim * 4 <= UPCAST_BYTES:
+                self._matrix = self._matrix.astype(np.float32)
+            self._norms = self._open("norms", epoch, rows)
+
+            deleted = [r[0] for r in conn.execute("SELECT row FROM deleted")]
+            self._live = None
+            if deleted:
+                self._live = np.ones(rows, dtype=bool)
+                self._live[deleted] = False
+
+            self._centroids = None
+            if self._ivf_trained() and rows:
+                self._centroids = np.load(self._file("centroids", epoch))
+                lists = self._open("lists", epoch, rows)
+                self._list_order = np.argsort(lists, kind="stable")
+                self._list_offsets = np.searchsorted(
+                    lists[self._list_order], np.arange(len(self._centroids) + 1)
+                )
+
+            self._rows = rows
+            self._masks = {}
+            self._version = self._meta("version")
+        finally:
+            if snapshot:
+                conn.commit()
+
+    def _top_k(self, rows: np.ndarray, dists: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if len(dists) > k:
+            sel = np.argpartition(dists, k - 1)[:k]
+            rows, dists = rows[sel], dists[sel]
+        order = np.argsort(dists, kind="stable")
+        rows, dists = rows[order], dists[order]
+        finite = np.isfinite(dists)
+        return rows[finite], dists[finite]
+
+    def _first_pass(self, q: np.ndarray, rows) -> np.ndarray:
+        """
+        (queries x rows) distances at the stored precision; rows is a slice
+        or a sorted index array. Binary codes give Hamming distances, which
+        only rank.
+        """
+        if self._quant == "binary":
+            bits = np.asarray(self._codes["bits"][rows])
+            return np.stack([_hamming(bits, q_bits) for q_bits in np.packbits(q > 0, axis=1)])
+
+        if self._quant == "int8":
+            codes = np.asarray(self._codes["codes"][rows], dtype=np.float32)
+            dots = (q @ codes.T) * self._codes["scales"][rows]
+        else:
+            dots = q @ np.asarray(self._matrix[rows], dtype=np.float32).T
+
+        return self._norms[rows] - 2 * dots + np.einsum("ij,ij->i", q, q)[:, None]
+
+    def _rescore(self, q: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        rows = np.sort(rows)
+        block = np.asarray(self._matrix[rows], dtype=np.float32)
+        return self._top_k(rows, self._norms[rows] - 2 * block @ q + q @ q, k)
+
+    def _finish(self, q: np.ndarray, hits, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if self._quant == "float16":
+            return hits
+        return [self._rescore(q[i], rows, k) for i, (rows, _) in enumerate(hits)]
+
+    def _depth(self, k: int) -> int:
+        return k if self._quant == "float16" else max(k, self.rescore)
+
+    def _search_exact(
+        self, q: np.ndarray, k: int, allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        allowed: mask of live rows matching a filter; only those are scanned.
+        """
+        depth = self._depth(k)
+        block_rows, block_dists = [], []
+
+        if allowed is None:
+            blocks = [
+                slice(start, min(start + BLOCK_ROWS, self._rows))
+                for start in range(0, self._rows, BLOCK_ROWS)
+            ]
+            dead = None if self._live is None else ~self._live
+        else:
+            subset = np.flatnonzero(allowed)
+            blocks = [subset[start : start + BLOCK_ROWS] for start in range(0, len(subset), BLOCK_ROWS)]
+            dead = None
+
+        for rows in blocks:
+            dists = self._first_pass(q, rows)
+            if dead is not None:
+                dists[:, dead[rows]] = np.inf
+
+            ids = np.arange(rows.start, rows.stop) if isinstance(rows, slice) else rows
+            kk = min(depth, len(ids))
+            idx = np.argpartition(dists, kk - 1, axis=1)[:, :kk]
+            block_rows.append(ids[idx])
+            block_dists.append(np.take_along_axis(dists, idx, axis=1))
+
+        if not blocks:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in q]
+
+        # per-block winners, merged once
+        rows = np.concatenate(block_rows, axis=1)
+        dists = np.concatenate(block_dists, axis=1)
+        hits = [self._top_k(rows[i], dists[i], depth) for i in range(len(q))]
+        return self._finish(q, hits, k)
+
+    def _search_ivf(
+        self, q: np.ndarray, k: int, allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        c = self._centroids
+        nprobe = min(self.nprobe, len(c))
+        c_dists = np.einsum("ij,ij->i", c, c) - 2 * q @ c.T
+        probes = np.argpartition(c_dists, nprobe - 1, axis=1)[:, :nprobe]
+
+        depth = self._depth(k)
+        alive = self._live if allowed is None else allowed
+        out = []
+        for i, lists in enumerate(probes):
+            rows = np.sort(np.concatenate([
+                self._list_order[self._list_offsets[l] : self._list_offsets[l + 1]]
+                for l in lists
+            ]))
+            if alive is not None:
+                rows = rows[alive[rows]]
+            if not len(rows):
+                out.append((rows, np.empty(0, dtype=np.float32)))
+                continue
+
+            out.append(self._top_k(rows, self._first_pass(q[i : i + 1], rows)[0], depth))
+
+        return self._finish(q, out, k)
+
+    def _filter_mask(self, f: Filter) -> Optional[np.ndarray]:
+        """
+        Live rows matching f, read in one snapshot; None if a commit landed
+        since the last refresh (the caller refreshes and retries).
+        """
+        mask = self._masks.get(f)
+        if mask is not None:
+            return mask
+
+        clauses, params = [], []
+        for column, values in (("parent", f.parents), ("extension", f.extensions)):
+            if values is not None:
+                clauses.append(f"{column} IN (SELECT value FROM json_each(?))")
+                params.append(json.dumps(list(values)))
+        if f.after is not None:
+            clauses.append("modified >= ?")
+            params.append(f.after)
+        if f.before is not None:
+            clauses.append("modified < ?")
+            params.append(f.before)
+
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            if self._meta("version") != self._version:
+                return None
+            rows = np.fromiter(
+                (r[0] for r in conn.execute(
+                    f"SELECT row FROM rows WHERE {' AND '.join(clauses)}", params
+                )),
+                dtype=np.int64,
+            )
+        finally:
+            conn.commit()
+
+        mask = np.zeros(self._rows, dtype=bool)
+        mask[rows] = True
+
+        if len(self._masks) >= MASK_CACHE_SIZE:
+            self._masks.pop(next(iter(self._masks)))
+        self._masks[f] = mask
+        return mask
+
+    def query(self, vectors, k, filter: Optional[Filter] = None) -> QueryResult:
+        q = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        nothing = [[] for _ in q], [[] for _ in q]
+        if filter is not None and filter.empty:
+            return nothing
+
+        with self._lock:
+            allowed = None
+            while True:
+                self._refresh()
+                if not self._rows or k <= 0:
+                    return nothing
+                if filter is None or not filter.active:
+                    break
+                allowed = self._filter_mask(filter)
+                if allowed is not None:
+                    break
+
+            if allowed is not None and not allowed.any():
+                return nothing
+
+            use_ivf = self._centroids is not None and self.mode != "exact"
+            if use_ivf and allowed is not None:
+                # a selective filter holds fewer rows than the probed lists
+                use_ivf = allowed.sum() * len(self._centroids) > self._rows * self.nprobe
+            hits = (self._search_ivf if use_ivf else self._search_exact)(q, k, allowed)
+
+            wanted = sorted({int(r) for rows, _ in hits for r in rows})
+            ids = dict(self._select_in("SELECT row, id FROM rows WHERE row IN ({})", wanted))
+
+        return (
+            [[ids[int(r)] for r in rows if int(r) in ids] for rows, _ in hits],
+            [[float(d) for r, d in zip(rows, dists) if int(r) in ids] for rows, dists in hits],
+        )
+
+    def ids_for_doc(self, doc_id):
+        with self._lock:
+            return [
+                r[0] for r in self._connect().execute(
+                    "SELECT id FROM rows WHERE doc_id = ?", (doc_id,)
+                )
+            ]
+
+    def count(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    # ---------- writing ----------
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        """
+        Appends rows for new ids. Ids are content-addressed, so an id that
+        is already stored already has this embedding and is skipped.
+        """
+        with self._lock:
+            conn = self._connect()
+            existing = {r[0] for r in self._select_in("SELECT id FROM rows WHERE id IN ({})", list(ids))}
+
+            keep, seen = [], set()
+            for i, chunk_id in enumerate(ids):
+                if chunk_id not in existing and chunk_id not in seen:
+                    keep.append(i)
+                    seen.add(chunk_id)
+            if not keep:
+                return
+
+            vectors = np.asarray(embeddings, dtype=np.float32)[keep]
+            dim = self._meta("dim")
+            if not dim:
+                dim = vectors.shape[1]
+                self._set_meta(dim=dim)
+            elif vectors.shape[1] != dim:
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} does not match the store's {dim}."
+                )
+
+            rows, epoch = self._meta("rows"), self._meta("epoch")
+            half = vectors.astype(np.float16)
+            # norms of the rounded vectors, so distances stay consistent
+            stored = half.astype(np.float32)
+
+            _write_at(self._file("vectors", epoch), half, rows * dim * 2)
+            _write_at(self._file("norms", epoch), np.einsum("ij,ij->i", stored, stored), rows * 4)
+            for kind, codes in _quantize(stored, self._meta("quantization", "float16")).items():
+                _write_at(self._file(kind, epoch), codes, rows * (codes.nbytes // len(codes)))
+            if self._ivf_trained():
+                centroids = np.load(self._file("centroids", epoch))
+                _write_at(self._file("lists", epoch), _nearest(stored, centroids), rows * 4)
+
+            metas = [metadatas[i] or {} for i in keep]
+            conn.executemany(
+                """
+                INSERT INTO rows (row, id, doc_id, parent, extension, modified)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        rows + j, ids[i], meta.get("doc_id"),
+                        meta.get("parent"), meta.get("extension"), meta.get("modified"),
+                    )
+                    for j, (i, meta) in enumerate(zip(keep, metas))
+                ],
+            )
+            total = rows + len(keep)
+            self._bump(rows=total)
+            conn.commit()
+
+            if total >= IVF_MIN_ROWS and total >= 2 * self._meta("ivf_rows"):
+                self._train_ivf()
+
+    def delete(self, ids):
+        if not ids:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            rows = [r[0] for r in self._select_in("SELECT row FROM rows WHERE id IN ({})", list(ids))]
+            if not rows:
+                return
+
+            conn.executemany("DELETE FROM rows WHERE row = ?", [(r,) for r in rows])
+            conn.executemany("INSERT INTO deleted (row) VALUES (?)", [(r,) for r in rows])
+            self._bump()
+            conn.commit()
+
+            dead = conn.execute("SELECT COUNT(*) FROM deleted").fetchone()[0]
+            if dead > COMPACT_RATIO * self._meta("rows"):
+                self._compact()
+
+    def _train_ivf(self):
+        """
+        k-means over a sample of rows (sqrt(rows) lists), then every row
+        is assigned to its nearest list.
+        """
+        rows, dim, epoch = self._meta("rows"), self._meta("dim"), self._meta("epoch")
+        matrix = self._open("vectors", epoch, rows, dim)
+
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(rows, min(rows, KMEANS_SAMPLE), replace=False))
+        centroids = _kmeans(np.asarray(matrix[sample], dtype=np.float32), max(1, int(math.sqrt(rows))))
+
+        np.save(self._file("centroids", epoch), centroids)
+        _write_at(self._file("lists", epoch), _nearest(matrix, centroids), 0)
+
+        conn = self._connect()
+        self._bump(ivf_epoch=epoch, ivf_rows=rows)
+        conn.commit()
+
+    def apply_settings(self):
+        with self._lock:
+            if self.quantization and self.quantization != self._meta("quantization", "float16"):
+                self._requantize()
+
+    def _requantize(self):
+        """
+        Rewrites the first-pass codes of the current epoch for
+        self.quantization, from the float16 matrix. Each file is written
+        aside and swapped in, so readers never map a partial file.
+        """
+        rows, dim, epoch = self._meta("rows"), self._meta("dim"), self._meta("epoch")
+        matrix = self._open("vectors", epoch, rows, dim)
+
+        paths = {kind: self._file(kind, epoch) for kind in _CODE_FILES[self.quantization]}
+        temps = {kind: path.with_name(path.name + ".tmp") for kind, path in paths.items()}
+        files = {kind: open(temp, "wb") for kind, temp in temps.items()}
+        try:
+            for start in range(0, rows, BLOCK_ROWS):
+                block = np.asarray(matrix[start : start + BLOCK_ROWS], dtype=np.float32)
+                for kind, codes in _quantize(block, self.quantization).items():
+                    files[kind].write(codes.tobytes())
+        finally:
+            for f in files.values():
+                f.close()
+
+        for kind, path in paths.items():
+            os.replace(temps[kind], path)
+        self._bump(quantization=self.quantization)
+        self._conn.commit()
+
+    def _compact(self):
+        """
+        Rewrites the live rows into a new epoch and renumbers them.
+        """
+        conn = self._connect()
+        rows, dim, epoch = self._meta("rows"), self._meta("dim"), self._meta("epoch")
+        live = np.ones(rows, dtype=bool)
+        live[[r[0] for r in conn.execute("SELECT row FROM deleted")]] = False
+        keep = np.flatnonzero(live)
+        new_epoch = epoch + 1
+
+        for kind in ("vectors", "norms") + _CODE_FILES[self._meta("quantization", "float16")]:
+            old = self._open(kind, epoch, rows, dim)
+            with open(self._file(kind, new_epoch), "wb") as f:
+                for start in range(0, len(keep), BLOCK_ROWS):
+                    f.write(np.asarray(old[keep[start : start + BLOCK_ROWS]]).tobytes())
+            del old
+
+        ivf = {}
+        if self._ivf_trained():
+            np.save(self._file("centroids", new_epoch), np.load(self._file("centroids", epoch)))
+            np.asarray(self._open("lists", epoch, rows)[keep]).tofile(self._file("lists", new_epoch))
+            ivf = {"ivf_epoch": new_epoch}
+
+        # ascending, so each target row number is already free
+        conn.executemany(
+            "UPDATE rows SET row = ? WHERE row = ?",
+            [(new, int(old)) for new, old in enumerate(keep) if new != old],
+        )
+        conn.execute("DELETE FROM deleted")
+        self._bump(rows=len(keep), epoch=new_epoch, **ivf)
+        conn.commit()
+
+        self._remove_epoch(epoch)
+
+    def reset(self):
+        with self._lock:
+            conn = self._connect()
+            epoch = self._meta("epoch")
+            with conn:
+                conn.execute("DELETE FROM rows")
+                conn.execute("DELETE FROM deleted")
+                conn.execute("DELETE FROM meta WHERE key IN ('rows', 'dim', 'ivf_epoch', 'ivf_rows')")
+                # a fresh epoch, so open readers never see rewritten files
+                self._bump(epoch=epoch + 1)
+            self._remove_epoch(epoch)
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            self._version = None
+            self._matrix = np.empty((0, 0), dtype=np.float16)
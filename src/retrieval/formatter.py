@@ -1,30 +1,219 @@
-from typing import List, Dict
-
-
-def to_llm_context(results: List[Dict]) -> str:
-        """
-        Convert retrieval results into a clean text block formatted for LLM context ingestion.
-        Each result becomes a labeled document section.
-        
-        Expected input format per item:
-        {
-            "score": float,
-            "text": str,
-            "meta": dict
-        }
-        """
-
-        context_sections = []
-
-        for i, r in enumerate(results, start=1):
-            path = r["meta"].get("doc_id") or r["meta"].get("source") or "unknown"
-            section = (
-                f"[DOC {i}]\n"
-                f"file: {path}\n"
-                f"score: {round(r['score'], 4)}\n"
-                f"---\n"
-                f"{r['text']}\n"
-            )
-            context_sections.append(section)
-
-            return "\n".join(context_sections).strip()
+import math
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# estimated tokens of context sent to the LLM per question; the LLM's own
+# tokenizer is remote, so sizes are estimated from the text length
+DEFAULT_EST_TOKEN_BUDGET = 3000
+# rough English average for Gemini / GPT style tokenizers
+CHARS_PER_TOKEN = 4
+# a section cut shorter than this is not worth sending
+MIN_SECTION_TOKENS = 64
+# longest text neighbouring chunks can share: the chunker's overlap is 200
+# characters, or an eighth of the model's input (32 MiniLM tokens, at most
+# 8 characters each)
+MAX_OVERLAP_CHARS = 512
+# shorter suffix/prefix matches are taken as coincidence, not overlap
+MIN_OVERLAP_CHARS = 8
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass
+class PackedContext:
+    text: str
+    est_tokens: int
+    # sections sent, chunks they cover, and chunks left out for the budget
+    sections: int = 0
+    chunks: int = 0
+    dropped: int = 0
+    # ids of the chunks sent, where results carry them
+    ids: List[str] = field(default_factory=list)
+    # hashes of the files those chunks came from
+    hashes: List[str] = field(default_factory=list)
+
+
+@dataclass
+class _Section:
+    path: str
+    text: str
+    score: float
+    first: Optional[int]
+    last: Optional[int]
+    ids: List[str] = field(default_factory=list)
+    hashes: List[str] = field(default_factory=list)
+    chunks: int = 1
+
+
+def _overlap(a: str, b: str, max_chars: int = MAX_OVERLAP_CHARS) -> int:
+    """
+    Length of the shortest suffix of a, within its last max_chars, that is
+    also a prefix of b and covers the probe. Shortest, so repetitive text
+    (logs, boilerplate) loses at most one repeat rather than real content.
+    Overlaps shorter than the probe are compared directly.
+    """
+    probe = b[:32]
+    if not probe:
+        return 0
+
+    start = max(0, len(a) - min(len(b), max_chars))
+    end = len(a)
+    while True:
+        pos = a.rfind(probe, start, end)
+        if pos < 0:
+            break
+        if b.startswith(a[pos:]):
+            return len(a) - pos
+        # next candidate starts before pos
+        end = pos + len(probe) - 1
+
+    for n in range(min(len(a), len(probe) - 1), MIN_OVERLAP_CHARS - 1, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+
+def _join(a: str, b: str, max_overlap: int = MAX_OVERLAP_CHARS) -> str:
+    """
+    Concatenates neighbouring chunks without the text they share: the
+    chunker's overlap window, or the header line repeated on record chunks.
+    """
+    n = _overlap(a, b, max_overlap)
+    if n:
+        return a + b[n:]
+
+    a_head, _, _ = a.partition("\n")
+    b_head, sep, b_rest = b.partition("\n")
+    if sep and a_head == b_head:
+        return a + "\n" + b_rest
+    return a + "\n\n" + b
+
+
+def _ids(r: Dict) -> List[str]:
+    return [r["id"]] if r.get("id") is not None else []
+
+
+def _hashes(meta: Dict) -> List[str]:
+    return [meta["hash"]] if meta.get("hash") else []
+
+
+def _sections(results: List[Dict], max_overlap: int = MAX_OVERLAP_CHARS) -> List[_Section]:
+    """
+    Merges hits that are consecutive chunks of one document, best first.
+    """
+    by_doc: Dict[str, List[Dict]] = {}
+    loose: List[_Section] = []
+
+    for r in results:
+        meta = r.get("meta") or {}
+        path = meta.get("doc_id") or meta.get("source") or "unknown"
+        if meta.get("doc_id") is None or meta.get("chunk_index") is None:
+            loose.append(_Section(path, r["text"], r["score"], None, None, _ids(r), _hashes(meta)))
+        else:
+            by_doc.setdefault(path, []).append(r)
+
+    sections = loose
+    for path, hits in by_doc.items():
+        hits.sort(key=lambda r: r["meta"]["chunk_index"])
+        current = None
+
+        for r in hits:
+            index = r["meta"]["chunk_index"]
+            if current is not None and index == current.last:
+                # the same chunk twice: keep the better score
+                current.score = max(current.score, r["score"])
+            elif current is not None and index == current.last + 1:
+                current.text = _join(current.text, r["text"], max_overlap)
+                current.score = max(current.score, r["score"])
+                current.last = index
+                current.ids += _ids(r)
+                current.chunks += 1
+            else:
+                current = _Section(path, r["text"], r["score"], index, index, _ids(r), _hashes(r["meta"]))
+                sections.append(current)
+
+    return sorted(sections, key=lambda s: s.score, reverse=True)
+
+
+def _render(i: int, s: _Section, text: str) -> str:
+    lines = [f"[DOC {i}]", f"file: {s.path}"]
+    if s.first is not None:
+        span = str(s.first) if s.first == s.last else f"{s.first}-{s.last}"
+        lines.append(f"chunks: {span}")
+    lines += [f"score: {round(s.score, 4)}", "---", text]
+    return "\n".join(lines) + "\n"
+
+
+def _cut(s: _Section, est_token_budget: int, count_tokens: Callable[[str], int]) -> Optional[str]:
+    """
+    The section rendered with its text shortened to fit est_token_budget,
+    or None if too little of it would fit.
+    """
+    if est_token_budget - count_tokens(_render(1, s, " …")) < MIN_SECTION_TOKENS:
+        return None
+
+    text = s.text[: est_token_budget * CHARS_PER_TOKEN]
+    while text and count_tokens(_render(1, s, text + " …")) > est_token_budget:
+        text = text[: int(len(text) * 0.9)]
+    return _render(1, s, text.rstrip() + " …") if text else None
+
+
+def build_context(
+    results: List[Dict],
+    est_token_budget: int = DEFAULT_EST_TOKEN_BUDGET,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+    max_overlap: int = MAX_OVERLAP_CHARS,
+) -> PackedContext:
+    """
+    Packs retrieval results into at most est_token_budget tokens of LLM
+    context, as measured by count_tokens (an estimate by default).
+
+    Consecutive chunks of the same document become one section with their
+    overlap removed. Sections go in by score; one that does not fit is
+    skipped for smaller ones after it, except that the best section is cut
+    to fit rather than dropped. max_overlap bounds the text removed
+    between two chunks.
+
+    Expected input format per item:
+    {
+        "score": float,
+        "text": str,
+        "meta": dict
+    }
+    """
+    parts: List[str] = []
+    used = 0
+    packed = PackedContext("", 0)
+
+    for s in _sections(results, max_overlap):
+        section = _render(len(parts) + 1, s, s.text)
+        n = count_tokens(section)
+
+        if used + n > est_token_budget and not parts:
+            section = _cut(s, est_token_budget, count_tokens)
+            n = count_tokens(section) if section else n
+
+        if section is None or used + n > est_token_budget:
+            packed.dropped += s.chunks
+            continue
+
+        parts.append(section)
+        used += n
+        packed.sections += 1
+        packed.chunks += s.chunks
+        packed.ids += s.ids
+        packed.hashes += [h for h in s.hashes if h not in packed.hashes]
+
+    packed.text = "\n".join(parts).strip()
+    packed.est_tokens = count_tokens(packed.text) if packed.text else 0
+    return packed
+
+
+def to_llm_context(results: List[Dict], est_token_budget: int = DEFAULT_EST_TOKEN_BUDGET) -> str:
+    """
+    Convert retrieval results into a clean text block formatted for LLM context ingestion.
+    Each merged run of chunks becomes a labeled document section; see build_context.
+    """
+    return build_context(results, est_token_budget).text
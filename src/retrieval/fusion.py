@@ -0,0 +1,76 @@
+from typing import Dict, List, Sequence
+
+FUSION_MODES = ("rrf", "weighted")
+
+# standard RRF damping constant
+RRF_K = 60
+
+
+def _entry(r: Dict) -> Dict:
+    return {"id": r["id"], "text": r["text"], "meta": r["meta"], "score": 0.0}
+
+
+def rrf(result_lists: Sequence[List[Dict]], weights: Sequence[float], k: int = RRF_K) -> List[Dict]:
+    """
+    Weighted reciprocal-rank fusion: sum of weight / (k + rank).
+    """
+    merged: Dict[str, Dict] = {}
+
+    for results, weight in zip(result_lists, weights):
+        for rank, r in enumerate(results, start=1):
+            entry = merged.setdefault(r["id"], _entry(r))
+            entry["score"] += weight / (k + rank)
+
+    return sorted(merged.values(), key=lambda x: x["score"], reverse=True)
+
+
+def weighted(result_lists: Sequence[List[Dict]], weights: Sequence[float]) -> List[Dict]:
+    """
+    Weighted sum of scores min-max normalized within each list.
+    """
+    merged: Dict[str, Dict] = {}
+
+    for results, weight in zip(result_lists, weights):
+        if not results:
+            continue
+
+        scores = [r["score"] for r in results]
+        lo, hi = min(scores), max(scores)
+
+        for r in results:
+            entry = merged.setdefault(r["id"], _entry(r))
+            norm = (r["score"] - lo) / (hi - lo) if hi > lo else 1.0
+            entry["score"] += weight * norm
+
+    return sorted(merged.values(), key=lambda x: x["score"], reverse=True)
+
+
+def fuse(
+    result_lists: Sequence[List[Dict]],
+    weights: Sequence[float],
+    top_k: int,
+    mode: str = "rrf",
+) -> List[Dict]:
+    if mode == "rrf":
+        return rrf(result_lists, weights)[:top_k]
+    if mode == "weighted":
+        return weighted(result_lists, weights)[:top_k]
+    raise ValueError(f"Unknown fusion mode: {mode}")
+
+
+def agreement(result_lists: Sequence[List[Dict]], top_k: int) -> float:
+    """
+    Lowest share, over the engines, of their top_k also found by another
+    engine; 1.0 when at most one engine returned anything.
+    """
+    id_sets = [{r["id"] for r in results} for results in result_lists]
+    shares = []
+
+    for i, results in enumerate(result_lists):
+        if not results:
+            continue
+        others = set().union(*(s for j, s in enumerate(id_sets) if j != i))
+        head = results[:top_k]
+        shares.append(sum(r["id"] in others for r in head) / len(head))
+
+    return min(shares) if len(shares) > 1 else 1.0
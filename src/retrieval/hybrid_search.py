@@ -1,85 +1,139 @@
-from typing import List, Dict
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Sequence
 from .vector_search import VectorSearcher
+from src.ingest.embedder import Embedder
 from .keyword_search import KeywordSearcher
+from .chunk_store import ChunkStore
+from . import fusion
+from .filters import Filter
+from src.cache.lru import LRUCache
+from src.utils.registry import get_generation
+
+# each engine returns top_k * MAX_DEPTH_FACTOR candidates; the fused
+# window starts at top_k and doubles while the engines disagree
+MAX_DEPTH_FACTOR = 4
+# share of each engine's top_k the other must have returned to stop early
+AGREEMENT = 0.5
+# fused result lists kept per (query, top_k, index generation)
+RESULT_CACHE_SIZE = 256
 
 
 class HybridSearcher:
     """
-    Combines semantic vector search (Chroma) and keyword search (BM25)
-    using normalized, weighted score fusion.
+    Combines semantic vector search (Chroma or the flat index) and keyword search (BM25),
+    fusing their results by chunk id (see fusion.py).
+    The two retrievers run concurrently on a small thread pool.
     """
 
-    def __init__(self, chunks: List[Dict]):
+    def __init__(
+        self,
+        mode: str = "rrf",
+        weights: Sequence[float] = (0.7, 0.3),
+        max_depth_factor: int = MAX_DEPTH_FACTOR,
+        agreement: float = AGREEMENT,
+        vector_backend: Optional[str] = None,
+        embedder: Optional[Embedder] = None,
+    ):
         """
-        chunks: list of
-        {
-            "text": str,
-            "meta": dict   
-        }
+        mode: "rrf" (reciprocal rank) or "weighted" (min-max scores)
+        weights: (vector, keyword) weight in either mode
+        vector_backend: "chroma" or "flat", as used at ingest
+        embedder: query embedder; by default one configured like the
+        Indexer's (model, backend, quantization)
         """
-        self.vector = VectorSearcher()
-        self.keyword = KeywordSearcher(chunks)
-
-    def search(self, query: str, top_k: int = 5) -> List[Dict]:
-        
-        v_results = self.vector.query(query, top_k * 2)
-
-        v_scores = [r["distances"] for r in v_results]
-        v_norm = []
-
-        if v_scores:
-            vmin, vmax = min(v_scores), max(v_scores)
-
-            for r in v_results:
-                
-                score = 1 - (r["distances"] - vmin) / (vmax - vmin + 1e-9)
-
-                v_norm.append({
-                    "score": score,
-                    "text": r["documents"],
-                    "meta": r["metadatas"],
-                })
-
-        
-        k_results = self.keyword.search(query, top_k * 2)
-
-        k_scores = [r["score"] for r in k_results]
-        k_norm = []
-
-        if k_scores:
-            kmin, kmax = min(k_scores), max(k_scores)
-
-            for r in k_results:
-                score = (r["score"] - kmin) / (kmax - kmin + 1e-9)
-
-                k_norm.append({
-                    "score": score,
-                    "text": r["text"],
-                    "meta": r["meta"],
-                })
-
-        
-        merged: Dict[str, Dict] = {}
-
-        def add_results(results, weight):
-            for r in results:
-                
-                source_id = r["meta"].get("source") or r["meta"].get("id")
-
-                if source_id not in merged:
-                    merged[source_id] = {
-                        "text": r["text"],
-                        "meta": r["meta"],
-                        "score": 0.0,
-                    }
-
-                merged[source_id]["score"] += r["score"] * weight
+        if mode not in fusion.FUSION_MODES:
+            raise ValueError(f"Unknown fusion mode: {mode}")
+
+        self.mode = mode
+        self.weights = weights
+        self.max_depth_factor = max_depth_factor
+        self.agreement = agreement
+
+        # both searchers rank ids and read texts for their hits only
+        self.store = ChunkStore()
+        self.vector = VectorSearcher(store=self.store, backend=vector_backend, embedder=embedder)
+        self.keyword = KeywordSearcher(self.store)
+        # model inference, vector scans and sqlite all release the GIL
+        self.pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="soko-search")
+        self.result_cache = LRUCache(RESULT_CACHE_SIZE)
+
+    def search(self, query: str, top_k: int = 5, filter: Optional[Filter] = None) -> List[Dict]:
+        return self.search_many([query], top_k, filter)[0]
+
+    def search_many(self, queries: List[str], top_k: int = 5, filter: Optional[Filter] = None) -> List[List[Dict]]:
+        """
+        Searches several queries at once: the vector side embeds them in one
+        model call and sends one multi-query vector store request, while the
+        keyword side runs alongside. Results are in input order.
 
-        add_results(v_norm, weight=0.7)
-        add_results(k_norm, weight=0.3)
+        Each engine is asked once for top_k * max_depth_factor candidates.
+        Fusion starts from their top_k and widens the window, twice as
+        deep each step, only while the engines disagree.
 
-        
-        final = list(merged.values())
-        final.sort(key=lambda x: x["score"], reverse=True)
+        Results are cached per index generation, so a repeated query
+        skips both engines until the next ingest or reset.
 
-        return final[:top_k]
+        filter: both engines search only chunks whose metadata matches
+        (a `where` clause or row mask for vectors, segment masks for
+        keywords), rather than filtering their results.
+        """
+        generation = get_generation()
+        results: List[List[Dict]] = [None] * len(queries)
+        misses = []
+
+        for i, query in enumerate(queries):
+            cached = self.result_cache.get((query, top_k, filter, generation))
+            if cached is None:
+                misses.append(i)
+            else:
+                results[i] = cached
+
+        if misses:
+            fresh = self._search([queries[i] for i in misses], top_k, filter)
+            for i, fused in zip(misses, fresh):
+                self.result_cache.set((queries[i], top_k, filter, generation), fused)
+                results[i] = fused
+
+        # callers may edit their copies without touching the cache
+        return [[dict(r) for r in fused] for fused in results]
+
+    def _search(self, queries: List[str], top_k: int, filter: Optional[Filter]) -> List[List[Dict]]:
+        if not queries:
+            return []
+        if filter is not None and filter.empty:
+            return [[] for _ in queries]
+
+        max_depth = top_k * self.max_depth_factor
+        # one round trip per engine; query embedding overlaps the keyword search
+        v_future = self.pool.submit(self.vector.query_many, queries, max_depth, filter)
+        k_future = self.pool.submit(self.keyword.search_many, queries, max_depth, filter)
+
+        fused = []
+        for v_results, k_results in zip(v_future.result(), k_future.result()):
+            lists = (self._vector_entries(v_results), k_results)
+            depth = top_k
+            while depth < max_depth and not self._settled([l[:depth] for l in lists], top_k, depth):
+                depth = min(depth * 2, max_depth)
+            fused.append(fusion.fuse([l[:depth] for l in lists], self.weights, top_k, self.mode))
+        return fused
+
+    def _settled(self, lists, top_k: int, depth: int) -> bool:
+        exhausted = all(len(results) < depth for results in lists)
+        return exhausted or fusion.agreement(lists, top_k) >= self.agreement
+
+    @staticmethod
+    def _vector_entries(v_results: List[Dict]) -> List[Dict]:
+        # smaller distance is better; negate so higher scores win
+        return [
+            {
+                "id": r["id"],
+                "score": -r["distances"],
+                "text": r["documents"],
+                "meta": r["metadatas"],
+            }
+            for r in v_results
+        ]
+
+    def close(self):
+        self.pool.shutdown(wait=False)
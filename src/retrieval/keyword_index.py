@@ -0,0 +1,784 @@
+import json
+import math
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from . import bm25
+from .analyzer import Analyzer
+from .filters import Filter
+
+INDEX_PATH = Path("data/keyword")
+
+# buffered chunks are written out as a segment once there are this many
+SEGMENT_CHUNKS = 50_000
+# segments are grouped into size tiers, each MERGE_FACTOR times larger
+# than the last; a tier holding this many segments is merged into one
+MERGE_FACTOR = 8
+
+_SEGMENT_ARRAYS = ("terms", "offsets", "docs", "tfs", "nums", "lengths")
+# per-chunk metadata for filters: parent and extension codes (-1 when
+# unknown) and modification time
+_FACET_ARRAYS = ("parents", "exts", "modified")
+_FACET_UNKNOWN = {"parents": (-1, np.int32), "exts": (-1, np.int32), "modified": (np.nan, np.float64)}
+# per-chunk term ids (doc_terms[doc_offsets[i]:doc_offsets[i + 1]]), so a
+# deletion corrects df from the deleted chunks' postings alone
+_DOC_ARRAYS = ("doc_offsets", "doc_terms")
+
+# per-segment filter masks kept until the next commit
+MASK_CACHE_SIZE = 32
+
+# stays under SQLite's bound-parameter limit on old builds
+_SQL_BATCH = 900
+
+
+class _Segment:
+    """
+    Immutable postings for one batch of chunks, memory-mapped from disk.
+
+    terms / offsets / docs / tfs: see bm25.build_postings, with docs
+    indexing into nums (the chunks' global numbers, ascending), lengths
+    and the facet arrays. Segments written before facets or the per-chunk
+    term index existed have none.
+    """
+
+    def __init__(self, path: Path, arrays: Dict[str, np.ndarray]):
+        self.path = path
+        for name in _SEGMENT_ARRAYS + _FACET_ARRAYS + _DOC_ARRAYS:
+            setattr(self, name, arrays.get(name))
+
+    @property
+    def has_facets(self) -> bool:
+        return self.parents is not None
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        A per-chunk array, with facets read as unknown if never stored.
+        """
+        value = getattr(self, name)
+        if value is None:
+            fill, dtype = _FACET_UNKNOWN[name]
+            value = np.full(len(self.nums), fill, dtype=dtype)
+        return value
+
+    @staticmethod
+    def doc_index(terms: np.ndarray, offsets: np.ndarray, docs: np.ndarray, n_docs: int) -> Dict[str, np.ndarray]:
+        """
+        The postings regrouped by chunk: the term ids of local chunk i are
+        doc_terms[doc_offsets[i]:doc_offsets[i + 1]].
+        """
+        per_posting = np.repeat(terms, np.diff(offsets))
+        order = np.argsort(docs, kind="stable")
+        doc_offsets = np.zeros(n_docs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(docs, minlength=n_docs), out=doc_offsets[1:])
+        return {"doc_offsets": doc_offsets, "doc_terms": per_posting[order].astype(np.int32)}
+
+    @classmethod
+    def write(cls, path: Path, **arrays) -> "_Segment":
+        path.mkdir(parents=True, exist_ok=True)
+        arrays.update(cls.doc_index(arrays["terms"], arrays["offsets"], arrays["docs"], len(arrays["nums"])))
+        for name in _SEGMENT_ARRAYS + _FACET_ARRAYS + _DOC_ARRAYS:
+            np.save(path / f"{name}.npy", arrays[name])
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: Path) -> "_Segment":
+        return cls(
+            path,
+            {
+                name: np.load(path / f"{name}.npy", mmap_mode="r")
+                for name in _SEGMENT_ARRAYS + _FACET_ARRAYS + _DOC_ARRAYS
+                if (path / f"{name}.npy").exists()
+            },
+        )
+
+    def mask(self, f: Filter, parents: Optional[np.ndarray], exts: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Chunks of this segment (by local index) matching f; parents and
+        exts are the codes of f's values.
+        """
+        mask = np.ones(len(self.nums), dtype=bool)
+        if parents is not None:
+            mask &= np.isin(self.parents, parents)
+        if exts is not None:
+            mask &= np.isin(self.exts, exts)
+        # unknown times are NaN and fail both bounds
+        if f.after is not None:
+            mask &= self.modified >= f.after
+        if f.before is not None:
+            mask &= self.modified < f.before
+        return mask
+
+    def postings(self, tid: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        (local doc indices, tfs) for a term, or None if absent here.
+        """
+        i = int(np.searchsorted(self.terms, tid))
+        if i == len(self.terms) or self.terms[i] != tid:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+    def term_counts(self, size: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Per-term document counts (length `size`), optionally only over
+        postings selected by mask.
+        """
+        per_posting = np.repeat(self.terms, np.diff(self.offsets))
+        if mask is not None:
+            per_posting = per_posting[mask]
+        return np.bincount(per_posting, minlength=size)[:size]
+
+    def chunk_term_counts(self, nums: np.ndarray, size: int) -> np.ndarray:
+        """
+        Per-term document counts over the chunks with these global numbers
+        (sorted) that are in this segment. Reads only their own postings,
+        unless the segment predates the per-chunk term index.
+        """
+        counts = np.zeros(size, dtype=np.int64)
+        if not len(self.nums) or not len(nums):
+            return counts
+
+        nums = nums[(nums >= self.nums[0]) & (nums <= self.nums[-1])]
+        local = np.searchsorted(self.nums, nums)
+        local = local[self.nums[local] == nums]
+        if not len(local):
+            return counts
+
+        if self.doc_offsets is None:
+            hit = np.zeros(len(self.nums), dtype=bool)
+            hit[local] = True
+            return self.term_counts(size, mask=hit[self.docs])
+
+        tids = np.concatenate([
+            self.doc_terms[self.doc_offsets[i] : self.doc_offsets[i + 1]] for i in local
+        ])
+        counts += np.bincount(tids, minlength=size)[:size]
+        return counts
+
+
+class KeywordIndex:
+    """
+    Persistent BM25 index, updated incrementally at ingest time.
+
+    Postings live in immutable segments of .npy files under `path`, one
+    per ingest (or per SEGMENT_CHUNKS chunks), memory-mapped on open.
+    Terms, chunk ids and corpus statistics live in SQLite alongside.
+    Deleted chunks are tombstoned and dropped for good when their segment
+    is merged. Merges are tiered: only segments of similar size are merged
+    together, so each chunk is rewritten a logarithmic number of times. Chunks get compact integer numbers; the string chunk id is
+    only looked up for final results.
+
+    Writes are buffered until commit(). Readers pick up a new commit on
+    their next search, so one instance can stay open for a whole session.
+
+    Text goes through `analyzer` into int32 term ids. Its settings are
+    stored with the index, and queries are always analyzed with the
+    settings the index was built with.
+
+    Each segment also keeps every chunk's parent directory, extension
+    and modification time as arrays. A filtered search turns them into
+    per-segment masks, cached until the next commit, and skips the
+    postings of chunks outside the filter before scoring.
+    """
+
+    def __init__(self, path: Path = INDEX_PATH, analyzer: Optional[Analyzer] = None):
+        self.path = Path(path)
+        self.analyzer = analyzer or Analyzer()
+        self._conn: Optional[sqlite3.Connection] = None
+        # searches may come from several threads
+        self._lock = threading.Lock()
+
+        # reader state, reloaded whenever the committed version changes
+        self._version: Optional[int] = None
+        self._segments: List[_Segment] = []
+        self._deleted = np.empty(0, dtype=np.int64)
+        self._df = np.empty(0, dtype=np.int64)
+        self._doc_count = 0
+        self._avgdl = 0.0
+        self._avg_idf = 0.0
+        self._query_analyzer = self.analyzer
+        self._masks: Dict[Filter, List[Optional[np.ndarray]]] = {}
+
+        # writer state, pending until commit()
+        self._pending: List[Tuple[int, np.ndarray, Tuple]] = []
+        self._pending_nums: Dict[int, int] = {}
+        self._new_segments: List[_Segment] = []
+        self._new_deleted: List[int] = []
+
+    # ---------- storage ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is not None:
+            return self._conn
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path / "index.db", timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value
+            );
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                tid INTEGER NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                num INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS deleted (
+                num INTEGER PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS segments (
+                name TEXT PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS facet_values (
+                value TEXT PRIMARY KEY,
+                code INTEGER NOT NULL UNIQUE
+            );
+            """
+        )
+        conn.commit()
+
+        self._conn = conn
+        return conn
+
+    def _meta(self, key: str, default=0):
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def _set_meta(self, **values):
+        self._connect().executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            values.items(),
+        )
+
+    def _select_in(self, sql: str, values: List) -> List[tuple]:
+        """
+        Runs `sql` with its `{}` replaced by an IN list of values,
+        in slices small enough for SQLite.
+        """
+        rows = []
+        for i in range(0, len(values), _SQL_BATCH):
+            part = values[i : i + _SQL_BATCH]
+            rows += self._connect().execute(
+                sql.format(",".join("?" * len(part))), part
+            ).fetchall()
+        return rows
+
+    def _load_df(self) -> np.ndarray:
+        """
+        Live document frequency per term id, from the committed version.
+        """
+        name = self._meta("df_file", None)
+        if name is None or not (self.path / name).exists():
+            return np.empty(0, dtype=np.int64)
+        return np.load(self.path / name, mmap_mode="r")
+
+    # ---------- reading ----------
+
+    def _refresh(self):
+        """
+        Reopens segments and statistics if another commit landed.
+        Costs one small query when nothing changed.
+        """
+        version = self._meta("version")
+        if version == self._version:
+            return
+
+        conn = self._connect()
+        # read everything from one snapshot of the database
+        snapshot = not conn.in_transaction
+        if snapshot:
+            conn.execute("BEGIN")
+
+        try:
+            self._segments = self._segments_on_disk()
+            self._deleted = np.fromiter(
+                (r[0] for r in conn.execute("SELECT num FROM deleted ORDER BY num")),
+                dtype=np.int64,
+            )
+            self._df = self._load_df()
+            self._doc_count = self._meta("doc_count")
+            total_len = self._meta("total_len")
+            self._avgdl = total_len / self._doc_count if self._doc_count else 0.0
+            self._avg_idf = self._meta("avg_idf", 0.0)
+            stored = self._meta("analyzer", None)
+            self._query_analyzer = (
+                Analyzer.from_config(json.loads(stored)) if stored else self.analyzer
+            )
+            self._masks = {}
+            self._version = self._meta("version")
+        finally:
+            if snapshot:
+                conn.commit()
+
+    def _segment_masks(self, f: Filter) -> List[Optional[np.ndarray]]:
+        """
+        Filter masks aligned with self._segments (None for segments
+        without facets, which match nothing until rebuilt).
+        """
+        masks = self._masks.get(f)
+        if masks is not None:
+            return masks
+
+        codes = {}
+        for name, values in (("parents", f.parents), ("exts", f.extensions)):
+            if values is not None:
+                found = self._select_in(
+                    "SELECT code FROM facet_values WHERE value IN ({})", list(values)
+                )
+                codes[name] = np.array([c for c, in found], dtype=np.int32)
+
+        masks = [
+            seg.mask(f, codes.get("parents"), codes.get("exts")) if seg.has_facets else None
+            for seg in self._segments
+        ]
+        if len(self._masks) >= MASK_CACHE_SIZE:
+            self._masks.pop(next(iter(self._masks)))
+        self._masks[f] = masks
+        return masks
+
+    def _lookup_terms(self, terms: Iterable[str]) -> Dict[str, int]:
+        return dict(
+            self._select_in("SELECT term, tid FROM terms WHERE term IN ({})", list(set(terms)))
+        )
+
+    def search(self, query: str, top_k: int = 5, filter: Optional[Filter] = None) -> List[Tuple[str, float]]:
+        """
+        Best top_k (chunk id, BM25 score) pairs, highest first.
+        Only the posting lists of the query's terms are read.
+        filter: only chunks whose metadata matches are scored.
+        """
+        if filter is not None and filter.empty:
+            return []
+
+        with self._lock:
+            self._refresh()
+            tokens = self._query_analyzer(query)
+            if not self._doc_count or not tokens:
+                return []
+
+            masks = (
+                self._segment_masks(filter) if filter is not None and filter.active
+                else [None] * len(self._segments)
+            )
+            vocab = self._lookup_terms(tokens)
+            parts_ids: List[np.ndarray] = []
+            parts_scores: List[np.ndarray] = []
+
+            for term in tokens:
+                tid = vocab.get(term)
+                if tid is None or tid >= len(self._df):
+                    continue
+
+                term_idf = float(
+                    bm25.floored_idf(self._df[tid], self._doc_count, self._avg_idf)
+                )
+
+                for seg, mask in zip(self._segments, masks):
+                    if filter is not None and filter.active and mask is None:
+                        continue
+                    hit = seg.postings(tid)
+                    if hit is None:
+                        continue
+
+                    local, tfs = hit
+                    if mask is not None:
+                        keep = mask[local]
+                        local, tfs = local[keep], tfs[keep]
+                    nums = seg.nums[local].astype(np.int64)
+                    lengths = seg.lengths[local]
+                    if len(self._deleted):
+                        live = ~np.isin(nums, self._deleted)
+                        nums, tfs, lengths = nums[live], tfs[live], lengths[live]
+
+                    parts_ids.append(nums)
+                    parts_scores.append(
+                        bm25.term_scores(term_idf, tfs, lengths, self._avgdl)
+                    )
+
+            ids, scores = bm25.accumulate(parts_ids, parts_scores)
+            hits = bm25.select_top_k(ids, scores, top_k)
+            if not hits:
+                return []
+
+            chunk_ids = dict(
+                self._select_in(
+                    "SELECT num, id FROM chunks WHERE num IN ({})",
+                    [num for num, _ in hits],
+                )
+            )
+
+        return [(chunk_ids[num], score) for num, score in hits if num in chunk_ids]
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._doc_count
+
+    def needs_rebuild(self) -> bool:
+        """
+        True if the stored chunks were analyzed differently than this
+        instance's analyzer would (including indexes from before analyzer
+        settings were stored), or were indexed without filter facets.
+        """
+        with self._lock:
+            if not self._meta("doc_count"):
+                return False
+            stored = self._meta("analyzer", None)
+            return (
+                stored != json.dumps(self.analyzer.config())
+                or not all(seg.has_facets for seg in self._segments_on_disk())
+            )
+
+    def _check_analyzer(self):
+        config = json.dumps(self.analyzer.config())
+        stored = self._meta("analyzer", None)
+        if stored == config:
+            return
+        if stored is not None or self._meta("doc_count"):
+            raise ValueError(
+                "The keyword index was built with other analyzer settings. "
+                "Run `reset index` and ingest again."
+            )
+        self._set_meta(analyzer=config)
+
+    # ---------- writing ----------
+
+    def _facet_codes(self, values: Iterable[str]) -> Dict[str, int]:
+        """
+        Facet value -> code, assigning codes to unseen values.
+        """
+        values = set(values)
+        codes = dict(
+            self._select_in("SELECT value, code FROM facet_values WHERE value IN ({})", list(values))
+        )
+        new = [v for v in values if v not in codes]
+        if new:
+            next_code = self._meta("next_code")
+            assigned = {v: next_code + i for i, v in enumerate(new)}
+            self._connect().executemany(
+                "INSERT INTO facet_values (value, code) VALUES (?, ?)", assigned.items()
+            )
+            self._set_meta(next_code=next_code + len(new))
+            codes.update(assigned)
+        return codes
+
+    def _term_ids(self, terms: Iterable[str]) -> Dict[str, int]:
+        """
+        Term -> id, assigning new ids to unseen terms.
+        """
+        terms = set(terms)
+        vocab = self._lookup_terms(terms)
+        new = [t for t in terms if t not in vocab]
+        if new:
+            next_tid = self._meta("next_tid")
+            assigned = {t: next_tid + i for i, t in enumerate(new)}
+            self._connect().executemany(
+                "INSERT INTO terms (term, tid) VALUES (?, ?)", assigned.items()
+            )
+            self._set_meta(next_tid=next_tid + len(new))
+            vocab.update(assigned)
+        return vocab
+
+    def add(self, ids: List[str], texts: List[str], metas: Optional[List[Dict]] = None):
+        """
+        Buffers chunks for the next commit. Ids already indexed are skipped,
+        so re-adding unchanged chunks is a no-op. metas: the chunks'
+        metadata, for filtered searches.
+        """
+        with self._lock:
+            conn = self._connect()
+            self._check_analyzer()
+            existing = {
+                r[0] for r in self._select_in("SELECT id FROM chunks WHERE id IN ({})", list(ids))
+            }
+
+            fresh = {}
+            for chunk_id, text, meta in zip(ids, texts, metas or [{}] * len(ids)):
+                if chunk_id not in existing and chunk_id not in fresh:
+                    fresh[chunk_id] = (self.analyzer(text), meta or {})
+            if not fresh:
+                return
+
+            vocab = self._term_ids(t for tokens, _ in fresh.values() for t in tokens)
+            facets = self._facet_codes(
+                v for _, meta in fresh.values()
+                for v in (meta.get("parent"), meta.get("extension")) if v is not None
+            )
+            next_num = self._meta("next_num")
+            rows = []
+
+            for i, (chunk_id, (tokens, meta)) in enumerate(fresh.items()):
+                num = next_num + i
+                rows.append((num, chunk_id, len(tokens)))
+                self._pending_nums[num] = len(self._pending)
+                self._pending.append((
+                    num,
+                    np.fromiter((vocab[t] for t in tokens), dtype=np.int32, count=len(tokens)),
+                    (
+                        facets.get(meta.get("parent"), -1),
+                        facets.get(meta.get("extension"), -1),
+                        meta.get("modified", np.nan),
+                    ),
+                ))
+
+            conn.executemany("INSERT INTO chunks (num, id, length) VALUES (?, ?, ?)", rows)
+            self._set_meta(
+                next_num=next_num + len(rows),
+                doc_count=self._meta("doc_count") + len(rows),
+                total_len=self._meta("total_len") + sum(r[2] for r in rows),
+            )
+
+            if len(self._pending) >= SEGMENT_CHUNKS:
+                self._flush()
+
+    def delete(self, ids: List[str]):
+        """
+        Removes chunks by id; unknown ids are ignored.
+        """
+        if not ids:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            rows = self._select_in("SELECT num, length FROM chunks WHERE id IN ({})", list(ids))
+            if not rows:
+                return
+
+            conn.executemany("DELETE FROM chunks WHERE num = ?", [(num,) for num, _ in rows])
+            self._set_meta(
+                doc_count=self._meta("doc_count") - len(rows),
+                total_len=self._meta("total_len") - sum(length for _, length in rows),
+            )
+
+            tombstones = []
+            for num, _ in rows:
+                if num in self._pending_nums:
+                    # never written out: just drop it from the buffer
+                    self._pending[self._pending_nums.pop(num)] = None
+                else:
+                    tombstones.append(num)
+
+            conn.executemany("INSERT INTO deleted (num) VALUES (?)", [(n,) for n in tombstones])
+            self._new_deleted += tombstones
+
+    def _flush(self):
+        """
+        Writes buffered chunks out as a new segment.
+        """
+        pending = [p for p in self._pending if p is not None]
+        self._pending, self._pending_nums = [], {}
+        if not pending:
+            return
+
+        terms, offsets, docs, tfs = bm25.build_postings([tids for _, tids, _ in pending])
+        if not len(terms):
+            return
+
+        name = f"seg-{self._meta('next_segment'):06d}"
+        self._set_meta(next_segment=self._meta("next_segment") + 1)
+
+        segment = _Segment.write(
+            self.path / name,
+            terms=terms,
+            offsets=offsets,
+            docs=docs,
+            tfs=tfs,
+            nums=np.array([num for num, _, _ in pending], dtype=np.int64),
+            lengths=np.array([len(tids) for _, tids, _ in pending], dtype=np.float32),
+            parents=np.array([f[0] for _, _, f in pending], dtype=np.int32),
+            exts=np.array([f[1] for _, _, f in pending], dtype=np.int32),
+            modified=np.array([f[2] for _, _, f in pending], dtype=np.float64),
+        )
+        self._connect().execute("INSERT INTO segments (name) VALUES (?)", (name,))
+        self._new_segments.append(segment)
+
+    def commit(self):
+        """
+        Writes out buffered chunks and publishes them, with any deletions,
+        to readers in one transaction.
+        """
+        with self._lock:
+            conn = self._connect()
+            self._flush()
+
+            if not self._new_segments and not self._new_deleted:
+                conn.commit()
+                return
+
+            version = self._meta("version")
+            vocab_size = self._meta("next_tid")
+            old_file = self._meta("df_file", None)
+
+            df = np.zeros(vocab_size, dtype=np.int64)
+            old = self._load_df()
+            df[: len(old)] = old
+            del old
+
+            for seg in self._new_segments:
+                df += seg.term_counts(vocab_size)
+
+            if self._new_deleted:
+                gone = np.array(sorted(self._new_deleted), dtype=np.int64)
+                for seg in self._segments_on_disk():
+                    df -= seg.chunk_term_counts(gone, vocab_size)
+
+            df_file = f"df-{version + 1}.npy"
+            np.save(self.path / df_file, df)
+            self._set_meta(
+                version=version + 1,
+                df_file=df_file,
+                avg_idf=bm25.mean_idf(df, self._meta("doc_count")),
+            )
+            conn.commit()
+
+            self._new_segments, self._new_deleted = [], []
+            if old_file:
+                self._remove_file(self.path / old_file)
+
+            self._merge_tiers()
+
+    def rollback(self):
+        """
+        Discards everything since the last commit.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.rollback()
+            for seg in self._new_segments:
+                shutil.rmtree(seg.path, ignore_errors=True)
+            self._pending, self._pending_nums = [], {}
+            self._new_segments, self._new_deleted = [], []
+
+    def _segments_on_disk(self) -> List[_Segment]:
+        names = [r[0] for r in self._connect().execute("SELECT name FROM segments ORDER BY name")]
+        return [_Segment.open(self.path / name) for name in names]
+
+    def _merge_tiers(self):
+        """
+        Merges every size tier that has MERGE_FACTOR segments, smallest
+        first, until none has. A merged segment may fill the next tier.
+        """
+        conn = self._connect()
+        while True:
+            deleted = np.fromiter(
+                (r[0] for r in conn.execute("SELECT num FROM deleted")), dtype=np.int64
+            )
+            tiers: Dict[int, List[_Segment]] = {}
+            for seg in self._segments_on_disk():
+                live = len(seg.nums) - int(np.isin(seg.nums, deleted).sum())
+                tiers.setdefault(int(math.log(max(live, 1), MERGE_FACTOR)), []).append(seg)
+
+            full = [tiers[t] for t in sorted(tiers) if len(tiers[t]) >= MERGE_FACTOR]
+            if not full:
+                return
+            self._merge(full[0], deleted)
+
+    def _merge(self, segments: List[_Segment], deleted: np.ndarray):
+        """
+        Rewrites `segments` as one, dropping their tombstoned chunks.
+        Tombstones of chunks in other segments are kept.
+        """
+        conn = self._connect()
+        merged = np.concatenate([s.nums for s in segments])
+        live = ~np.isin(merged, deleted)
+        order = np.argsort(merged[live])
+        nums = merged[live][order]
+        # per-chunk columns, in the same order as nums
+        columns = {
+            name: np.concatenate([s.column(name) for s in segments])[live][order]
+            for name in ("lengths",) + _FACET_ARRAYS
+        }
+
+        # every live posting as (term, global num, tf)
+        p_terms, p_nums, p_tfs = [], [], []
+        for s in segments:
+            doc_nums = np.asarray(s.nums)[s.docs]
+            keep = ~np.isin(doc_nums, deleted)
+            p_terms.append(np.repeat(s.terms, np.diff(s.offsets))[keep])
+            p_nums.append(doc_nums[keep])
+            p_tfs.append(np.asarray(s.tfs)[keep])
+
+        p_terms = np.concatenate(p_terms).astype(np.int64)
+        p_nums = np.concatenate(p_nums)
+        p_tfs = np.concatenate(p_tfs)
+        order = np.lexsort((p_nums, p_terms))
+        p_terms, p_nums, p_tfs = p_terms[order], p_nums[order], p_tfs[order]
+
+        terms, starts = np.unique(p_terms, return_index=True)
+        name = f"seg-{self._meta('next_segment'):06d}"
+
+        if len(nums):
+            _Segment.write(
+                self.path / name,
+                terms=terms.astype(np.int32),
+                offsets=np.append(starts, len(p_terms)).astype(np.int64),
+                docs=np.searchsorted(nums, p_nums).astype(np.int32),
+                tfs=p_tfs.astype(np.float32),
+                nums=nums,
+                **columns,
+            )
+
+        dropped = [(int(n),) for n in merged[~live]]
+
+        with conn:
+            conn.executemany("DELETE FROM segments WHERE name = ?", [(s.path.name,) for s in segments])
+            conn.executemany("DELETE FROM deleted WHERE num = ?", dropped)
+            if len(nums):
+                conn.execute("INSERT INTO segments (name) VALUES (?)", (name,))
+            self._set_meta(
+                next_segment=self._meta("next_segment") + 1,
+                version=self._meta("version") + 1,
+            )
+
+        for s in segments:
+            shutil.rmtree(s.path, ignore_errors=True)
+
+    def clear(self):
+        """
+        Empties the index. Other open instances see an empty index on
+        their next search.
+        """
+        with self._lock:
+            conn = self._connect()
+            version = self._meta("version")
+            df_file = self._meta("df_file", None)
+            names = [r[0] for r in conn.execute("SELECT name FROM segments")]
+
+            with conn:
+                for table in ("terms", "chunks", "deleted", "segments", "facet_values", "meta"):
+                    conn.execute(f"DELETE FROM {table}")
+                self._set_meta(version=version + 1)
+
+            for name in names:
+                shutil.rmtree(self.path / name, ignore_errors=True)
+            if df_file:
+                self._remove_file(self.path / df_file)
+            self._pending, self._pending_nums = [], {}
+            self._new_segments, self._new_deleted = [], []
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            self._version = None
+            self._segments = []
+
+    @staticmethod
+    def _remove_file(path: Path):
+        # a reader may still have it mapped (Windows refuses the delete)
+        try:
+            path.unlink()
+        except OSError:
+            pass
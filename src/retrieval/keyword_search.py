@@ -1,47 +1,44 @@
 
-from typing import List, Dict
-from rank_bm25 import BM25Okapi
+from typing import List, Dict, Optional
+from .chunk_store import ChunkStore
+from .keyword_index import KeywordIndex
+from .filters import Filter
 
 class KeywordSearcher:
     """
     Literal keyword retrieval built on BM25.
-    You feed it all chunk texts once → it builds an index.
-    Then you can query instantly.
+    The index is built at ingest time and opened memory-mapped,
+    so constructing a searcher costs the same for any corpus size.
+    Texts are read from the chunk store for the final hits only.
     """
 
-    def __init__(self, chunks: List[Dict]):
+    def __init__(self, store: ChunkStore, index: Optional[KeywordIndex] = None):
+        self.store = store
+        self.index = index or KeywordIndex()
+
+    def search(self, query: str, top_k: int = 5, filter: Optional[Filter] = None) -> List[Dict]:
         """
-        chunks: [{"text": str, "meta": {...}}, ...]
+        Returns BM25 keyword matches sorted by score, among the chunks
+        matching filter if one is given.
         """
-        self.texts = [c["text"] for c in chunks]
-        self.metas = [c["meta"] for c in chunks]
-
-        # tokenize corpus
-        tokenized = [t.lower().split() for t in self.texts]
+        return self.search_many([query], top_k, filter)[0]
 
-        # BM25 model build
-        self.bm25 = BM25Okapi(tokenized)
-
-    def search(self, query: str, top_k: int = 5) -> List[Dict]:
+    def search_many(self, queries: List[str], top_k: int = 5, filter: Optional[Filter] = None) -> List[List[Dict]]:
         """
-        Returns BM25 keyword matches sorted by score.
+        search() for several queries, reading the chunk store once.
         """
-        q_tokens = query.lower().split()
-        scores = self.bm25.get_scores(q_tokens)
+        all_hits = [self.index.search(q, top_k, filter) for q in queries]
+        found = self.store.get_many([chunk_id for hits in all_hits for chunk_id, _ in hits])
 
-        ranked = sorted(
-            enumerate(scores),
-            key=lambda x: x[1],
-            reverse=True
-        )[:top_k]
-        # print(list(enumerate(scores)))
-        
         return [
-            {
-                "score": float(score),
-                "text": self.texts[idx],
-                "meta": self.metas[idx],
-            }
-            for idx, score in ranked if score > 0
+            [
+                {
+                    "id": chunk_id,
+                    "score": score,
+                    "text": found[chunk_id][0],
+                    "meta": found[chunk_id][1],
+                }
+                for chunk_id, score in hits if chunk_id in found
+            ]
+            for hits in all_hits
         ]
-
@@ -1,35 +1,97 @@
-from typing import List, Dict, Any
-import chromadb
-from chromadb.utils import embedding_functions
+from typing import List, Dict, Any, Optional
+import numpy as np
 try:
     from src.ingest.embedder import Embedder
 except ImportError:
     from ..ingest.embedder import Embedder
+from .chunk_store import ChunkStore
+from .vector_store import open_vector_store
+from .filters import Filter
+from src.cache.lru import LRUCache
+from src.utils.registry import get_embedder_config
+
+# query text -> vector entries kept in memory; vectors do not depend on
+# the index, so they stay valid across ingests
+QUERY_CACHE_SIZE = 1024
     
 
 class VectorSearcher:
-    """Handles semantic search over the indexed ChromaDB"""
-    def __init__(self, persist_dir:str='data/chroma', collection_name:str = 'soko_docs'):
-        self.client = chromadb.PersistentClient(path=persist_dir)
-        self.collection = self.client.get_or_create_collection(collection_name)
-        self.embedder = Embedder()
+    """Handles semantic search over the indexed vector store (chroma or flat)"""
+    def __init__(self, persist_dir:str='data/chroma', collection_name:str = 'soko_docs', store:Optional[ChunkStore] = None, backend:Optional[str] = None, embedder:Optional[Embedder] = None):
+        """embedder: defaults to the model, backend and quantization the index was built with"""
+        self.vectors = open_vector_store(backend, persist_dir, collection_name)
+        self.embedder = self._open_embedder(embedder)
+        self.store = store or ChunkStore()
+        self.query_cache = LRUCache(QUERY_CACHE_SIZE)
     
 
-    def query(self, text:str, k:int = 5) -> List[Dict[str, Any]]:
-        """Convert text -> embedding -> query Chroma -> return structured results"""
-        query_vector = self.embedder.embed([text])[0]
-        results = self.collection.query(query_embeddings=[query_vector],n_results=k)
-
-        output = []      
-        for i in range(len(results['ids'][0])):
-            output.append({
-                'id':results['ids'][0][i],
-                'documents':results['documents'][0][i],
-                'metadatas':results['metadatas'][0][i],
-                'distances':results['distances'][0][i],
-            })      
-        
-        return output
+    @staticmethod
+    def _open_embedder(embedder:Optional[Embedder]) -> Embedder:
+        config = get_embedder_config()
+        if config is None:
+            return embedder or Embedder()
+
+        indexed = Embedder(**config)
+        if embedder is None:
+            return indexed
+        if embedder.variant != indexed.variant:
+            raise ValueError(
+                f"The index was built with {indexed.variant}, not {embedder.variant}. "
+                "Search with the same model or run `reset index` and ingest again."
+            )
+        return embedder
+
+    def query(self, text:str, k:int = 5, filter:Optional[Filter] = None) -> List[Dict[str, Any]]:
+        """Convert text -> embedding -> query the vector store -> return structured results.
+        The vector store only ranks ids; texts come from the chunk store.
+        filter: search only chunks whose metadata matches."""
+        return self.query_many([text], k, filter)[0]
+
+    def query_many(self, texts:List[str], k:int = 5, filter:Optional[Filter] = None) -> List[List[Dict[str, Any]]]:
+        """Batched query(): one model call for all texts, one multi-query
+        vector store call and one chunk store read. Results are in input order."""
+        if not texts:
+            return []
+
+        return self.query_vectors(self.embed_queries(texts), k, filter)
+
+    def embed_queries(self, texts:List[str]) -> np.ndarray:
+        """Query vectors, running the model only for texts not seen recently."""
+        vectors = [self.query_cache.get(t) for t in texts]
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+
+        if missing:
+            fresh = dict(zip(missing, self.embedder.embed(missing)))
+            for t, v in fresh.items():
+                self.query_cache.set(t, v)
+            vectors = [fresh[t] if v is None else v for t, v in zip(texts, vectors)]
+
+        return np.stack(vectors)
+
+    def query_vectors(self, query_vectors, k:int = 5, filter:Optional[Filter] = None) -> List[List[Dict[str, Any]]]:
+        """query_many() for already embedded queries, one row per query."""
+        if not len(query_vectors):
+            return []
+
+        all_ids, all_distances = self.vectors.query(query_vectors, k, filter)
+
+        found = self.store.get_many([i for ids in all_ids for i in ids])
+
+        outputs = []
+        for ids, distances in zip(all_ids, all_distances):
+            output = []
+            for chunk_id, distance in zip(ids, distances):
+                if chunk_id not in found:
+                    continue
+                output.append({
+                    'id':chunk_id,
+                    'documents':found[chunk_id][0],
+                    'metadatas':found[chunk_id][1],
+                    'distances':distance,
+                })
+            outputs.append(output)
+
+        return outputs
 
     
 # from src.retrieval.vector_search import VectorSearcher
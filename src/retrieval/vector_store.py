@@ -0,0 +1,186 @@
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import chromadb
+import numpy as np
+
+from .filters import Filter
+
+CHROMA_PATH = "data/chroma"
+COLLECTION_NAME = "soko_docs"
+
+VECTOR_BACKENDS = ("chroma", "flat")
+# the backend used when none is passed explicitly; ingest and search
+# must agree, so it is read from the environment rather than per call
+DEFAULT_BACKEND = os.environ.get("SOKO_VECTOR_BACKEND", "chroma")
+# flat backend only: "float16", "int8" or "binary" first-pass precision;
+# unset keeps what the index was written with
+DEFAULT_QUANTIZATION = os.environ.get("SOKO_VECTOR_QUANTIZATION")
+
+# (ids, distances) per query, nearest first
+QueryResult = Tuple[List[List[str]], List[List[float]]]
+
+
+class VectorStore(ABC):
+    """
+    Where chunk embeddings live. Used by the Indexer (writes), the
+    VectorSearcher (queries) and reset_index.
+
+    Distances are squared L2, nearest first, as Chroma reports them.
+    Chunk texts live in the chunk store; `stores_documents` backends keep
+    a copy, which lets older indexes be backfilled from them.
+    """
+
+    name = ""
+    stores_documents = False
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def ids_for_doc(self, doc_id: str) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def query(self, vectors: np.ndarray, k: int, filter: Optional[Filter] = None) -> QueryResult:
+        """
+        filter: only rows whose metadata matches are searched.
+        """
+        raise NotImplementedError
+
+    def iter_pages(self, page_size: int, embeddings: bool = False) -> Iterator[Dict]:
+        """
+        Pages of {"ids", "documents", "metadatas"[, "embeddings"]}.
+        """
+        return iter(())
+
+    def apply_settings(self):
+        """
+        Brings the stored index in line with this store's settings. Only
+        the writer calls it; readers use what is on disk.
+        """
+
+    @abstractmethod
+    def reset(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ChromaVectorStore(VectorStore):
+    """
+    Chroma PersistentClient collection (HNSW index, keeps documents).
+    """
+
+    name = "chroma"
+    stores_documents = True
+
+    def __init__(self, persist_path: str = CHROMA_PATH, collection_name: str = COLLECTION_NAME):
+        self.persist_path = persist_path
+        self.collection_name = collection_name
+        self.client = None
+        self.collection = None
+
+    def _init(self):
+        if self.collection is not None:
+            return
+        Path(self.persist_path).parent.mkdir(parents=True, exist_ok=True)
+        self.client = chromadb.PersistentClient(path=self.persist_path)
+        self.collection = self.client.get_or_create_collection(self.collection_name)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self._init()
+        self.collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=metadatas,
+        )
+
+    def delete(self, ids):
+        if ids:
+            self._init()
+            self.collection.delete(ids=ids)
+
+    def ids_for_doc(self, doc_id):
+        self._init()
+        return self.collection.get(where={"doc_id": doc_id}, include=[])["ids"]
+
+    def count(self):
+        self._init()
+        return self.collection.count()
+
+    def query(self, vectors, k, filter=None):
+        if filter is not None and filter.empty:
+            return [[] for _ in vectors], [[] for _ in vectors]
+
+        self._init()
+        results = self.collection.query(
+            query_embeddings=vectors,
+            n_results=k,
+            where=filter.where() if filter is not None else None,
+            include=["distances"],
+        )
+        return results["ids"], results["distances"]
+
+    def iter_pages(self, page_size, embeddings=False):
+        self._init()
+        include = ["documents", "metadatas"] + (["embeddings"] if embeddings else [])
+        total = self.collection.count()
+
+        for offset in range(0, total, page_size):
+            page = self.collection.get(include=include, limit=page_size, offset=offset)
+            yield {key: page[key] for key in ["ids"] + include}
+
+    def reset(self):
+        """
+        Drops and recreates the collection. Returns False if it did not exist.
+        """
+        self._init()
+        existed = True
+        try:
+            self.client.delete_collection(self.collection_name)
+        except Exception:
+            existed = False
+        self.collection = self.client.get_or_create_collection(self.collection_name)
+        return existed
+
+    def close(self):
+        self.client = None
+        self.collection = None
+
+
+def open_vector_store(
+    backend: Optional[str] = None,
+    persist_path: str = CHROMA_PATH,
+    collection_name: str = COLLECTION_NAME,
+    quantization: Optional[str] = None,
+) -> VectorStore:
+    """
+    backend: "chroma" or "flat" (default: $SOKO_VECTOR_BACKEND, else chroma)
+    quantization: first-pass precision of the flat backend
+    (default: $SOKO_VECTOR_QUANTIZATION, else as stored)
+    """
+    backend = backend or DEFAULT_BACKEND
+
+    if backend == "chroma":
+        if quantization:
+            raise ValueError("Quantized storage needs the flat vector backend.")
+        return ChromaVectorStore(persist_path, collection_name)
+    if backend == "flat":
+        from .flat_store import FlatVectorStore
+        return FlatVectorStore(quantization=quantization or DEFAULT_QUANTIZATION)
+
+    raise ValueError(f"Unknown vector backend: {backend}")
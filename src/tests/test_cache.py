@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from src.cache.cache import Cache
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    # the registry (index generation) lives under data/ in the cwd
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / "cache.db"
+
+
+def test_entries_expire_after_ttl(db_path):
+    cache = Cache(db_path, ttl=0.2)
+    cache.set("k", "answer", "model")
+    cache.flush()
+    assert Cache(db_path, ttl=0.2).get("k") == "answer"
+
+    time.sleep(0.3)
+    assert Cache(db_path, ttl=0.2).get("k") is None
+
+
+def test_expired_entries_are_evicted_on_commit(db_path):
+    cache = Cache(db_path, ttl=0.2)
+    cache.set("old", "answer", "model")
+    cache.flush()
+    time.sleep(0.3)
+
+    cache.set("new", "answer", "model")
+    cache.flush()
+    assert cache.size() == 1
+
+
+def test_least_recently_used_entries_are_evicted(db_path):
+    cache = Cache(db_path, max_entries=2)
+    cache.set("a", "1", "model")
+    cache.set("b", "2", "model")
+    cache.flush()
+    time.sleep(0.01)
+    assert cache.get("a") == "1"
+    cache.flush()
+
+    cache.set("c", "3", "model")
+    cache.flush()
+    fresh = Cache(db_path, max_entries=2)
+    assert (fresh.get("a"), fresh.get("b"), fresh.get("c")) == ("1", None, "3")
+
+
+def test_invalidation_drops_only_answers_built_on_the_file(db_path):
+    cache = Cache(db_path)
+    cache.set("k1", "one", "model", hashes=["h1"])
+    cache.set("k2", "two", "model", hashes=["h2"])
+    cache.set("k12", "both", "model", hashes=["h1", "h2"])
+    cache.flush()
+
+    assert cache.invalidate_files(["h1"]) == 2
+    assert (cache.get("k1"), cache.get("k2"), cache.get("k12")) == (None, "two", None)
+    assert Cache(db_path).get("k2") == "two"
+
+
+def test_invalidation_drops_buffered_answers(db_path):
+    cache = Cache(db_path)
+    cache.set("k", "stale", "model", hashes=["h1"])
+
+    cache.invalidate_files(["h1"])
+    cache.flush()
+    assert cache.get("k") is None
+    assert Cache(db_path).get("k") is None
+
+
+def test_answers_buffered_elsewhere_are_not_written_after_invalidation(db_path):
+    writer = Cache(db_path)
+    writer.set("k", "stale", "model", hashes=["h1"])
+
+    Cache(db_path).invalidate_files(["h1"])
+    writer.flush()
+    assert Cache(db_path).get("k") is None
@@ -0,0 +1,61 @@
+import math
+import random
+from pathlib import Path
+
+import pytest
+
+from src.ingest.chunker import Chunker
+from src.ingest.loader import Document
+
+
+class SubwordTokenizer:
+    """Counts a token per started 3 characters of each word."""
+
+    max_tokens = 40
+
+    def count_tokens(self, text: str) -> int:
+        return sum(math.ceil(len(w) / 3) for w in text.split())
+
+
+def _text(rng):
+    words = ["a", "tokenizer", "of", "chunks", "boundary", "x" * 200]
+    paragraphs = []
+    for _ in range(20):
+        sentences = [
+            " ".join(rng.choice(words) for _ in range(rng.randint(1, 25))) + "."
+            for _ in range(rng.randint(1, 5))
+        ]
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def test_chunks_fit_the_model_input():
+    tokenizer = SubwordTokenizer()
+    chunker = Chunker(tokenizer=tokenizer)
+    doc = Document(Path("notes.md"), _text(random.Random(0)), {})
+
+    chunks = chunker.chunk([doc])
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert 0 < tokenizer.count_tokens(chunk.text) <= tokenizer.max_tokens
+    assert [c.meta["chunk_index"] for c in chunks] == list(range(len(chunks)))
+
+
+def test_chunks_fit_explicit_size_in_characters():
+    chunker = Chunker(chunk_size=120, chunk_overlap=30)
+    doc = Document(Path("notes.md"), _text(random.Random(1)), {})
+
+    for chunk in chunker.chunk([doc]):
+        assert len(chunk.text) <= 120
+
+
+@pytest.mark.parametrize("size, overlap", [(100, 100), (100, 150), (-5, 0)])
+def test_invalid_overlap_raises(size, overlap):
+    with pytest.raises(ValueError):
+        Chunker(chunk_size=size, chunk_overlap=overlap)
+
+
+def test_invalid_overlap_raises_on_first_use_with_a_tokenizer():
+    chunker = Chunker(chunk_overlap=SubwordTokenizer.max_tokens, tokenizer=SubwordTokenizer())
+    with pytest.raises(ValueError):
+        chunker.chunk([Document(Path("a.txt"), "some text", {})])
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from src.retrieval import flat_store
+from src.retrieval.filters import Filter
+from src.retrieval.flat_store import FlatVectorStore
+
+DIM = 32
+
+
+def _meta(i):
+    return {
+        "doc_id": f"doc{i % 10}",
+        "parent": "/a" if i % 2 else "/b",
+        "extension": ".py" if i % 3 else ".md",
+        "modified": float(i),
+    }
+
+
+def _fill(store, n, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    ids = [f"c{i}" for i in range(n)]
+    store.upsert(ids, x, [""] * n, [_meta(i) for i in range(n)])
+    return ids, x
+
+
+def _truth(x, q, k, rows=None):
+    rows = np.arange(len(x)) if rows is None else np.asarray(rows)
+    d = ((x[rows][None, :, :] - q[:, None, :]) ** 2).sum(-1)
+    return [[f"c{r}" for r in rows[np.argsort(di)[:k]]] for di in d]
+
+
+def _recall(got, expected):
+    return np.mean([len(set(g) & set(e)) / len(e) for g, e in zip(got, expected)])
+
+
+# 32 sign bits rank coarsely; real embeddings have hundreds
+@pytest.mark.parametrize("quantization, minimum", [(None, 0.95), ("int8", 0.95), ("binary", 0.7)])
+def test_recall_against_brute_force(tmp_path, quantization, minimum):
+    store = FlatVectorStore(tmp_path / "vectors", quantization=quantization)
+    store.apply_settings()
+    _, x = _fill(store, 2000)
+    q = x[:50] + 0.1 * np.random.default_rng(1).standard_normal((50, DIM)).astype(np.float32)
+
+    ids, _ = store.query(q, 10)
+    assert _recall(ids, _truth(x, q, 10)) >= minimum
+
+
+def test_ivf_recall(tmp_path, monkeypatch):
+    monkeypatch.setattr(flat_store, "IVF_MIN_ROWS", 1000)
+    store = FlatVectorStore(tmp_path / "vectors", nprobe=16)
+    _, x = _fill(store, 2000)
+    assert store._ivf_trained()
+
+    q = x[:50]
+    ids, _ = store.query(q, 10)
+    assert _recall(ids, _truth(x, q, 10)) >= 0.8
+
+
+def test_deleted_rows_are_never_returned_and_compaction_keeps_results(tmp_path):
+    store = FlatVectorStore(tmp_path / "vectors")
+    reader = FlatVectorStore(tmp_path / "vectors")
+    ids, x = _fill(store, 400)
+    q = x[:20]
+
+    gone = set(ids[:90])
+    store.delete(sorted(gone))
+    assert store._meta("epoch") == 0
+    live = [i for i in range(400) if f"c{i}" not in gone]
+    got, _ = reader.query(q, 5)
+    assert got == _truth(x, q, 5, live)
+
+    # past a quarter of the rows dead, the matrix is rewritten
+    more = set(ids[90:110])
+    store.delete(sorted(more))
+    assert store._meta("epoch") == 1
+    assert store.count() == 290
+    live = [i for i in live if f"c{i}" not in more]
+    got, _ = reader.query(q, 5)
+    assert got == _truth(x, q, 5, live)
+
+
+def test_filters_skip_deleted_rows(tmp_path):
+    store = FlatVectorStore(tmp_path / "vectors")
+    ids, x = _fill(store, 300)
+    store.delete(ids[:50])
+
+    f = Filter(parents=("/a",), extensions=(".py",), after=100.0)
+    allowed = [
+        i for i in range(50, 300)
+        if _meta(i)["parent"] == "/a" and _meta(i)["extension"] == ".py" and i >= 100
+    ]
+    got, _ = store.query(x[:10], 5, filter=f)
+    assert got == _truth(x, x[:10], 5, allowed)
+
+    assert store.query(x[:2], 5, filter=Filter(extensions=()))[0] == [[], []]
+
+
+def test_readers_do_not_requantize(tmp_path):
+    writer = FlatVectorStore(tmp_path / "vectors", quantization="int8")
+    writer.apply_settings()
+    _, x = _fill(writer, 100)
+
+    reader = FlatVectorStore(tmp_path / "vectors", quantization="binary")
+    reader.query(x[:1], 3)
+    assert reader._meta("quantization") == "int8"
+    assert not (tmp_path / "vectors" / "bits-0.u8").exists()
+
+    FlatVectorStore(tmp_path / "vectors", quantization="binary").apply_settings()
+    reader.query(x[:1], 3)
+    assert reader._quant == "binary"
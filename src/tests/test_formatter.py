@@ -0,0 +1,85 @@
+from src.retrieval.formatter import build_context, estimate_tokens
+
+
+def _hit(text, index, score=1.0, doc="/docs/a.md", **meta):
+    return {
+        "id": f"{doc}#{index}",
+        "text": text,
+        "score": score,
+        "meta": {"doc_id": doc, "chunk_index": index, **meta},
+    }
+
+
+def test_consecutive_chunks_merge_without_their_overlap():
+    shared = "the overlapping window shared by both chunks"
+    a = "First part of the document. " + shared
+    b = shared + " and the rest of the second chunk."
+
+    packed = build_context([_hit(b, 1, 0.5), _hit(a, 0, 0.9)])
+    assert packed.sections == 1
+    assert packed.chunks == 2
+    assert packed.text.count(shared) == 1
+    assert "First part of the document. " + shared + " and the rest" in packed.text
+    assert "chunks: 0-1" in packed.text
+
+
+def test_short_overlaps_are_removed():
+    packed = build_context([_hit("hello new world", 0), _hit("new world again", 1)])
+    assert "hello new world again" in packed.text
+
+
+def test_record_chunks_share_one_header():
+    packed = build_context([
+        _hit("name, qty\napple, 1", 0, doc="t.csv"),
+        _hit("name, qty\npear, 2", 1, doc="t.csv"),
+    ])
+    assert packed.text.count("name, qty") == 1
+    assert "apple, 1\npear, 2" in packed.text
+
+
+def test_gaps_and_other_files_stay_separate():
+    packed = build_context([_hit("zero", 0), _hit("two", 2), _hit("other", 0, doc="/docs/b.md")])
+    assert packed.sections == 3
+
+
+def test_sections_that_do_not_fit_make_room_for_smaller_ones():
+    hits = [
+        _hit("x" * 1600, 0, 0.9, doc="a.md"),
+        _hit("y" * 1600, 0, 0.8, doc="b.md"),
+        _hit("z" * 300, 0, 0.1, doc="c.md"),
+    ]
+    packed = build_context(hits, est_token_budget=700)
+
+    assert packed.est_tokens <= 700
+    assert (packed.sections, packed.dropped) == (2, 1)
+    assert "y" not in packed.text
+    assert packed.text.index("x") < packed.text.index("z")
+
+
+def test_best_section_is_cut_to_fit():
+    hits = [_hit("x" * 4000, 0, 0.9, doc="a.md"), _hit("y" * 300, 0, 0.8, doc="b.md")]
+    packed = build_context(hits, est_token_budget=700)
+
+    assert 600 < packed.est_tokens <= 700
+    assert (packed.sections, packed.dropped) == (1, 1)
+    assert packed.text.endswith(" …")
+
+
+def test_custom_counter():
+    words = lambda text: len(text.split())
+    hits = [_hit(" ".join(["word"] * 50), 0, 0.9, doc=f"{i}.md") for i in range(5)]
+    packed = build_context(hits, est_token_budget=200, count_tokens=words)
+
+    assert packed.est_tokens <= 200
+    assert packed.sections == 3
+    assert packed.est_tokens != estimate_tokens(packed.text)
+
+
+def test_ids_and_hashes_of_sent_chunks():
+    packed = build_context([
+        _hit("a", 0, hash="h1"),
+        _hit("b", 1, hash="h1"),
+        _hit("c", 0, doc="/docs/b.md", hash="h2"),
+    ])
+    assert sorted(packed.ids) == ["/docs/a.md#0", "/docs/a.md#1", "/docs/b.md#0"]
+    assert sorted(packed.hashes) == ["h1", "h2"]
@@ -0,0 +1,110 @@
+import math
+import random
+from collections import Counter
+
+import pytest
+from rank_bm25 import BM25Okapi
+
+from src.retrieval import keyword_index
+from src.retrieval.keyword_index import KeywordIndex
+
+WORDS = [f"w{i}" for i in range(300)]
+
+
+def _doc(rng):
+    # a few common words, so some terms appear in over half the corpus
+    vocab = WORDS[:10] if rng.random() < 0.5 else WORDS
+    return " ".join(rng.choice(vocab) for _ in range(rng.randint(1, 30)))
+
+
+def assert_matches_reference(index, docs, rng, queries=20):
+    keys = sorted(docs)
+    ref = BM25Okapi([docs[k].split() for k in keys])
+    assert index.count() == len(docs)
+
+    for _ in range(queries):
+        terms = rng.sample(WORDS, rng.randint(1, 3)) + ["w1"]
+        got = dict(index.search(" ".join(terms), top_k=len(docs)))
+        scores = ref.get_scores(terms)
+        expected = {
+            k: s for k, s in zip(keys, scores)
+            if any(t in docs[k].split() for t in terms)
+        }
+        assert got.keys() == expected.keys()
+        for k, s in expected.items():
+            assert got[k] == pytest.approx(s, rel=1e-4)
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = KeywordIndex(tmp_path / "keyword")
+    yield idx
+    idx.close()
+
+
+def test_add_and_delete_match_rank_bm25(index):
+    rng = random.Random(0)
+    docs = {f"c{i}": _doc(rng) for i in range(300)}
+    index.add(list(docs), list(docs.values()))
+    index.commit()
+    assert_matches_reference(index, docs, rng)
+
+    gone = rng.sample(sorted(docs), 80)
+    index.delete(gone)
+    index.commit()
+    for k in gone:
+        del docs[k]
+    assert_matches_reference(index, docs, rng)
+
+
+def test_readding_a_deleted_id_uses_its_new_text(index):
+    rng = random.Random(1)
+    docs = {f"c{i}": _doc(rng) for i in range(100)}
+    index.add(list(docs), list(docs.values()))
+    index.commit()
+
+    index.delete(["c0", "c1"])
+    docs["c0"] = docs["c1"] = "fresh fresh w298"
+    index.add(["c0", "c1"], [docs["c0"], docs["c1"]])
+    index.commit()
+    assert_matches_reference(index, docs, rng)
+    assert {k for k, _ in index.search("fresh", top_k=5)} == {"c0", "c1"}
+
+
+def test_rollback_discards_uncommitted_changes(index):
+    rng = random.Random(2)
+    docs = {f"c{i}": _doc(rng) for i in range(100)}
+    index.add(list(docs), list(docs.values()))
+    index.commit()
+
+    index.add(["new"], ["w1 w2 w3"])
+    index.delete(["c0", "c1"])
+    index.rollback()
+    assert_matches_reference(index, docs, rng)
+
+
+def test_tiered_merges_keep_scores(index, monkeypatch):
+    monkeypatch.setattr(keyword_index, "SEGMENT_CHUNKS", 40)
+    monkeypatch.setattr(keyword_index, "MERGE_FACTOR", 2)
+    rng = random.Random(3)
+    docs = {}
+
+    for step in range(8):
+        batch = {f"s{step}-{i}": _doc(rng) for i in range(rng.randint(20, 120))}
+        if docs:
+            gone = rng.sample(sorted(docs), min(len(docs), 30))
+            index.delete(gone)
+            for k in gone:
+                del docs[k]
+        index.add(list(batch), list(batch.values()))
+        index.commit()
+        docs.update(batch)
+        assert_matches_reference(index, docs, rng, queries=5)
+
+    # no size tier is left holding MERGE_FACTOR segments
+    deleted = [r[0] for r in index._connect().execute("SELECT num FROM deleted")]
+    tiers = Counter(
+        int(math.log(max(1, len(set(s.nums) - set(deleted))), 2))
+        for s in index._segments_on_disk()
+    )
+    assert max(tiers.values()) < 2
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from src.ingest import records
+from src.ingest.records import RecordStream
+
+
+def _read(path, kind):
+    header, stream = RecordStream(path, kind).open()
+    return header, list(stream)
+
+
+def test_json_array_streams_elements(tmp_path):
+    rows = [{"id": i, "name": f"row {i}", "tags": ["a", "b"]} for i in range(50)]
+    path = tmp_path / "rows.json"
+    path.write_text(json.dumps(rows))
+
+    header, out = _read(path, "json")
+    assert header == ""
+    assert [label for label, _ in out] == [f"$[{i}]" for i in range(50)]
+    assert json.loads(out[3][1]) == rows[3]
+
+
+def test_tiny_reads_split_values_across_refills(tmp_path, monkeypatch):
+    monkeypatch.setattr(records, "READ_SIZE", 7)
+    values = ["a long string spanning many reads", 12345678901234.5, True, None, "é ü"]
+    path = tmp_path / "scalars.json"
+    path.write_text(json.dumps(values + [{"key": [1, 2]}], ensure_ascii=False))
+
+    _, out = _read(path, "json")
+    assert out[:5] == [(f"$[{i}]", records._compact(v)) for i, v in enumerate(values)]
+    # a container larger than the window is streamed member by member
+    assert out[5:] == [("$[5].key", "key: [1, 2]")]
+
+
+def test_nested_json_streams_inner_elements(tmp_path, monkeypatch):
+    monkeypatch.setattr(records, "READ_SIZE", 256)
+    doc = {"meta": {"v": 1}, "data": [{"id": i, "text": "x" * 20} for i in range(40)], "k 2": 3}
+    path = tmp_path / "nested.json"
+    path.write_text(json.dumps(doc))
+
+    labels = [label for label, _ in _read(path, "json")[1]]
+    assert labels[0] == "$.meta"
+    assert labels[1:41] == [f"$.data[{i}]" for i in range(40)]
+    assert labels[-1] == '$["k 2"]'
+
+
+def test_malformed_json_tail_keeps_earlier_records(tmp_path):
+    path = tmp_path / "broken.json"
+    path.write_text('[{"a": 1}, {"b": 2}, {"c": ')
+
+    _, out = _read(path, "json")
+    assert [label for label, _ in out] == ["$[0]", "$[1]"]
+
+
+def test_malformed_jsonl_line_ends_the_stream(tmp_path):
+    path = tmp_path / "rows.jsonl"
+    path.write_text('{"a": 1}\n\n{"b": 2}\n{"c": \n{"d": 4}\n')
+
+    _, out = _read(path, "jsonl")
+    assert [label for label, _ in out] == ["$[0]", "$[2]"]
+
+
+def test_csv_repeats_header_and_skips_blank_rows(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("name,qty\napple,1\n,\npear,2\n")
+
+    header, out = _read(path, "csv")
+    assert header == "name, qty"
+    assert out == [(1, "apple, 1"), (3, "pear, 2")]
+
+
+@pytest.mark.parametrize("content", ["", "name,qty\n"])
+def test_empty_csv(tmp_path, content):
+    path = tmp_path / "empty.csv"
+    path.write_text(content)
+
+    stream = RecordStream(path, "csv")
+    assert stream.is_empty()
+    assert list(stream.open()[1]) == []
+
+
+@pytest.mark.parametrize("content", ["", "[]", "{}", "  \n"])
+def test_empty_json(tmp_path, content):
+    path = tmp_path / "empty.json"
+    path.write_text(content)
+    assert RecordStream(path, "json").is_empty()
@@ -10,3 +10,7 @@ def file_hash(path: Path, algo: str = "sha256") -> str:
             h.update(chunk)
 
     return h.hexdigest()
+
+
+def text_hash(text: str, algo: str = "sha256") -> str:
+    return hashlib.new(algo, text.encode("utf-8")).hexdigest()
@@ -1,63 +1,342 @@
 import json
+import os
+import sqlite3
+import threading
 import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Tuple
 
-REGISTRY_PATH = Path("data/raw/ingested_dirs.json")
+REGISTRY_PATH = Path("data/raw/registry.db")
+LEGACY_REGISTRY_PATH = Path("data/raw/ingested_dirs.json")
 
+_conn: Optional[sqlite3.Connection] = None
+_conn_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+@dataclass
+class FileRecord:
+    hash: str
+    size: int = 0
+    mtime_ns: int = 0
+    inode: int = 0
+    chunk_count: int = 0
+
+    def matches_stat(self, stat: os.stat_result) -> bool:
+        """
+        True if the file on disk still has the size, mtime and inode
+        recorded at ingest time, so its content can be trusted unchanged.
+        """
+        return (
+            self.size == stat.st_size
+            and self.mtime_ns == stat.st_mtime_ns
+            and self.inode == stat.st_ino
+        )
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    One connection per process. Pool workers get their own after fork.
+    """
+    global _conn, _conn_pid
+
+    if _conn is not None and _conn_pid == os.getpid():
+        return _conn
+
+    REGISTRY_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(REGISTRY_PATH, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS directories (
+            path TEXT PRIMARY KEY,
+            ingested_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS files (
+            directory TEXT NOT NULL,
+            name TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            size INTEGER,
+            mtime_ns INTEGER,
+            inode INTEGER,
+            chunk_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (directory, name)
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value
+        );
+        """
+    )
+    _migrate_legacy(conn)
+
+    _conn, _conn_pid = conn, os.getpid()
+    return conn
+
+
+def _migrate_legacy(conn: sqlite3.Connection):
+    """
+    Imports the old JSON registry once. Stat fields are left empty,
+    so migrated files fall back to a hash check on the next walk.
+    """
+    if not LEGACY_REGISTRY_PATH.exists():
+        return
 
-def _load_registry() -> List[Dict]:
-    if not REGISTRY_PATH.exists():
-        return []
     try:
-        with open(REGISTRY_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(LEGACY_REGISTRY_PATH, "r", encoding="utf-8") as f:
+            legacy = json.load(f)
     except Exception:
-        return []
+        return
 
+    with conn:
+        for entry in legacy:
+            conn.execute(
+                "INSERT OR IGNORE INTO directories (path, ingested_at) VALUES (?, ?)",
+                (entry["path"], entry.get("ingested_at")),
+            )
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO files (directory, name, hash)
+                VALUES (?, ?, ?)
+                """,
+                [(entry["path"], name, h) for name, h in entry.get("files", {}).items()],
+            )
+
+    LEGACY_REGISTRY_PATH.rename(LEGACY_REGISTRY_PATH.with_suffix(".json.migrated"))
+
+
+def get_directory_files(directory: Path) -> Dict[str, FileRecord]:
+    """
+    All registered files of one directory, in a single indexed query.
+    """
+    directory = str(directory.resolve())
+
+    with _lock:
+        rows = _connect().execute(
+            """
+            SELECT name, hash, size, mtime_ns, inode, chunk_count
+            FROM files WHERE directory = ?
+            """,
+            (directory,),
+        ).fetchall()
+
+    return {
+        name: FileRecord(h, size or 0, mtime_ns or 0, inode or 0, chunks)
+        for name, h, size, mtime_ns, inode, chunks in rows
+    }
+
+
+def list_files_under(root: Path) -> List[Tuple[Path, str]]:
+    """
+    (directory, file name) of every registered file at or below root.
+    """
+    root = str(root.resolve())
+    prefix = root.rstrip(os.sep) + os.sep
+
+    with _lock:
+        rows = _connect().execute(
+            """
+            SELECT directory, name FROM files
+            WHERE directory = ? OR substr(directory, 1, ?) = ?
+            """,
+            (root, len(prefix), prefix),
+        ).fetchall()
+
+    return [(Path(directory), name) for directory, name in rows]
+
+
+def list_directories_under(root: Path) -> List[str]:
+    """
+    Registered directories (with files) at or below root, resolved.
+    """
+    root = str(root.resolve())
+    prefix = root.rstrip(os.sep) + os.sep
+
+    with _lock:
+        rows = _connect().execute(
+            """
+            SELECT DISTINCT directory FROM files
+            WHERE directory = ? OR substr(directory, 1, ?) = ?
+            """,
+            (root, len(prefix), prefix),
+        ).fetchall()
+
+    return [directory for directory, in rows]
 
-def _save_registry(data: List[Dict]):
-    REGISTRY_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with open(REGISTRY_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
 
 def is_file_ingested(directory: Path, file_name: str, file_hash: str) -> bool:
-    registry = _load_registry()
     directory = str(directory.resolve())
 
-    for entry in registry:
-        if entry["path"] == directory:
-            files = entry.get("files", {})
-            return files.get(file_name) == file_hash
+    with _lock:
+        row = _connect().execute(
+            "SELECT hash FROM files WHERE directory = ? AND name = ?",
+            (directory, file_name),
+        ).fetchone()
+
+    return row is not None and row[0] == file_hash
+
+
+def register_files(directory: Path, files: Dict[str, FileRecord]):
+    """
+    Records (or replaces) a batch of files in one transaction.
+    """
+    directory = str(directory.resolve())
+
+    with _lock:
+        conn = _connect()
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO directories (path, ingested_at) VALUES (?, ?)
+                ON CONFLICT(path) DO UPDATE SET ingested_at = excluded.ingested_at
+                """,
+                (directory, time.time()),
+            )
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO files
+                    (directory, name, hash, size, mtime_ns, inode, chunk_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (directory, name, r.hash, r.size, r.mtime_ns, r.inode, r.chunk_count)
+                    for name, r in files.items()
+                ],
+            )
 
-    return False
 
-def register_files(
-    directory: Path,
-    file_map: Dict[str, str],
-    chunk_count: int,
-):
-    registry = _load_registry()
+def remove_files(directory: Path, names: Iterable[str]):
+    """
+    Forgets deleted files, and the directory itself once it has none left.
+    """
     directory = str(directory.resolve())
 
-    for entry in registry:
-        if entry["path"] == directory:
-            entry["files"].update(file_map)
-            entry["file_count"] = len(entry["files"])
-            entry["chunk_count"] += chunk_count
-            entry["ingested_at"] = time.time()
-            _save_registry(registry)
-            return
-
-    registry.append({
-        "path": directory,
-        "files": file_map,
-        "file_count": len(file_map),
-        "chunk_count": chunk_count,
-        "ingested_at": time.time()
-    })
-
-    _save_registry(registry)
+    with _lock:
+        conn = _connect()
+        with conn:
+            conn.executemany(
+                "DELETE FROM files WHERE directory = ? AND name = ?",
+                [(directory, name) for name in names],
+            )
+            conn.execute(
+                """
+                DELETE FROM directories WHERE path = ?
+                AND NOT EXISTS (SELECT 1 FROM files WHERE directory = ?)
+                """,
+                (directory, directory),
+            )
+
+
+def refresh_file_stats(updates: Iterable[Tuple[Path, str, os.stat_result]]):
+    """
+    Stores new stat fields for files whose content hash did not change
+    (e.g. touched or copied back), so the next walk takes the fast path.
+    """
+    rows = [
+        (stat.st_size, stat.st_mtime_ns, stat.st_ino, str(directory.resolve()), name)
+        for directory, name, stat in updates
+    ]
+    if not rows:
+        return
+
+    with _lock:
+        conn = _connect()
+        with conn:
+            conn.executemany(
+                """
+                UPDATE files SET size = ?, mtime_ns = ?, inode = ?
+                WHERE directory = ? AND name = ?
+                """,
+                rows,
+            )
+
 
 def list_ingested_directories() -> List[Dict]:
-    return _load_registry()
+    with _lock:
+        conn = _connect()
+        dirs = conn.execute(
+            "SELECT path, ingested_at FROM directories ORDER BY rowid"
+        ).fetchall()
+        files = conn.execute(
+            "SELECT directory, name, hash, chunk_count FROM files ORDER BY name"
+        ).fetchall()
+
+    entries = {
+        path: {
+            "path": path,
+            "files": {},
+            "file_count": 0,
+            "chunk_count": 0,
+            "ingested_at": ts,
+        }
+        for path, ts in dirs
+    }
+
+    for directory, name, h, chunks in files:
+        entry = entries.get(directory)
+        if entry is None:
+            continue
+        entry["files"][name] = h
+        entry["file_count"] += 1
+        entry["chunk_count"] += chunks
+
+    return list(entries.values())
+
+
+def get_generation() -> int:
+    """
+    Index generation: changes whenever the indexed content may have
+    changed (ingest, sync, reset). Keys in-process search caches.
+    """
+    with _lock:
+        row = _connect().execute(
+            "SELECT value FROM meta WHERE key = 'generation'"
+        ).fetchone()
+    return row[0] if row else 0
+
+
+def bump_generation() -> int:
+    with _lock:
+        conn = _connect()
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO meta (key, value) VALUES ('generation', 1)
+                ON CONFLICT (key) DO UPDATE SET value = value + 1
+                """
+            )
+            return conn.execute(
+                "SELECT value FROM meta WHERE key = 'generation'"
+            ).fetchone()[0]
+
+
+def get_embedder_config() -> Optional[Dict]:
+    """
+    Settings of the embedding model the index was built with (see
+    Embedder.config), or None before the first ingest.
+    """
+    with _lock:
+        row = _connect().execute(
+            "SELECT value FROM meta WHERE key = 'embedder'"
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def set_embedder_config(config: Dict):
+    with _lock:
+        conn = _connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('embedder', ?)",
+                (json.dumps(config, sort_keys=True),),
+            )
+
+
+def clear_registry():
+    # the generation is kept: it must never repeat a value a cache has seen
+    with _lock:
+        conn = _connect()
+        with conn:
+            conn.execute("DELETE FROM files")
+            conn.execute("DELETE FROM directories")
@@ -1,13 +1,15 @@
-import chromadb
 import sqlite3
 from pathlib import Path
 from src.utils.utils import log, log_warn
-
-CHROMA_PATH = "data/chroma"
-COLLECTION_NAME = "soko_docs"
+from src.utils.registry import bump_generation, clear_registry
+from src.retrieval.keyword_index import KeywordIndex
+from src.retrieval.chunk_store import ChunkStore
+from src.retrieval.flat_store import FlatVectorStore
+from src.retrieval.vector_store import CHROMA_PATH, COLLECTION_NAME, ChromaVectorStore
 
 CACHE_DB = Path("data/cache-db/cache.db")
-REGISTRY_FILE = Path("data/raw/ingested_dirs.json")
+SEMANTIC_DB = Path("data/cache-db/semantic.db")
+EMBEDDINGS_DB = Path("data/cache-db/embeddings.db")
 
 
 def reset_cache():
@@ -18,8 +20,17 @@ def reset_cache():
     try:
         conn = sqlite3.connect(CACHE_DB)
         conn.execute("DELETE FROM cache")
+        # file tags exist only in caches written since they were added
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'cache_files'").fetchone():
+            conn.execute("DELETE FROM cache_files")
         conn.commit()
         conn.close()
+
+        if SEMANTIC_DB.exists():
+            conn = sqlite3.connect(SEMANTIC_DB)
+            conn.execute("DELETE FROM answers")
+            conn.commit()
+            conn.close()
         log("Answer cache cleared.")
     except Exception as e:
         raise RuntimeError(f"Failed to reset cache: {e}")
@@ -27,17 +38,32 @@ def reset_cache():
 
 def reset_index():
     try:
-        client = chromadb.PersistentClient(path=CHROMA_PATH)
-
-        try:
-            client.delete_collection(COLLECTION_NAME)
+        chroma = ChromaVectorStore(CHROMA_PATH, COLLECTION_NAME)
+        if chroma.reset():
             log("Chroma collection deleted.")
-        except Exception:
+        else:
             log_warn("Collection did not exist.")
-
-        client.get_or_create_collection(COLLECTION_NAME)
+        chroma.close()
         log("Chroma collection recreated (empty).")
 
+        # both backends: an empty flat store would re-import from chroma
+        flat = FlatVectorStore()
+        flat.reset()
+        flat.close()
+        log("Flat vector store cleared.")
+
+        keyword = KeywordIndex()
+        keyword.clear()
+        keyword.close()
+        log("Keyword index cleared.")
+
+        store = ChunkStore()
+        store.clear()
+        store.close()
+        log("Chunk store cleared.")
+
+        bump_generation()
+
     except Exception as e:
         raise RuntimeError(f"Failed to reset index: {e}")
 
@@ -45,12 +71,27 @@ def reset_index():
 
 
 def reset_registry():
-    if REGISTRY_FILE.exists():
-        REGISTRY_FILE.unlink()
+    try:
+        clear_registry()
         log("Ingestion registry cleared.")
-    else:
-        log_warn("No registry file found.")
+    except Exception as e:
+        raise RuntimeError(f"Failed to reset registry: {e}")
+
+def reset_embeddings():
+    # keyed by model and text, so entries stay valid across index resets
+    if not EMBEDDINGS_DB.exists():
+        return
+
+    try:
+        conn = sqlite3.connect(EMBEDDINGS_DB)
+        conn.execute("DELETE FROM embeddings")
+        conn.commit()
+        conn.close()
+        log("Embedding cache cleared.")
+    except Exception as e:
+        raise RuntimeError(f"Failed to reset embedding cache: {e}")
 
 def reset_all():
     reset_index()
     reset_registry()
+    reset_embeddings()